@@ -1,5 +1,3 @@
-from dataclasses import asdict
-
 from flask import jsonify, request
 from flask.typing import ResponseReturnValue
 from flask.views import MethodView
@@ -28,19 +26,16 @@ class AccountView(MethodView):
         elif "username" in request_data and "password" in request_data:
             account_params = CreateAccountByUsernameAndPasswordParams(**request_data)
             account = AccountService.create_account_by_username_and_password(params=account_params)
-        account_dict = asdict(account)
-        return jsonify(account_dict), 201
+        return jsonify(account), 201
 
     @access_auth_middleware
     def get(self, id: str) -> ResponseReturnValue:
         account_params = AccountSearchByIdParams(id=id)
         account = AccountService.get_account_by_id(params=account_params)
-        account_dict = asdict(account)
-        return jsonify(account_dict), 200
+        return jsonify(account), 200
 
     def patch(self, id: str) -> ResponseReturnValue:
         request_data = request.get_json()
         reset_account_params = ResetPasswordParams(account_id=id, **request_data)
         account = AccountService.reset_account_password(params=reset_account_params)
-        account_dict = asdict(account)
-        return jsonify(account_dict), 200
+        return jsonify(account), 200
@@ -0,0 +1,78 @@
+import dataclasses
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from flask import Response
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONSerializer:
+    """
+    Serializes API responses without the recursive deep copy done by dataclasses.asdict.
+    orjson is an optional dependency: when it is installed it is used for the fast path, otherwise the standard
+    library json module is used and dataclasses are flattened using field names cached per type.
+    """
+
+    _FIELD_NAMES_BY_TYPE: Dict[type, Tuple[str, ...]] = {}
+
+    @staticmethod
+    def _get_field_names(cls: type) -> Tuple[str, ...]:
+        field_names = JSONSerializer._FIELD_NAMES_BY_TYPE.get(cls)
+        if field_names is None:
+            field_names = tuple(field.name for field in dataclasses.fields(cls))
+            JSONSerializer._FIELD_NAMES_BY_TYPE[cls] = field_names
+        return field_names
+
+    @staticmethod
+    def _default(value: Any) -> Any:
+        if dataclasses.is_dataclass(value) and not isinstance(value, type):
+            return {name: getattr(value, name) for name in JSONSerializer._get_field_names(type(value))}
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Enum):
+            return value.value
+        if isinstance(value, (set, frozenset, tuple)):
+            return list(value)
+        # ObjectId and other scalar BSON types
+        return str(value)
+
+    @staticmethod
+    def dumps(value: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(value, default=JSONSerializer._default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(value, default=JSONSerializer._default, separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    def loads(value: str | bytes) -> Any:
+        if orjson is not None:
+            return orjson.loads(value)
+        return json.loads(value)
+
+    @staticmethod
+    def iter_ndjson(items: Iterable[Any]) -> Iterator[bytes]:
+        """Serialize items as newline-delimited JSON, one line per item"""
+        for item in items:
+            yield JSONSerializer.dumps(item) + b"\n"
+
+
+class ApplicationJSONProvider(JSONProvider):
+    """
+    Flask JSON provider backed by JSONSerializer, so jsonify() accepts dataclasses directly.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return JSONSerializer.dumps(obj).decode("utf-8")
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return JSONSerializer.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(JSONSerializer.dumps(obj), mimetype="application/json")
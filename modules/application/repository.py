@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from pymongo import MongoClient
 from pymongo.collection import Collection
@@ -38,6 +38,9 @@ class ApplicationRepositoryClient:
 class ApplicationRepository(ABC):
     _collection: Optional[Collection] = None
 
+    # Shard key of the collection, e.g. {"account_id": "hashed"}, None keeps it unsharded
+    shard_key: Optional[Dict[str, Any]] = None
+
     @property
     @abstractmethod
     def collection_name(self) -> str:
@@ -61,3 +64,18 @@ class ApplicationRepository(ABC):
     @classmethod
     def on_init_collection(cls, collection: Collection) -> bool:
         return False
+
+    @classmethod
+    def shard_collection(cls) -> bool:
+        """Shard the collection on its declared shard key, requires a connection to a mongos router"""
+        if cls.shard_key is None:
+            return False
+
+        collection = cls.collection()
+        admin_database = collection.database.client.admin
+
+        admin_database.command("enableSharding", collection.database.name)
+        admin_database.command("shardCollection", collection.full_name, key=cls.shard_key)
+        Logger.info(message=f"sharded collection {collection.full_name} on {cls.shard_key}")
+
+        return True
@@ -1,5 +1,3 @@
-from dataclasses import asdict
-
 from flask import jsonify, request
 from flask.typing import ResponseReturnValue
 from flask.views import MethodView
@@ -35,5 +33,4 @@ class AccessTokenView(MethodView):
                 params=AccountSearchParams(username=access_token_params.username, password=access_token_params.password)
             )
             access_token = AuthenticationService.create_access_token_by_username_and_password(account=account)
-        access_token_dict = asdict(access_token)
-        return jsonify(access_token_dict), 201
+        return jsonify(access_token), 201
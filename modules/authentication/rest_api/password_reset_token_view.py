@@ -1,5 +1,3 @@
-from dataclasses import asdict
-
 from flask import jsonify, request
 from flask.typing import ResponseReturnValue
 from flask.views import MethodView
@@ -15,5 +13,4 @@ class PasswordResetTokenView(MethodView):
         password_reset_token_params = CreatePasswordResetTokenParams(**request_data)
         account_obj = AccountService.get_account_by_username(username=password_reset_token_params.username)
         password_reset_token = AuthenticationService.create_password_reset_token(params=account_obj)
-        password_reset_token_dict = asdict(password_reset_token)
-        return jsonify(password_reset_token_dict), 201
+        return jsonify(password_reset_token), 201
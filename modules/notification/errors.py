@@ -44,4 +44,58 @@ class NotificationValidationError(AppError):
             code=NotificationErrorCode.VALIDATION_ERROR,
             http_status_code=400,
             message=message,
-        )
\ No newline at end of file
+        )
+
+
+class NotificationArchiveError(AppError):
+    def __init__(self, message: str) -> None:
+        super().__init__(
+            code=NotificationErrorCode.ARCHIVE_ERROR,
+            http_status_code=500,
+            message=f"Notification archive error: {message}",
+        )
+
+
+class IdempotencyKeyInProgressError(AppError):
+    def __init__(self, key: str) -> None:
+        super().__init__(
+            code=NotificationErrorCode.IDEMPOTENCY_KEY_IN_PROGRESS,
+            http_status_code=409,
+            message=f"A request with idempotency key '{key}' is still being processed.",
+        )
+
+
+class NotificationAckFlushError(AppError):
+    def __init__(self, message: str) -> None:
+        super().__init__(
+            code=NotificationErrorCode.ACK_FLUSH_FAILED,
+            http_status_code=503,
+            message=f"Notification acks were not stored, retry the batch: {message}",
+        )
+
+
+class CampaignNotFoundError(AppError):
+    def __init__(self, campaign_id: str) -> None:
+        super().__init__(
+            code=NotificationErrorCode.CAMPAIGN_NOT_FOUND,
+            http_status_code=404,
+            message=f"Campaign with id '{campaign_id}' not found.",
+        )
+
+
+class CampaignStateConflictError(AppError):
+    def __init__(self, campaign_id: str, action: str, status: str) -> None:
+        super().__init__(
+            code=NotificationErrorCode.CAMPAIGN_STATE_CONFLICT,
+            http_status_code=409,
+            message=f"Campaign '{campaign_id}' cannot {action} while it is {status}.",
+        )
+
+
+class NotificationAdminAccessError(AppError):
+    def __init__(self) -> None:
+        super().__init__(
+            code=NotificationErrorCode.ADMIN_ACCESS_REQUIRED,
+            http_status_code=403,
+            message="Only admin or service accounts can send notifications to other accounts.",
+        )
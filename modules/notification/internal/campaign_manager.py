@@ -0,0 +1,157 @@
+import zlib
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+
+from modules.config.config_service import ConfigService
+from modules.notification.errors import CampaignNotFoundError
+from modules.notification.internal.store.notification_model import CampaignModel
+from modules.notification.internal.store.notification_repository import CampaignRepository
+from modules.notification.types import CampaignShardStatus, CampaignStatus, CreateCampaignParams
+
+CAMPAIGN_PROGRESS_COUNTERS = ["processed_count", "sent_count", "failed_count", "skipped_count"]
+
+
+class CampaignManager:
+    """
+    Stores campaigns and their per-shard progress. The audience is split into shards by a stable hash of
+    account_id and each shard is sent by its own worker from the campaign's audience snapshot, recording the
+    last snapshot chunk it sent so a retried or resumed worker picks up where the previous one stopped. A worker
+    only keeps going while the campaign is running under the run_id it was started with, which is how pause,
+    cancel and resume reach workers already in flight.
+    """
+
+    @staticmethod
+    def get_shard(account_id: str, shard_count: int) -> int:
+        return zlib.crc32(account_id.encode("utf-8")) % shard_count
+
+    @staticmethod
+    def _get_object_id(campaign_id: str) -> ObjectId:
+        try:
+            return ObjectId(campaign_id)
+        except Exception:
+            raise CampaignNotFoundError(campaign_id)
+
+    @staticmethod
+    def _build_campaign_query(campaign_id: str, account_id: Optional[str] = None) -> Dict[str, Any]:
+        query: Dict[str, Any] = {"_id": CampaignManager._get_object_id(campaign_id)}
+        if account_id:
+            query["account_id"] = account_id
+        return query
+
+    @staticmethod
+    def create(params: CreateCampaignParams, run_id: str) -> Dict[str, Any]:
+        shard_count = ConfigService[int].get_value(key="notification.campaigns.shard_count", default=4)
+        campaign_bson = CampaignModel(
+            account_id=params.account_id,
+            name=params.name,
+            template_id=params.template_id,
+            status=CampaignStatus.SNAPSHOTTING,
+            audience={
+                "segment": asdict(params.audience.segment) if params.audience.segment else None,
+                "account_ids": sorted(set(params.audience.account_ids)) if params.audience.account_ids else None,
+            },
+            shards=[
+                {
+                    "shard": shard,
+                    "status": CampaignShardStatus.RUNNING.value,
+                    "last_platform": None,
+                    "last_seq": None,
+                }
+                for shard in range(shard_count)
+            ],
+            template_data=params.template_data,
+            data=params.data,
+            image_url=params.image_url,
+            run_id=run_id,
+        ).to_bson()
+
+        campaign_bson["_id"] = CampaignRepository.collection().insert_one(campaign_bson).inserted_id
+        return campaign_bson
+
+    @staticmethod
+    def get(campaign_id: str, account_id: Optional[str] = None) -> Dict[str, Any]:
+        campaign_bson = CampaignRepository.collection().find_one(
+            CampaignManager._build_campaign_query(campaign_id, account_id)
+        )
+        if campaign_bson is None:
+            raise CampaignNotFoundError(campaign_id)
+        return campaign_bson
+
+    @staticmethod
+    def transition(
+        campaign_id: str,
+        account_id: str,
+        from_statuses: List[CampaignStatus],
+        status: CampaignStatus,
+        run_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Move a campaign to status, None when it is not in one of from_statuses"""
+        update: Dict[str, Any] = {"status": status.value, "updated_at": datetime.now()}
+        if run_id is not None:
+            update["run_id"] = run_id
+
+        return CampaignRepository.collection().find_one_and_update(
+            {
+                **CampaignManager._build_campaign_query(campaign_id, account_id),
+                "status": {"$in": [from_status.value for from_status in from_statuses]},
+            },
+            {"$set": update},
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def start(campaign_id: str, run_id: str, shard_stats: List[Dict[str, int]]) -> Optional[Dict[str, Any]]:
+        """Move a snapshotted campaign to running, None when it was cancelled meanwhile"""
+        update: Dict[str, Any] = {"status": CampaignStatus.RUNNING.value, "updated_at": datetime.now()}
+        for shard, stats in enumerate(shard_stats):
+            # Accounts without a device are settled by the snapshot already
+            update[f"shards.{shard}.audience_size"] = stats["audience_size"]
+            update[f"shards.{shard}.processed_count"] = stats["skipped_count"]
+            update[f"shards.{shard}.skipped_count"] = stats["skipped_count"]
+
+        return CampaignRepository.collection().find_one_and_update(
+            {"_id": ObjectId(campaign_id), "run_id": run_id, "status": CampaignStatus.SNAPSHOTTING.value},
+            {"$set": update},
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def record_progress(
+        campaign_id: str, shard: int, run_id: str, platform: str, seq: int, counts: Dict[str, int]
+    ) -> bool:
+        """Record a sent snapshot chunk, False when the campaign is no longer running under run_id"""
+        result = CampaignRepository.collection().update_one(
+            {"_id": ObjectId(campaign_id), "run_id": run_id, "status": CampaignStatus.RUNNING.value},
+            {
+                "$inc": {f"shards.{shard}.{counter}": count for counter, count in counts.items()},
+                "$set": {
+                    f"shards.{shard}.last_platform": platform,
+                    f"shards.{shard}.last_seq": seq,
+                    "updated_at": datetime.now(),
+                },
+            }
+        )
+        return result.matched_count > 0
+
+    @staticmethod
+    def complete_shard(campaign_id: str, shard: int, run_id: str) -> bool:
+        """Mark a shard done, and the campaign completed once it was the last shard running, True when it was"""
+        now = datetime.now()
+        collection = CampaignRepository.collection()
+        collection.update_one(
+            {"_id": ObjectId(campaign_id), "run_id": run_id, "status": CampaignStatus.RUNNING.value},
+            {"$set": {f"shards.{shard}.status": CampaignShardStatus.COMPLETED.value, "updated_at": now}}
+        )
+        result = collection.update_one(
+            {
+                "_id": ObjectId(campaign_id),
+                "status": CampaignStatus.RUNNING.value,
+                "shards.status": {"$ne": CampaignShardStatus.RUNNING.value},
+            },
+            {"$set": {"status": CampaignStatus.COMPLETED.value, "completed_at": now, "updated_at": now}}
+        )
+        return result.modified_count > 0
@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING
+
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.internal.store.notification_model import DeliveryReceiptModel
+from modules.notification.internal.store.notification_repository import DeliveryReceiptRepository
+from modules.notification.types import DeliveryReceipt, Notification, NotificationDeliveryReceipt
+
+
+class DeliveryReceiptManager:
+    """
+    Per-token delivery outcomes kept in a time-series collection. The notification and account are the
+    measurement meta, so a send's receipts land in the same bucket and are read back or scanned by failure code
+    without touching the notifications collection.
+    """
+
+    @staticmethod
+    def record(notification: Notification, receipts: List[DeliveryReceipt]) -> int:
+        """Append the receipts of one send, returns how many were written"""
+        if not receipts:
+            return 0
+
+        sent_at = datetime.now()
+        receipt_bsons = [
+            DeliveryReceiptModel(
+                notification_id=notification.id,
+                account_id=notification.account_id,
+                token=receipt.token,
+                success=receipt.success,
+                attempt=receipt.attempt,
+                latency_ms=receipt.latency_ms,
+                sent_at=sent_at,
+                platform=receipt.platform,
+                message_id=receipt.message_id,
+                error_code=receipt.error_code,
+                variant_id=notification.variant_id,
+            ).to_bson()
+            for receipt in receipts
+        ]
+        result = DeliveryReceiptRepository.collection().insert_many(receipt_bsons, ordered=False)
+        return len(result.inserted_ids)
+
+    @staticmethod
+    def get_receipts(notification_id: str, account_id: str) -> List[NotificationDeliveryReceipt]:
+        """Get every receipt of a notification, oldest send first"""
+        cursor = (
+            DeliveryReceiptRepository.collection()
+            .find({"meta.notification_id": notification_id, "meta.account_id": account_id})
+            .sort("sent_at", ASCENDING)
+        )
+        return [NotificationUtil.convert_delivery_receipt_bson_to_receipt(receipt_bson) for receipt_bson in cursor]
+
+    @staticmethod
+    def get_failed_receipts(
+        since: datetime, error_codes: Optional[List[str]] = None, limit: int = 1000
+    ) -> List[NotificationDeliveryReceipt]:
+        """Get recent failed receipts, optionally only those with the given error codes, newest first"""
+        query: Dict[str, Any] = {"sent_at": {"$gte": since}, "success": False}
+        if error_codes:
+            query["error_code"] = {"$in": error_codes}
+
+        cursor = DeliveryReceiptRepository.collection().find(query).sort("sent_at", DESCENDING).limit(limit)
+        return [NotificationUtil.convert_delivery_receipt_bson_to_receipt(receipt_bson) for receipt_bson in cursor]
@@ -0,0 +1,131 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from modules.config.config_service import ConfigService
+from modules.notification.internal.store.notification_repository import DeviceSetRepository
+
+
+class DeviceSetManager:
+    """
+    Content-addressed store of device token sets. A notification references the tokens it targets by the hash of
+    their set, so each distinct set is stored once in device_sets instead of being copied into every
+    notification. Sets never change once written, so resolved sets are cached in process without invalidation.
+    Saving a set refreshes its last_used_at, and sets unused for longer than the retention expire through a TTL index.
+    """
+
+    _sets: "OrderedDict[str, List[str]]" = OrderedDict()
+    _saved_at: Dict[str, datetime] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _get_cache_max_entries() -> int:
+        return ConfigService[int].get_value(key="notification.device_sets.cache_max_entries", default=10000)
+
+    @staticmethod
+    def _get_touch_interval() -> timedelta:
+        return timedelta(
+            seconds=ConfigService[int].get_value(key="notification.device_sets.touch_interval_seconds", default=3600)
+        )
+
+    @staticmethod
+    def _needs_save(set_hash: str, now: datetime) -> bool:
+        with DeviceSetManager._lock:
+            saved_at = DeviceSetManager._saved_at.get(set_hash)
+            return saved_at is None or now - saved_at >= DeviceSetManager._get_touch_interval()
+
+    @staticmethod
+    def _mark_saved(set_hash: str, now: datetime) -> None:
+        with DeviceSetManager._lock:
+            DeviceSetManager._saved_at[set_hash] = now
+
+    @staticmethod
+    def _get_cached(set_hash: str) -> Optional[List[str]]:
+        with DeviceSetManager._lock:
+            tokens = DeviceSetManager._sets.get(set_hash)
+            if tokens is not None:
+                DeviceSetManager._sets.move_to_end(set_hash)
+            return tokens
+
+    @staticmethod
+    def _set_cached(set_hash: str, tokens: List[str]) -> None:
+        with DeviceSetManager._lock:
+            DeviceSetManager._sets[set_hash] = tokens
+            DeviceSetManager._sets.move_to_end(set_hash)
+            while len(DeviceSetManager._sets) > DeviceSetManager._get_cache_max_entries():
+                evicted_hash, _ = DeviceSetManager._sets.popitem(last=False)
+                DeviceSetManager._saved_at.pop(evicted_hash, None)
+
+    @staticmethod
+    def get_hash(tokens: List[str]) -> str:
+        return hashlib.sha1("\n".join(tokens).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def save(tokens: List[str]) -> Optional[str]:
+        """Store a token set once and return its hash, None for an empty set"""
+        # Sorted so the same devices always hash alike, delivery results index into this order
+        tokens = sorted(set(tokens))
+        if not tokens:
+            return None
+
+        set_hash = DeviceSetManager.get_hash(tokens)
+        # A set in use is written at most once per touch interval, which keeps its last_used_at ahead of the TTL
+        now = datetime.now()
+        if DeviceSetManager._needs_save(set_hash, now):
+            DeviceSetRepository.collection().update_one(
+                {"hash": set_hash},
+                {"$set": {"last_used_at": now}, "$setOnInsert": {"tokens": tokens, "created_at": now}},
+                upsert=True
+            )
+            DeviceSetManager._set_cached(set_hash, tokens)
+            DeviceSetManager._mark_saved(set_hash, now)
+
+        return set_hash
+
+    @staticmethod
+    def backfill_last_used_at() -> int:
+        """Give sets written before last_used_at existed their creation time, so the TTL index can expire them"""
+        return DeviceSetRepository.collection().update_many(
+            {"last_used_at": {"$exists": False}}, [{"$set": {"last_used_at": "$created_at"}}]
+        ).modified_count
+
+    @staticmethod
+    def get_tokens_by_hashes(set_hashes: List[str]) -> Dict[str, List[str]]:
+        """Resolve set hashes to their tokens, reading only the sets not cached yet"""
+        token_sets: Dict[str, List[str]] = {}
+        missing_hashes = []
+        for set_hash in set(set_hashes):
+            tokens = DeviceSetManager._get_cached(set_hash)
+            if tokens is None:
+                missing_hashes.append(set_hash)
+            else:
+                token_sets[set_hash] = tokens
+
+        if missing_hashes:
+            cursor = DeviceSetRepository.collection().find(
+                {"hash": {"$in": missing_hashes}}, {"_id": 0, "hash": 1, "tokens": 1}
+            )
+            for set_bson in cursor:
+                token_sets[set_bson["hash"]] = set_bson["tokens"]
+                DeviceSetManager._set_cached(set_bson["hash"], set_bson["tokens"])
+
+        return token_sets
+
+    @staticmethod
+    def attach_device_tokens(notification_bsons: List[Dict[str, Any]]) -> None:
+        """Fill in device_tokens from the referenced device set on notifications that do not carry them"""
+        set_hashes = [
+            notification_bson["device_set_hash"]
+            for notification_bson in notification_bsons
+            if notification_bson.get("device_set_hash") and "device_tokens" not in notification_bson
+        ]
+        if not set_hashes:
+            return
+
+        token_sets = DeviceSetManager.get_tokens_by_hashes(set_hashes)
+        for notification_bson in notification_bsons:
+            set_hash = notification_bson.get("device_set_hash")
+            if set_hash and "device_tokens" not in notification_bson:
+                notification_bson["device_tokens"] = token_sets.get(set_hash, [])
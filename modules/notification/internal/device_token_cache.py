@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+from modules.config.config_service import ConfigService
+from modules.logger.logger import Logger
+from modules.notification.types import DeviceToken
+
+
+class DeviceTokenCache:
+    """
+    Bounded in-process TTL/LRU cache of each account's active device tokens, optionally backed by a shared Redis
+    cache. Writers invalidate it, entries invalidated in other processes expire after the TTL.
+    """
+
+    _entries: "OrderedDict[str, Tuple[float, List[DeviceToken]]]" = OrderedDict()
+    _lock = threading.Lock()
+    _shared_client: Optional[Any] = None
+    _shared_client_initialized: bool = False
+
+    @staticmethod
+    def _is_enabled() -> bool:
+        return ConfigService[bool].get_value(key="notification.device_token_cache.enabled", default=True)
+
+    @staticmethod
+    def _get_ttl_seconds() -> int:
+        return ConfigService[int].get_value(key="notification.device_token_cache.ttl_seconds", default=30)
+
+    @staticmethod
+    def _get_shared_key(account_id: str) -> str:
+        return f"notification:device_tokens:{account_id}"
+
+    @staticmethod
+    def _get_shared_client() -> Optional[Any]:
+        """Get the shared cache client when a Redis URL is configured and redis is installed"""
+        if not DeviceTokenCache._shared_client_initialized:
+            DeviceTokenCache._shared_client_initialized = True
+            if ConfigService.has_value("notification.device_token_cache.redis_url"):
+                try:
+                    import redis
+
+                    DeviceTokenCache._shared_client = redis.Redis.from_url(
+                        ConfigService[str].get_value(key="notification.device_token_cache.redis_url")
+                    )
+                except ImportError:
+                    Logger.warn(message="redis is not installed, device token cache is process local only")
+        return DeviceTokenCache._shared_client
+
+    @staticmethod
+    def get(account_id: str) -> Optional[List[DeviceToken]]:
+        if not DeviceTokenCache._is_enabled():
+            return None
+
+        with DeviceTokenCache._lock:
+            entry = DeviceTokenCache._entries.get(account_id)
+            if entry is not None:
+                expires_at, device_tokens = entry
+                if expires_at > time.monotonic():
+                    DeviceTokenCache._entries.move_to_end(account_id)
+                    return device_tokens
+                del DeviceTokenCache._entries[account_id]
+
+        shared_client = DeviceTokenCache._get_shared_client()
+        if shared_client is not None:
+            try:
+                cached_value = shared_client.get(DeviceTokenCache._get_shared_key(account_id))
+            except Exception as e:
+                Logger.warn(message=f"Shared device token cache read failed: {str(e)}")
+                return None
+
+            if cached_value is not None:
+                device_tokens = [
+                    DeviceToken(token=token, platform=platform) for token, platform in json.loads(cached_value)
+                ]
+                DeviceTokenCache._set_local(account_id, device_tokens)
+                return device_tokens
+
+        return None
+
+    @staticmethod
+    def _set_local(account_id: str, device_tokens: List[DeviceToken]) -> None:
+        max_entries = ConfigService[int].get_value(key="notification.device_token_cache.max_entries", default=10000)
+        expires_at = time.monotonic() + DeviceTokenCache._get_ttl_seconds()
+
+        with DeviceTokenCache._lock:
+            DeviceTokenCache._entries[account_id] = (expires_at, device_tokens)
+            DeviceTokenCache._entries.move_to_end(account_id)
+            while len(DeviceTokenCache._entries) > max_entries:
+                DeviceTokenCache._entries.popitem(last=False)
+
+    @staticmethod
+    def set(account_id: str, device_tokens: List[DeviceToken]) -> None:
+        if not DeviceTokenCache._is_enabled():
+            return
+
+        DeviceTokenCache._set_local(account_id, device_tokens)
+
+        shared_client = DeviceTokenCache._get_shared_client()
+        if shared_client is not None:
+            try:
+                shared_client.setex(
+                    DeviceTokenCache._get_shared_key(account_id),
+                    DeviceTokenCache._get_ttl_seconds(),
+                    json.dumps([[device_token.token, device_token.platform] for device_token in device_tokens])
+                )
+            except Exception as e:
+                Logger.warn(message=f"Shared device token cache write failed: {str(e)}")
+
+    @staticmethod
+    def invalidate(*account_ids: str) -> None:
+        with DeviceTokenCache._lock:
+            for account_id in account_ids:
+                DeviceTokenCache._entries.pop(account_id, None)
+
+        shared_client = DeviceTokenCache._get_shared_client()
+        if shared_client is not None and account_ids:
+            try:
+                shared_client.delete(*[DeviceTokenCache._get_shared_key(account_id) for account_id in account_ids])
+            except Exception as e:
+                Logger.warn(message=f"Shared device token cache invalidation failed: {str(e)}")
@@ -0,0 +1,121 @@
+from typing import Any, Dict, List, Optional
+
+from firebase_admin import messaging
+
+from modules.notification.types import NotificationData, NotificationPriority
+
+ANDROID_PRIORITY = {
+    NotificationPriority.LOW: "normal",
+    NotificationPriority.NORMAL: "high",
+    NotificationPriority.HIGH: "high",
+}
+
+APNS_PRIORITY = {
+    NotificationPriority.LOW: "5",
+    NotificationPriority.NORMAL: "10",
+    NotificationPriority.HIGH: "10",
+}
+
+WEBPUSH_URGENCY = {
+    NotificationPriority.LOW: "low",
+    NotificationPriority.NORMAL: "normal",
+    NotificationPriority.HIGH: "high",
+}
+
+
+class FCMMessageBuilder:
+    """
+    Builds the FCM payload of one notification. The shared notification block and each platform config are
+    created once per (notification, priority, platform) and reused for every token, only the token differs.
+    A collapse key makes the device replace an undelivered or displayed notification of the same key.
+    """
+
+    def __init__(
+        self,
+        notification_data: NotificationData,
+        priority: NotificationPriority = NotificationPriority.NORMAL,
+        collapse_key: Optional[str] = None
+    ) -> None:
+        self._notification_data = notification_data
+        self._priority = priority
+        self._collapse_key = collapse_key
+        self._data = notification_data.data or {}
+        self._notification = messaging.Notification(
+            title=notification_data.title,
+            body=notification_data.body,
+            image=notification_data.image_url
+        )
+        self._platform_configs: Dict[Optional[str], Dict[str, Any]] = {}
+
+    def _build_android_config(self) -> messaging.AndroidConfig:
+        return messaging.AndroidConfig(
+            priority=ANDROID_PRIORITY[self._priority],
+            collapse_key=self._collapse_key,
+            notification=messaging.AndroidNotification(
+                title=self._notification_data.title,
+                body=self._notification_data.body,
+                image=self._notification_data.image_url,
+                sound="default",
+                channel_id="default",
+                tag=self._collapse_key
+            )
+        )
+
+    def _build_apns_config(self) -> messaging.APNSConfig:
+        headers = {"apns-priority": APNS_PRIORITY[self._priority]}
+        if self._collapse_key:
+            headers["apns-collapse-id"] = self._collapse_key
+
+        return messaging.APNSConfig(
+            headers=headers,
+            payload=messaging.APNSPayload(
+                aps=messaging.Aps(
+                    alert=messaging.ApsAlert(
+                        title=self._notification_data.title,
+                        body=self._notification_data.body
+                    ),
+                    sound="default",
+                    badge=1
+                )
+            )
+        )
+
+    def _build_webpush_config(self) -> messaging.WebpushConfig:
+        return messaging.WebpushConfig(
+            headers={"Urgency": WEBPUSH_URGENCY[self._priority]},
+            notification=messaging.WebpushNotification(
+                title=self._notification_data.title,
+                body=self._notification_data.body,
+                image=self._notification_data.image_url,
+                icon="/icon-192x192.png"
+            )
+        )
+
+    def _get_platform_configs(self, platform: Optional[str]) -> Dict[str, Any]:
+        """Get the config blocks for a platform, all of them when the platform is unknown"""
+        platform_configs = self._platform_configs.get(platform)
+        if platform_configs is None:
+            platform_configs = {}
+            if platform in (None, "android"):
+                platform_configs["android"] = self._build_android_config()
+            if platform in (None, "ios"):
+                platform_configs["apns"] = self._build_apns_config()
+            if platform in (None, "web"):
+                platform_configs["webpush"] = self._build_webpush_config()
+            self._platform_configs[platform] = platform_configs
+        return platform_configs
+
+    def build_message(self, token: str, platform: Optional[str] = None) -> messaging.Message:
+        return messaging.Message(
+            token=token,
+            notification=self._notification,
+            data=self._data,
+            **self._get_platform_configs(platform)
+        )
+
+    def build_messages(self, tokens: List[str], platform: Optional[str] = None) -> List[messaging.Message]:
+        platform_configs = self._get_platform_configs(platform)
+        return [
+            messaging.Message(token=token, notification=self._notification, data=self._data, **platform_configs)
+            for token in tokens
+        ]
@@ -1,5 +1,8 @@
 import json
-from typing import Dict, List, Optional
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 
 import firebase_admin
 from firebase_admin import credentials, messaging
@@ -7,15 +10,28 @@ from firebase_admin import credentials, messaging
 from modules.config.config_service import ConfigService
 from modules.logger.logger import Logger
 from modules.notification.errors import FCMServiceError, NotificationValidationError
+from modules.notification.internal.fcm_message_builder import FCMMessageBuilder
+from modules.notification.internal.notification_reader import NotificationReader
 from modules.notification.types import (
+    DeliveryReceipt,
+    DeviceToken,
     FCMResponse,
-    NotificationData,
+    SendDeviceNotificationParams,
     SendNotificationParams,
     SendTopicNotificationParams,
     SubscribeToTopicParams,
     UnsubscribeFromTopicParams,
 )
 
+# Firebase Admin SDK accepts at most 1000 tokens per topic management call
+FCM_TOPIC_MANAGEMENT_BATCH_SIZE = 1000
+
+# Firebase Admin SDK accepts at most 500 messages per batch send
+FCM_SEND_BATCH_SIZE = 500
+
+# Error codes of sends that may succeed when repeated, anything else is final for the token
+FCM_RETRYABLE_ERROR_CODES = {"UNAVAILABLE", "INTERNAL", "RESOURCE_EXHAUSTED", "DEADLINE_EXCEEDED"}
+
 
 class FCMService:
     _app: Optional[firebase_admin.App] = None
@@ -50,94 +66,129 @@ class FCMService:
                 raise NotificationValidationError(f"Invalid device token: {token}")
 
     @staticmethod
-    def _create_message(notification_data: NotificationData, token: str) -> messaging.Message:
-        """Create FCM message object"""
-        notification = messaging.Notification(
-            title=notification_data.title,
-            body=notification_data.body,
-            image=notification_data.image_url
-        )
-        
-        android_config = messaging.AndroidConfig(
-            priority="high",
-            notification=messaging.AndroidNotification(
-                title=notification_data.title,
-                body=notification_data.body,
-                image=notification_data.image_url,
-                sound="default",
-                channel_id="default"
-            )
-        )
+    def _get_error_code(exception: Optional[Exception]) -> Optional[str]:
+        if exception is None:
+            return None
+        return getattr(exception, "code", None) or type(exception).__name__
+
+    @staticmethod
+    def _send_batch(builder: FCMMessageBuilder, tokens: List[str], platform: Optional[str]) -> FCMResponse:
+        """Send one provider-sized batch of tokens sharing a platform, retrying tokens that failed transiently"""
+        max_attempts = ConfigService[int].get_value(key="notification.fcm.max_attempts", default=1)
         
-        apns_config = messaging.APNSConfig(
-            payload=messaging.APNSPayload(
-                aps=messaging.Aps(
-                    alert=messaging.ApsAlert(
-                        title=notification_data.title,
-                        body=notification_data.body
-                    ),
-                    sound="default",
-                    badge=1
+        receipts: Dict[str, DeliveryReceipt] = {}
+        attempt_tokens = tokens
+        for attempt in range(1, max_attempts + 1):
+            started_at = time.monotonic()
+            response = messaging.send_all(builder.build_messages(attempt_tokens, platform))
+            latency_ms = round((time.monotonic() - started_at) * 1000, 1)
+            
+            retry_tokens = []
+            for token, resp in zip(attempt_tokens, response.responses):
+                error_code = FCMService._get_error_code(resp.exception)
+                receipts[token] = DeliveryReceipt(
+                    token=token,
+                    success=resp.success,
+                    attempt=attempt,
+                    latency_ms=latency_ms,
+                    platform=platform,
+                    message_id=resp.message_id,
+                    error_code=error_code
                 )
-            )
-        )
+                if not resp.success and error_code in FCM_RETRYABLE_ERROR_CODES:
+                    retry_tokens.append(token)
+            
+            if not retry_tokens or attempt == max_attempts:
+                break
+            attempt_tokens = retry_tokens
+            time.sleep(0.5 * 2 ** (attempt - 1))
         
-        webpush_config = messaging.WebpushConfig(
-            notification=messaging.WebpushNotification(
-                title=notification_data.title,
-                body=notification_data.body,
-                image=notification_data.image_url,
-                icon="/icon-192x192.png"
-            )
+        failed_tokens = []
+        for token in tokens:
+            if not receipts[token].success:
+                failed_tokens.append(token)
+                Logger.warn(message=f"Failed to send notification to token {token}: {receipts[token].error_code}")
+        
+        return FCMResponse(
+            success_count=len(tokens) - len(failed_tokens),
+            failure_count=len(failed_tokens),
+            failed_tokens=failed_tokens,
+            receipts=[receipts[token] for token in tokens]
         )
+
+    @staticmethod
+    def _send_partition(builder: FCMMessageBuilder, tokens: List[str], platform: Optional[str]) -> FCMResponse:
+        """Send all tokens of one platform using that platform's own concurrency budget"""
+        batches = [tokens[i:i + FCM_SEND_BATCH_SIZE] for i in range(0, len(tokens), FCM_SEND_BATCH_SIZE)]
+        concurrency = ConfigService[int].get_value(
+            key=f"notification.fcm.platform_concurrency.{platform or 'unknown'}", default=4
+        )
+        
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as executor:
+            responses = list(executor.map(lambda batch: FCMService._send_batch(builder, batch, platform), batches))
         
-        return messaging.Message(
-            notification=notification,
-            token=token,
-            data=notification_data.data or {},
-            android=android_config,
-            apns=apns_config,
-            webpush=webpush_config
+        return FCMResponse(
+            success_count=sum(response.success_count for response in responses),
+            failure_count=sum(response.failure_count for response in responses),
+            failed_tokens=[token for response in responses for token in response.failed_tokens],
+            receipts=[receipt for response in responses for receipt in response.receipts or []]
         )
 
     @staticmethod
-    def send_notification(params: SendNotificationParams) -> FCMResponse:
-        """Send push notification to multiple devices"""
+    def send_to_devices(params: SendDeviceNotificationParams) -> FCMResponse:
+        """Send push notification to devices, routing each platform through its own lean message template"""
         try:
             FCMService._initialize_app()
-            FCMService._validate_tokens(params.recipient_tokens)
+            FCMService._validate_tokens([recipient.token for recipient in params.recipients])
             
-            # Create messages for each token
-            messages = []
-            for token in params.recipient_tokens:
-                message = FCMService._create_message(params.notification, token)
-                messages.append(message)
+            partitions: Dict[Optional[str], List[str]] = defaultdict(list)
+            for recipient in params.recipients:
+                partitions[recipient.platform or None].append(recipient.token)
             
-            # Send multicast message
-            response = messaging.send_all(messages)
+            # Platform configs are built once per send and each partition only carries its own block
+            builder = FCMMessageBuilder(params.notification, params.priority, params.collapse_key)
             
-            failed_tokens = []
-            for i, resp in enumerate(response.responses):
-                if not resp.success:
-                    failed_tokens.append(params.recipient_tokens[i])
-                    Logger.warn(
-                        message=f"Failed to send notification to token {params.recipient_tokens[i]}: {resp.exception}"
-                    )
+            # Partitions run side by side, so slow web push batches never queue ahead of mobile ones
+            with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+                futures = {
+                    platform: executor.submit(FCMService._send_partition, builder, tokens, platform)
+                    for platform, tokens in partitions.items()
+                }
+                responses = {platform: future.result() for platform, future in futures.items()}
             
-            Logger.info(
-                message=f"Notification sent. Success: {response.success_count}, Failed: {response.failure_count}"
-            )
+            for platform, response in responses.items():
+                Logger.info(
+                    message=f"Notification sent to {platform or 'unknown'} devices. "
+                    f"Success: {response.success_count}, Failed: {response.failure_count}"
+                )
             
             return FCMResponse(
-                success_count=response.success_count,
-                failure_count=response.failure_count,
-                failed_tokens=failed_tokens
+                success_count=sum(response.success_count for response in responses.values()),
+                failure_count=sum(response.failure_count for response in responses.values()),
+                failed_tokens=[token for response in responses.values() for token in response.failed_tokens],
+                receipts=[receipt for response in responses.values() for receipt in response.receipts or []]
             )
             
+        except FCMServiceError:
+            raise
         except Exception as e:
             Logger.error(message=f"FCM send notification error: {str(e)}")
             raise FCMServiceError(str(e))
 
+    @staticmethod
+    def send_notification(params: SendNotificationParams) -> FCMResponse:
+        """Send push notification to multiple devices"""
+        # Bare tokens are paired with their recorded platform, unknown tokens get every platform block
+        platforms = NotificationReader.get_device_token_platforms(params.recipient_tokens)
+        recipients = [DeviceToken(token=token, platform=platforms.get(token, "")) for token in params.recipient_tokens]
+        
+        return FCMService.send_to_devices(SendDeviceNotificationParams(
+            recipients=recipients,
+            notification=params.notification,
+            priority=params.priority,
+            collapse_key=params.collapse_key
+        ))
+
     @staticmethod
     def send_topic_notification(params: SendTopicNotificationParams) -> FCMResponse:
         """Send notification to a topic"""
@@ -174,6 +225,41 @@ class FCMService:
             Logger.error(message=f"FCM send topic notification error: {str(e)}")
             raise FCMServiceError(str(e))
 
+    @staticmethod
+    def _manage_topic_subscription(
+        operation: Callable[[List[str], str], messaging.TopicManagementResponse],
+        tokens: List[str],
+        topic: str
+    ) -> FCMResponse:
+        """Run a topic management call in provider-sized chunks, concurrently"""
+        chunks = [
+            tokens[i:i + FCM_TOPIC_MANAGEMENT_BATCH_SIZE]
+            for i in range(0, len(tokens), FCM_TOPIC_MANAGEMENT_BATCH_SIZE)
+        ]
+        if not chunks:
+            return FCMResponse(success_count=0, failure_count=0, failed_tokens=[])
+        
+        max_workers = ConfigService[int].get_value(key="notification.fcm.topic_management_concurrency", default=8)
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            responses = list(executor.map(lambda chunk: operation(chunk, topic), chunks))
+        
+        success_count = 0
+        failure_count = 0
+        failed_tokens = []
+        for chunk, response in zip(chunks, responses):
+            success_count += response.success_count
+            failure_count += response.failure_count
+            for error in response.errors:
+                failed_tokens.append(chunk[error.index])
+                Logger.warn(message=f"Topic '{topic}' management failed for token {chunk[error.index]}: {error.reason}")
+        
+        return FCMResponse(
+            success_count=success_count,
+            failure_count=failure_count,
+            failed_tokens=failed_tokens
+        )
+
     @staticmethod
     def subscribe_to_topic(params: SubscribeToTopicParams) -> FCMResponse:
         """Subscribe tokens to a topic"""
@@ -184,23 +270,13 @@ class FCMService:
             if not params.topic:
                 raise NotificationValidationError("Topic cannot be empty")
             
-            response = messaging.subscribe_to_topic(params.tokens, params.topic)
+            response = FCMService._manage_topic_subscription(messaging.subscribe_to_topic, params.tokens, params.topic)
             
             Logger.info(
                 message=f"Subscribed tokens to topic '{params.topic}'. Success: {response.success_count}, Failed: {response.failure_count}"
             )
             
-            failed_tokens = []
-            for i, error in enumerate(response.errors):
-                if error:
-                    failed_tokens.append(params.tokens[i])
-                    Logger.warn(message=f"Failed to subscribe token {params.tokens[i]}: {error}")
-            
-            return FCMResponse(
-                success_count=response.success_count,
-                failure_count=response.failure_count,
-                failed_tokens=failed_tokens
-            )
+            return response
             
         except Exception as e:
             Logger.error(message=f"FCM subscribe to topic error: {str(e)}")
@@ -216,23 +292,15 @@ class FCMService:
             if not params.topic:
                 raise NotificationValidationError("Topic cannot be empty")
             
-            response = messaging.unsubscribe_from_topic(params.tokens, params.topic)
+            response = FCMService._manage_topic_subscription(
+                messaging.unsubscribe_from_topic, params.tokens, params.topic
+            )
             
             Logger.info(
                 message=f"Unsubscribed tokens from topic '{params.topic}'. Success: {response.success_count}, Failed: {response.failure_count}"
             )
             
-            failed_tokens = []
-            for i, error in enumerate(response.errors):
-                if error:
-                    failed_tokens.append(params.tokens[i])
-                    Logger.warn(message=f"Failed to unsubscribe token {params.tokens[i]}: {error}")
-            
-            return FCMResponse(
-                success_count=response.success_count,
-                failure_count=response.failure_count,
-                failed_tokens=failed_tokens
-            )
+            return response
             
         except Exception as e:
             Logger.error(message=f"FCM unsubscribe from topic error: {str(e)}")
@@ -0,0 +1,84 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from modules.notification.errors import IdempotencyKeyInProgressError
+from modules.notification.internal.store.notification_repository import IdempotencyKeyRepository
+from modules.notification.types import IdempotencyKeyStatus
+
+
+class IdempotencyManager:
+    """
+    Records which (account_id, key) pairs already produced a notification. The unique index makes the claim
+    atomic across processes and the TTL index drops keys once their replay window has passed.
+    """
+
+    @staticmethod
+    def get_content_key(account_id: str, title: str, body: str) -> str:
+        """Get the dedup key of a notification's content"""
+        digest = hashlib.sha256("\x1f".join([account_id, title or "", body or ""]).encode("utf-8")).hexdigest()
+        return f"content:{digest}"
+
+    @staticmethod
+    def claim(account_id: str, key: str, ttl_seconds: int) -> Optional[str]:
+        """
+        Claim a key before doing the work. Returns None when the caller now owns the key, or the id of the
+        notification a previous request with the same key already created
+        """
+        now = datetime.now()
+        record = {
+            "account_id": account_id,
+            "key": key,
+            "status": IdempotencyKeyStatus.IN_PROGRESS,
+            "notification_id": None,
+            "expires_at": now + timedelta(seconds=ttl_seconds),
+            "created_at": now,
+            "updated_at": now,
+        }
+
+        try:
+            IdempotencyKeyRepository.collection().insert_one(record)
+            return None
+        except DuplicateKeyError:
+            pass
+
+        existing = IdempotencyKeyRepository.collection().find_one({"account_id": account_id, "key": key})
+
+        if existing is None or existing["expires_at"] <= now:
+            # The TTL monitor only runs periodically, an expired key is free to take over
+            IdempotencyKeyRepository.collection().delete_one(
+                {"account_id": account_id, "key": key, "expires_at": {"$lte": now}}
+            )
+            try:
+                IdempotencyKeyRepository.collection().insert_one(record)
+                return None
+            except DuplicateKeyError:
+                existing = IdempotencyKeyRepository.collection().find_one({"account_id": account_id, "key": key})
+
+        if existing and existing["status"] == IdempotencyKeyStatus.COMPLETED and existing.get("notification_id"):
+            return existing["notification_id"]
+
+        raise IdempotencyKeyInProgressError(key)
+
+    @staticmethod
+    def complete(account_id: str, key: str, notification_id: str) -> None:
+        """Record the notification a claimed key produced"""
+        IdempotencyKeyRepository.collection().update_one(
+            {"account_id": account_id, "key": key},
+            {
+                "$set": {
+                    "status": IdempotencyKeyStatus.COMPLETED,
+                    "notification_id": notification_id,
+                    "updated_at": datetime.now(),
+                }
+            }
+        )
+
+    @staticmethod
+    def release(account_id: str, key: str) -> None:
+        """Release a claimed key whose work failed, so a retry can run it again"""
+        IdempotencyKeyRepository.collection().delete_one(
+            {"account_id": account_id, "key": key, "status": IdempotencyKeyStatus.IN_PROGRESS}
+        )
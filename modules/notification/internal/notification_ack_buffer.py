@@ -0,0 +1,125 @@
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import InsertOne
+
+from modules.config.config_service import ConfigService
+from modules.logger.logger import Logger
+from modules.notification.errors import NotificationAckFlushError
+from modules.notification.internal.notification_event_manager import NotificationEventManager
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.internal.notification_writer import NotificationWriter
+from modules.notification.internal.store.notification_model import NotificationEventModel
+from modules.notification.internal.store.notification_repository import NotificationEventRepository
+from modules.notification.types import NotificationStatus
+
+
+class _AckBatch:
+    def __init__(self) -> None:
+        self.events: List[NotificationEventModel] = []
+        self.flushed = threading.Event()
+        self.error: Optional[Exception] = None
+
+
+class NotificationAckBuffer:
+    """
+    Group commit for client acks. Acks from concurrent requests collect in one in-process batch that is written
+    with a single bulk write once it holds max_batch_size acks or flush_interval_ms passes. A request returns only
+    after the batch holding its acks is stored and a failed write fails every request in the batch, so an SDK
+    that retries until accepted gets at-least-once delivery. Replayed acks change nothing.
+    """
+
+    _batch = _AckBatch()
+    _lock = threading.Lock()
+    _flusher: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _get_max_batch_size() -> int:
+        return ConfigService[int].get_value(key="notification.acks.max_batch_size", default=1000)
+
+    @staticmethod
+    def _get_flush_interval_seconds() -> float:
+        return ConfigService[int].get_value(key="notification.acks.flush_interval_ms", default=50) / 1000
+
+    @staticmethod
+    def _take_batch() -> _AckBatch:
+        # Callers hold the lock, later acks go to a fresh batch while this one is written
+        batch = NotificationAckBuffer._batch
+        NotificationAckBuffer._batch = _AckBatch()
+        return batch
+
+    @staticmethod
+    def _start_flusher() -> None:
+        if NotificationAckBuffer._flusher is None or not NotificationAckBuffer._flusher.is_alive():
+            NotificationAckBuffer._flusher = threading.Thread(
+                target=NotificationAckBuffer._run_flusher, name="notification-ack-flusher", daemon=True
+            )
+            NotificationAckBuffer._flusher.start()
+
+    @staticmethod
+    def _run_flusher() -> None:
+        while True:
+            time.sleep(NotificationAckBuffer._get_flush_interval_seconds())
+            with NotificationAckBuffer._lock:
+                if not NotificationAckBuffer._batch.events:
+                    continue
+                batch = NotificationAckBuffer._take_batch()
+            NotificationAckBuffer._write(batch)
+
+    @staticmethod
+    def _build_rollups(
+        events: List[NotificationEventModel]
+    ) -> List[Tuple[str, str, NotificationStatus, Dict[str, datetime]]]:
+        """Merge a batch's acks into one status update per notification"""
+        event_times: Dict[Tuple[str, str], Dict[str, datetime]] = {}
+        for event in events:
+            notification_event_times = event_times.setdefault((event.account_id, event.notification_id), {})
+            first_time = notification_event_times.get(event.event_type)
+            if first_time is None or event.occurred_at < first_time:
+                notification_event_times[event.event_type] = event.occurred_at
+
+        rollups = []
+        for (account_id, notification_id), times in event_times.items():
+            derived = NotificationUtil.derive_status_from_events(times)
+            if derived is not None:
+                rollups.append((account_id, notification_id, derived[0], derived[1]))
+        return rollups
+
+    @staticmethod
+    def _write(batch: _AckBatch) -> None:
+        try:
+            if NotificationEventManager.is_enabled():
+                NotificationEventRepository.collection().bulk_write(
+                    [InsertOne(event.to_bson()) for event in batch.events], ordered=False
+                )
+            else:
+                # Without the event path the acks are folded straight into their notifications
+                NotificationWriter.apply_event_statuses(NotificationAckBuffer._build_rollups(batch.events))
+        except Exception as e:
+            batch.error = e
+            Logger.error(message=f"Failed to flush {len(batch.events)} notification acks: {str(e)}")
+        finally:
+            batch.flushed.set()
+
+    @staticmethod
+    def add(events: List[NotificationEventModel]) -> None:
+        """Add acks to the current batch and block until the batch is stored"""
+        with NotificationAckBuffer._lock:
+            NotificationAckBuffer._start_flusher()
+            batch = NotificationAckBuffer._batch
+            batch.events.extend(events)
+            is_full = len(batch.events) >= NotificationAckBuffer._get_max_batch_size()
+            if is_full:
+                NotificationAckBuffer._take_batch()
+
+        # A full batch is written by the request that filled it instead of waiting for the next interval
+        if is_full:
+            NotificationAckBuffer._write(batch)
+
+        timeout_seconds = ConfigService[int].get_value(key="notification.acks.flush_timeout_seconds", default=5)
+        if not batch.flushed.wait(timeout=timeout_seconds):
+            raise NotificationAckFlushError(f"the batch was not written within {timeout_seconds} seconds")
+        if batch.error is not None:
+            raise NotificationAckFlushError(str(batch.error))
@@ -0,0 +1,132 @@
+import gzip
+import json
+from dataclasses import replace
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from modules.config.config_service import ConfigService
+from modules.notification.errors import NotificationArchiveError, NotificationValidationError
+from modules.notification.internal.notification_archive_writer import PARQUET_JSON_FIELDS, NotificationArchiveWriter
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.types import Notification, NotificationArchivePage, NotificationArchiveSearchParams
+
+
+class NotificationArchiveReader:
+    @staticmethod
+    def _read_ndjson_file(file_path: Path, account_id: str) -> Iterator[Dict[str, Any]]:
+        """Read archive records for an account from a gzip compressed NDJSON file"""
+        with gzip.open(file_path, "rt", encoding="utf-8") as archive_file:
+            for line in archive_file:
+                record = json.loads(line)
+                if record.get("account_id") == account_id:
+                    yield record
+
+    @staticmethod
+    def _read_parquet_file(file_path: Path, account_id: str) -> Iterator[Dict[str, Any]]:
+        """Read archive records for an account from a Parquet file"""
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise NotificationArchiveError("pyarrow must be installed to read Parquet notification archives")
+
+        table = pyarrow.parquet.read_table(file_path, filters=[("account_id", "=", account_id)])
+        for record in table.to_pylist():
+            for field in PARQUET_JSON_FIELDS:
+                if record.get(field) is not None:
+                    record[field] = json.loads(record[field])
+            yield record
+
+    @staticmethod
+    def _iter_partition_records(partition_path: Path, account_id: str) -> Iterator[Tuple[str, int, Dict[str, Any]]]:
+        """Yield (file name, position in file, record) for an account's records of one partition, in file order"""
+        if not partition_path.is_dir():
+            return
+
+        for file_path in sorted(partition_path.iterdir()):
+            if file_path.name.endswith(".ndjson.gz"):
+                records = NotificationArchiveReader._read_ndjson_file(file_path, account_id)
+            elif file_path.name.endswith(".parquet"):
+                records = NotificationArchiveReader._read_parquet_file(file_path, account_id)
+            else:
+                continue
+
+            for index, record in enumerate(records):
+                yield file_path.name, index, record
+
+    @staticmethod
+    def _parse_cursor(cursor: str) -> Tuple[date, str, int]:
+        """A cursor is "<partition date>:<file name>:<position in file>" of the last record returned"""
+        try:
+            partition_date, file_name, index = cursor.split(":")
+            return date.fromisoformat(partition_date), file_name, int(index)
+        except ValueError:
+            raise NotificationValidationError(f"Invalid archive cursor '{cursor}'")
+
+    @staticmethod
+    def _iter_archived_notifications(
+        account_id: str, start_date: date, end_date: date, position: Optional[Tuple[date, str, int]]
+    ) -> Iterator[Tuple[Notification, str]]:
+        root_path = NotificationArchiveWriter.get_archive_root_path()
+        partition_date = max(start_date, position[0]) if position else start_date
+        while partition_date <= end_date:
+            # Only the account's bucket of each day is scanned. A batch re-archived after an interrupted run is
+            # deduplicated by id, so records before the cursor in its partition are read again for their ids
+            seen_ids: Set[str] = set()
+            partition_path = NotificationUtil.get_archive_partition_path(root_path, partition_date, account_id)
+            records = NotificationArchiveReader._iter_partition_records(partition_path, account_id)
+            for file_name, index, record in records:
+                if record["_id"] in seen_ids:
+                    continue
+                seen_ids.add(record["_id"])
+
+                if position and (partition_date, file_name, index) <= position:
+                    continue
+
+                notification_bson = NotificationUtil.convert_archive_record_to_notification_bson(record)
+                yield (
+                    NotificationUtil.convert_notification_bson_to_notification(notification_bson),
+                    f"{partition_date.isoformat()}:{file_name}:{index}",
+                )
+
+            partition_date += timedelta(days=1)
+
+    @staticmethod
+    def iter_archived_notifications(params: NotificationArchiveSearchParams) -> Iterator[Tuple[Notification, str]]:
+        """Lazily read archived notifications within a date range, each with the cursor that resumes after it"""
+        # Validated here rather than in the generator, so bad input fails before anything is read
+        try:
+            start_date = date.fromisoformat(params.start_date[:10])
+            end_date = date.fromisoformat(params.end_date[:10])
+        except ValueError:
+            raise NotificationValidationError("start_date and end_date must be ISO formatted dates")
+
+        if start_date > end_date:
+            raise NotificationValidationError("start_date must not be after end_date")
+
+        position = NotificationArchiveReader._parse_cursor(params.cursor) if params.cursor else None
+        return NotificationArchiveReader._iter_archived_notifications(
+            params.account_id, start_date, end_date, position
+        )
+
+    @staticmethod
+    def get_archived_notifications(params: NotificationArchiveSearchParams) -> NotificationArchivePage:
+        """
+        Get one page of archived notifications, reading only as many archive records as the page needs. A limit
+        above notification.archive.max_page_size is clamped to it.
+        """
+        if params.limit < 1:
+            raise NotificationValidationError("limit must be a positive integer")
+        max_limit = ConfigService[int].get_value(key="notification.archive.max_page_size", default=1000)
+        params = replace(params, limit=min(params.limit, max_limit))
+
+        notifications: List[Notification] = []
+        last_cursor = None
+        for notification, cursor in NotificationArchiveReader.iter_archived_notifications(params):
+            # One record past the page proves there is a next page
+            if len(notifications) == params.limit:
+                return NotificationArchivePage(notifications=notifications, next_cursor=last_cursor)
+            notifications.append(notification)
+            last_cursor = cursor
+
+        return NotificationArchivePage(notifications=notifications)
@@ -0,0 +1,165 @@
+import gzip
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from modules.config.config_service import ConfigService
+from modules.notification.errors import NotificationArchiveError
+from modules.notification.internal.device_set_manager import DeviceSetManager
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.internal.notification_writer import NotificationWriter
+from modules.notification.internal.store.notification_repository import NotificationRepository
+from modules.notification.types import (
+    NotificationArchiveFormat,
+    NotificationCleanupMode,
+    NotificationCleanupParams,
+    NotificationCleanupResult,
+    NotificationStorageEngine,
+)
+
+# Nested documents are stored as JSON strings in Parquet so every file shares one flat schema
+PARQUET_JSON_FIELDS = ["data", "template_data", "delivery_results"]
+
+
+class NotificationArchiveWriter:
+    @staticmethod
+    def get_archive_root_path() -> Path:
+        """Get the local directory archived notifications are written to"""
+        return Path(ConfigService[str].get_value(key="notification.archive.root_path", default="archive/notifications"))
+
+    @staticmethod
+    def _write_ndjson_file(file_path: Path, records: List[Dict[str, Any]]) -> None:
+        """Write records as a gzip compressed newline-delimited JSON file"""
+        with gzip.open(file_path, "wt", encoding="utf-8") as archive_file:
+            for record in records:
+                archive_file.write(json.dumps(record, default=str))
+                archive_file.write("\n")
+
+    @staticmethod
+    def _write_parquet_file(file_path: Path, records: List[Dict[str, Any]]) -> None:
+        """Write records as a zstd compressed Parquet file"""
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise NotificationArchiveError("pyarrow must be installed to archive notifications as Parquet")
+
+        rows = []
+        for record in records:
+            row = dict(record)
+            for field in PARQUET_JSON_FIELDS:
+                row[field] = json.dumps(row[field], default=str) if row.get(field) is not None else None
+            rows.append(row)
+
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), file_path, compression="zstd")
+
+    @staticmethod
+    def _write_partition_file(
+        partition_path: Path, records: List[Dict[str, Any]], archive_format: NotificationArchiveFormat
+    ) -> None:
+        """Durably write one archive file, so originals are only deleted once their copy is on disk"""
+        partition_path.mkdir(parents=True, exist_ok=True)
+        extension = "parquet" if archive_format == NotificationArchiveFormat.PARQUET else "ndjson.gz"
+        file_path = partition_path / f"notifications-{records[0]['_id']}.{extension}"
+        temp_path = file_path.with_name(f".{file_path.name}.tmp")
+
+        if archive_format == NotificationArchiveFormat.PARQUET:
+            NotificationArchiveWriter._write_parquet_file(temp_path, records)
+        else:
+            NotificationArchiveWriter._write_ndjson_file(temp_path, records)
+
+        with open(temp_path, "rb") as written_file:
+            os.fsync(written_file.fileno())
+        os.replace(temp_path, file_path)
+
+    @staticmethod
+    def _archive_batch(
+        batch: List[Dict[str, Any]], root_path: Path, archive_format: NotificationArchiveFormat
+    ) -> int:
+        """Write a batch to its date/account partitions and delete the archived originals"""
+        # Archive files stay self contained, so they carry the tokens rather than a device set hash
+        DeviceSetManager.attach_device_tokens(batch)
+
+        partitions: Dict[Path, List[Dict[str, Any]]] = defaultdict(list)
+        for notification_bson in batch:
+            created_at = notification_bson.get("created_at") or datetime.now()
+            partition_path = NotificationUtil.get_archive_partition_path(
+                root_path, created_at.date(), notification_bson.get("account_id", "")
+            )
+            partitions[partition_path].append(
+                NotificationUtil.convert_notification_bson_to_archive_record(notification_bson)
+            )
+
+        for partition_path, records in partitions.items():
+            NotificationArchiveWriter._write_partition_file(partition_path, records, archive_format)
+
+        ids = [notification_bson["_id"] for notification_bson in batch]
+        result = NotificationRepository.collection().delete_many({"_id": {"$in": ids}})
+        return result.deleted_count
+
+    @staticmethod
+    def archive_old_notifications(
+        params: NotificationCleanupParams,
+        on_progress: Optional[Callable[[NotificationCleanupResult], None]] = None
+    ) -> NotificationCleanupResult:
+        """Stream aged terminal notifications to compressed archive files, then delete them"""
+        # Only the document collection is archived, bucketed notifications would never reach an archive file
+        if NotificationUtil.get_storage_engine() == NotificationStorageEngine.BUCKET:
+            raise NotificationArchiveError("archive cleanup is not supported with the bucket storage engine")
+
+        root_path = NotificationArchiveWriter.get_archive_root_path()
+        archive_format = NotificationUtil.get_archive_format()
+
+        cursor = (
+            NotificationRepository.collection()
+            .find(NotificationWriter.build_retention_query(params.days_old))
+            .sort("_id", 1)
+            .hint([("_id", 1)])
+            .batch_size(params.batch_size)
+        )
+        if params.max_documents is not None:
+            cursor = cursor.limit(params.max_documents)
+
+        started_at = time.monotonic()
+        archived_count = 0
+        batch_count = 0
+        batch: List[Dict[str, Any]] = []
+
+        def flush() -> None:
+            nonlocal archived_count, batch_count
+            archived_count += NotificationArchiveWriter._archive_batch(batch, root_path, archive_format)
+            batch_count += 1
+            batch.clear()
+
+            if on_progress:
+                on_progress(NotificationCleanupResult(
+                    mode=NotificationCleanupMode.ARCHIVE,
+                    deleted_count=archived_count,
+                    batch_count=batch_count,
+                    elapsed_seconds=time.monotonic() - started_at
+                ))
+
+        try:
+            for notification_bson in cursor:
+                batch.append(notification_bson)
+                if len(batch) >= params.batch_size:
+                    flush()
+                    if params.pause_seconds > 0:
+                        time.sleep(params.pause_seconds)
+
+            if batch:
+                flush()
+        finally:
+            cursor.close()
+
+        return NotificationCleanupResult(
+            mode=NotificationCleanupMode.ARCHIVE,
+            deleted_count=archived_count,
+            batch_count=batch_count,
+            elapsed_seconds=time.monotonic() - started_at,
+            has_more=params.max_documents is not None and archived_count >= params.max_documents
+        )
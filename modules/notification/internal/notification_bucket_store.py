@@ -0,0 +1,258 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from modules.config.config_service import ConfigService
+from modules.notification.errors import NotificationNotFoundError
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.internal.store.notification_repository import NotificationBucketRepository
+from modules.notification.types import NotificationStatus, NotificationStorageEngine
+
+UNREAD_NOTIFICATION_STATUSES = [
+    NotificationStatus.PENDING.value,
+    NotificationStatus.SENT.value,
+    NotificationStatus.DELIVERED.value,
+]
+
+
+class NotificationBucketStore:
+    """
+    Bucket storage engine. Each account's notifications are packed into time-bounded bucket documents of up to
+    bucket_size notifications, oldest first, so an inbox page reads one or two documents instead of one per
+    notification. Single notifications are updated in place through the positional operator, and every bucket
+    carries its own total and unread counters.
+    """
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return NotificationUtil.get_storage_engine() == NotificationStorageEngine.BUCKET
+
+    @staticmethod
+    def _get_object_id(notification_id: str) -> ObjectId:
+        try:
+            return ObjectId(notification_id)
+        except Exception:
+            raise NotificationNotFoundError(notification_id)
+
+    @staticmethod
+    def _build_bucket_query(
+        object_id: ObjectId, account_id: Optional[str], notification_query: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        # The positional operator and projection resolve to the element matched here
+        query: Dict[str, Any] = {"notifications": {"$elemMatch": {"_id": object_id, **(notification_query or {})}}}
+        if account_id:
+            query["account_id"] = account_id
+        return query
+
+    @staticmethod
+    def _build_projection(projection: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Map a projection on notification fields onto the bucket's notifications array"""
+        if projection is None:
+            return None
+
+        bucket_projection = {f"notifications.{key}": value for key, value in projection.items()}
+        if any(projection.values()):
+            bucket_projection.update({"account_id": 1, "notifications._id": 1})
+        return bucket_projection
+
+    @staticmethod
+    def _to_notification_bson(bucket_bson: Dict[str, Any], element: Dict[str, Any]) -> Dict[str, Any]:
+        return {**element, "account_id": bucket_bson["account_id"]}
+
+    @staticmethod
+    def insert_many(notification_bsons: List[Dict[str, Any]]) -> List[ObjectId]:
+        """Append notifications to their accounts' open buckets, returns the new notification ids in order"""
+        bucket_size = ConfigService[int].get_value(key="notification.storage.bucket_size", default=200)
+        bucket_seconds = ConfigService[int].get_value(key="notification.storage.bucket_seconds", default=86400)
+
+        inserted_ids = []
+        elements_by_account: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for notification_bson in notification_bsons:
+            element = {key: value for key, value in notification_bson.items() if key != "account_id"}
+            element["_id"] = ObjectId()
+            inserted_ids.append(element["_id"])
+            elements_by_account[notification_bson["account_id"]].append(element)
+
+        now = datetime.now()
+        for account_id, elements in elements_by_account.items():
+            for i in range(0, len(elements), bucket_size):
+                chunk = elements[i:i + bucket_size]
+                unread_count = len([element for element in chunk if element["status"] in UNREAD_NOTIFICATION_STATUSES])
+                # Appends go to a recent bucket with room left, otherwise the upsert opens a new one
+                NotificationBucketRepository.collection().update_one(
+                    {
+                        "account_id": account_id,
+                        "count": {"$lte": bucket_size - len(chunk)},
+                        "start_at": {"$gte": now - timedelta(seconds=bucket_seconds)},
+                    },
+                    {
+                        "$push": {"notifications": {"$each": chunk}},
+                        "$inc": {"count": len(chunk), "unread_count": unread_count},
+                        "$max": {"end_at": now},
+                        "$set": {"updated_at": now},
+                        "$setOnInsert": {"start_at": now, "created_at": now},
+                    },
+                    upsert=True
+                )
+
+        return inserted_ids
+
+    @staticmethod
+    def find_by_id(notification_id: str, account_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get one notification out of its bucket"""
+        object_id = NotificationBucketStore._get_object_id(notification_id)
+        bucket_bson = NotificationBucketRepository.collection().find_one(
+            NotificationBucketStore._build_bucket_query(object_id, account_id),
+            {"account_id": 1, "notifications.$": 1}
+        )
+
+        if bucket_bson is None:
+            return None
+
+        return NotificationBucketStore._to_notification_bson(bucket_bson, bucket_bson["notifications"][0])
+
+    @staticmethod
+    def find_pending_by_ids(notification_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get the notifications among notification_ids that are still waiting to be sent"""
+        object_ids = [ObjectId(notification_id) for notification_id in notification_ids]
+        cursor = NotificationBucketRepository.collection().aggregate([
+            {"$match": {"notifications._id": {"$in": object_ids}}},
+            {"$unwind": "$notifications"},
+            {
+                "$match": {
+                    "notifications._id": {"$in": object_ids},
+                    "notifications.status": NotificationStatus.PENDING.value,
+                }
+            },
+            {"$replaceWith": {"$mergeObjects": ["$notifications", {"account_id": "$account_id"}]}},
+        ])
+
+        return list(cursor)
+
+    @staticmethod
+    def iter_notifications(
+        account_id: Optional[str],
+        filters: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        newest_first: bool = True,
+        batch_size: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream notifications bucket by bucket, filters are equality matches on notification fields"""
+        query: Dict[str, Any] = {}
+        if account_id:
+            query["account_id"] = account_id
+        if filters:
+            # Buckets without a single matching notification are skipped by the server
+            query["notifications"] = {"$elemMatch": filters}
+
+        cursor = (
+            NotificationBucketRepository.collection()
+            .find(query, NotificationBucketStore._build_projection(projection))
+            .sort("end_at", DESCENDING if newest_first else ASCENDING)
+        )
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+
+        try:
+            for bucket_bson in cursor:
+                elements = bucket_bson.get("notifications", [])
+                for element in reversed(elements) if newest_first else elements:
+                    if all(element.get(key) == value for key, value in filters.items()):
+                        yield NotificationBucketStore._to_notification_bson(bucket_bson, element)
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def find_page(
+        account_id: Optional[str],
+        filters: Dict[str, Any],
+        offset: int,
+        limit: int,
+        projection: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Get a newest first page of notifications, reading only the buckets the page spans"""
+        notifications = NotificationBucketStore.iter_notifications(account_id, filters, projection)
+        try:
+            return list(islice(notifications, offset, offset + limit))
+        finally:
+            notifications.close()
+
+    @staticmethod
+    def update_notification(
+        notification_id: str,
+        fields: Dict[str, Any],
+        account_id: Optional[str] = None,
+        notification_query: Optional[Dict[str, Any]] = None,
+        return_document: ReturnDocument = ReturnDocument.AFTER
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Set fields on one notification in place and return it as return_document asks, None when it does not
+        exist or does not match notification_query. A status change moves the bucket's unread counter only when it
+        crosses between read and unread, decided by the update itself so concurrent changes cannot count twice.
+        """
+        object_id = NotificationBucketStore._get_object_id(notification_id)
+        notification_query = notification_query or {}
+        update: Dict[str, Any] = {"$set": {f"notifications.$.{key}": value for key, value in fields.items()}}
+
+        attempts = [(notification_query, 0)]
+        status = fields.get("status")
+        if status is not None:
+            is_unread = status in UNREAD_NOTIFICATION_STATUSES
+            crossing_status = {"$nin" if is_unread else "$in": UNREAD_NOTIFICATION_STATUSES}
+            same_side_status = {"$in" if is_unread else "$nin": UNREAD_NOTIFICATION_STATUSES}
+            # Combined through $and so a status condition of notification_query still applies
+            attempts = [
+                ({"$and": [notification_query, {"status": crossing_status}]}, 1 if is_unread else -1),
+                ({"$and": [notification_query, {"status": same_side_status}]}, 0),
+            ]
+
+        for attempt_query, unread_delta in attempts:
+            attempt_update = {**update, "$inc": {"unread_count": unread_delta}} if unread_delta else update
+            bucket_bson = NotificationBucketRepository.collection().find_one_and_update(
+                NotificationBucketStore._build_bucket_query(object_id, account_id, attempt_query),
+                attempt_update,
+                projection={"account_id": 1, "notifications": {"$elemMatch": {"_id": object_id}}},
+                return_document=return_document
+            )
+            if bucket_bson is not None:
+                return NotificationBucketStore._to_notification_bson(bucket_bson, bucket_bson["notifications"][0])
+
+        return None
+
+    @staticmethod
+    def _sum_counter(account_id: str, counter: str) -> int:
+        result = list(NotificationBucketRepository.collection().aggregate([
+            {"$match": {"account_id": account_id}},
+            {"$group": {"_id": None, "total": {"$sum": f"${counter}"}}},
+        ]))
+        return result[0]["total"] if result else 0
+
+    @staticmethod
+    def count_notifications(account_id: str) -> int:
+        return NotificationBucketStore._sum_counter(account_id, "count")
+
+    @staticmethod
+    def count_unread_notifications(account_id: str) -> int:
+        return NotificationBucketStore._sum_counter(account_id, "unread_count")
+
+    @staticmethod
+    def delete_buckets_before(cutoff_date: datetime, batch_size: int) -> int:
+        """Delete whole buckets whose newest notification is older than cutoff_date and none is still pending"""
+        query = {"end_at": {"$lt": cutoff_date}, "notifications.status": {"$ne": NotificationStatus.PENDING.value}}
+
+        deleted_count = 0
+        while True:
+            bucket_bsons = list(
+                NotificationBucketRepository.collection().find(query, {"_id": 1, "count": 1}).limit(batch_size)
+            )
+            if not bucket_bsons:
+                return deleted_count
+
+            NotificationBucketRepository.collection().delete_many(
+                {"_id": {"$in": [bucket_bson["_id"] for bucket_bson in bucket_bsons]}}
+            )
+            deleted_count += sum(bucket_bson["count"] for bucket_bson in bucket_bsons)
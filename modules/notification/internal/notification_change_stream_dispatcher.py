@@ -0,0 +1,188 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from modules.config.config_service import ConfigService
+from modules.logger.logger import Logger
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.internal.store.notification_repository import (
+    ChangeStreamStateRepository,
+    NotificationRepository,
+)
+from modules.notification.types import Notification, NotificationStatus
+
+# Inserts of new work and updates putting a notification back to PENDING, nothing else
+DISPATCH_CHANGE_PIPELINE = [
+    {
+        "$match": {
+            "$or": [
+                {"operationType": "insert", "fullDocument.status": NotificationStatus.PENDING.value},
+                {
+                    "operationType": "update",
+                    "updateDescription.updatedFields.status": NotificationStatus.PENDING.value,
+                },
+            ]
+        }
+    },
+    {
+        "$project": {
+            "operationType": 1,
+            "documentKey": 1,
+            "fullDocument.account_id": 1,
+            "fullDocument.status": 1,
+            "fullDocument.scheduled_at": 1,
+        }
+    },
+]
+
+# MongoDB error code when a resume token has fallen off the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+class NotificationChangeStreamDispatcher:
+    """
+    Dispatches new notifications as their inserts arrive on a change stream, instead of polling the
+    notifications collection for PENDING work. The resume token is checkpointed after each batch is sent, so a
+    restart resumes where it stopped; events replayed after a crash are absorbed by the atomic dispatch claim.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[[str, Optional[str]], Optional[Notification]],
+        name: str = "notification_dispatcher"
+    ) -> None:
+        self._dispatch = dispatch
+        self._name = name
+        self._batch_size = ConfigService[int].get_value(key="notification.dispatch.batch_size", default=100)
+        self._stopped = threading.Event()
+        self._executor = ThreadPoolExecutor(
+            max_workers=ConfigService[int].get_value(key="notification.dispatch.concurrency", default=8)
+        )
+
+    def _load_resume_token(self) -> Optional[Dict[str, Any]]:
+        state_bson = ChangeStreamStateRepository.collection().find_one({"name": self._name})
+        return state_bson.get("resume_token") if state_bson else None
+
+    def _save_resume_token(self, resume_token: Optional[Mapping[str, Any]]) -> None:
+        now = datetime.now()
+        ChangeStreamStateRepository.collection().update_one(
+            {"name": self._name},
+            {"$set": {"resume_token": resume_token, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+            upsert=True
+        )
+
+    def _dispatch_all(self, notifications: List[Tuple[str, Optional[str]]]) -> None:
+        """Send a batch concurrently and wait for all of it, so the checkpoint never passes unsent work"""
+        def dispatch(notification: Tuple[str, Optional[str]]) -> None:
+            notification_id, account_id = notification
+            try:
+                # The account id routes the claim to a single shard
+                self._dispatch(notification_id, account_id)
+            except Exception as e:
+                Logger.error(message=f"Notification dispatcher failed to dispatch {notification_id}: {str(e)}")
+
+        list(self._executor.map(dispatch, notifications))
+
+    def _catch_up(self) -> None:
+        """Send PENDING notifications created while no stream was open, including ones a crash left claimed"""
+        claim_timeout_seconds = ConfigService[int].get_value(
+            key="notification.dispatch.claim_timeout_seconds", default=300
+        )
+        stale_claimed_at = datetime.now() - timedelta(seconds=claim_timeout_seconds)
+        cursor = NotificationRepository.collection().find(
+            {
+                "status": NotificationStatus.PENDING.value,
+                "$and": [
+                    {"$or": [{"scheduled_at": None}, {"scheduled_at": {"$lte": datetime.now(timezone.utc)}}]},
+                    {
+                        "$or": [
+                            {"dispatch_claimed_at": None},
+                            {"dispatch_claimed_at": {"$lte": stale_claimed_at}},
+                        ]
+                    },
+                ],
+            },
+            {"_id": 1, "account_id": 1}
+        ).sort("_id", 1)
+
+        batch: List[Tuple[str, Optional[str]]] = []
+        caught_up_count = 0
+        for notification_bson in cursor:
+            batch.append((str(notification_bson["_id"]), notification_bson.get("account_id")))
+            if len(batch) >= self._batch_size:
+                self._dispatch_all(batch)
+                caught_up_count += len(batch)
+                batch = []
+        if batch:
+            self._dispatch_all(batch)
+            caught_up_count += len(batch)
+
+        Logger.info(message=f"Notification dispatcher caught up on {caught_up_count} pending notifications")
+
+    def _is_due(self, change: Mapping[str, Any]) -> bool:
+        notification_bson = change.get("fullDocument") or {}
+        scheduled_at = notification_bson.get("scheduled_at")
+        # Future schedules belong to the scheduler
+        return scheduled_at is None or NotificationUtil.to_utc(scheduled_at) <= datetime.now(timezone.utc)
+
+    def _get_notification_key(self, change: Mapping[str, Any]) -> Tuple[str, Optional[str]]:
+        # On a sharded collection the document key carries the shard key next to _id
+        document_key = change["documentKey"]
+        account_id = document_key.get("account_id") or (change.get("fullDocument") or {}).get("account_id")
+        return str(document_key["_id"]), account_id
+
+    def run(self) -> None:
+        """Run until stop() is called"""
+        resume_token = self._load_resume_token()
+        needs_catch_up = True
+
+        while not self._stopped.is_set():
+            try:
+                with NotificationRepository.collection().watch(
+                    DISPATCH_CHANGE_PIPELINE,
+                    full_document="updateLookup",
+                    resume_after=resume_token,
+                    max_await_time_ms=1000
+                ) as stream:
+                    # The stream is open before catching up, so nothing inserted in between is missed
+                    if needs_catch_up:
+                        self._catch_up()
+                        needs_catch_up = False
+
+                    while stream.alive and not self._stopped.is_set():
+                        notifications: List[Tuple[str, Optional[str]]] = []
+                        change = stream.try_next()
+                        while change is not None:
+                            if self._is_due(change):
+                                notifications.append(self._get_notification_key(change))
+                            if len(notifications) >= self._batch_size:
+                                break
+                            change = stream.try_next()
+
+                        if notifications:
+                            self._dispatch_all(notifications)
+
+                        # Checkpoint only after the batch is sent, idle streams advance the token too
+                        if stream.resume_token != resume_token:
+                            resume_token = stream.resume_token
+                            self._save_resume_token(resume_token)
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    Logger.warn(message="Notification dispatcher resume token expired, restarting from a catch up")
+                    resume_token = None
+                    needs_catch_up = True
+                else:
+                    Logger.error(message=f"Notification dispatcher change stream failed, reconnecting: {str(e)}")
+                    time.sleep(1)
+            except PyMongoError as e:
+                Logger.error(message=f"Notification dispatcher change stream failed, reconnecting: {str(e)}")
+                time.sleep(1)
+
+        self._executor.shutdown(wait=True)
+
+    def stop(self) -> None:
+        self._stopped.set()
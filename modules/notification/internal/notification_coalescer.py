@@ -0,0 +1,180 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from modules.config.config_service import ConfigService
+from modules.notification.errors import NotificationTemplateNotFoundError
+from modules.notification.internal.notification_reader import NotificationReader
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.internal.store.notification_model import NotificationDigestModel
+from modules.notification.internal.store.notification_repository import NotificationDigestRepository
+from modules.notification.types import (
+    CreateNotificationParams,
+    NotificationDigest,
+    NotificationDigestStatus,
+    NotificationPriority,
+    NotificationType,
+)
+
+DEFAULT_DIGEST_TITLE_TEMPLATE = "${latest_title}"
+
+DEFAULT_DIGEST_BODY_TEMPLATE = "${latest_body} (+${other_count} more)"
+
+
+class NotificationCoalescer:
+    """
+    Holds notifications sharing an account and collapse key in one pending digest for a window, so a burst of
+    similar events becomes a single stored notification and a single send.
+    """
+
+    @staticmethod
+    def get_window_seconds() -> int:
+        return ConfigService[int].get_value(key="notification.coalescing.window_seconds", default=60)
+
+    @staticmethod
+    def add(params: CreateNotificationParams, idempotency_key: Optional[str] = None) -> NotificationDigest:
+        """Merge a notification into the open digest of its account and collapse key, opening one if needed"""
+        NotificationUtil.validate_notification_data(params.title, params.body)
+        valid_tokens = NotificationUtil.validate_device_tokens(params.device_tokens)
+
+        max_events = ConfigService[int].get_value(key="notification.coalescing.max_events_per_digest", default=20)
+        now = datetime.now()
+        event = {
+            "title": params.title,
+            "body": params.body,
+            "data": NotificationUtil.sanitize_notification_data(params.data) if params.data else None,
+            "image_url": params.image_url,
+            "created_at": now,
+        }
+
+        update: Dict[str, Dict[str, Any]] = {
+            # Only the newest events are kept for rendering, event_count still counts all of them
+            "$push": {"events": {"$each": [event], "$slice": -max_events}},
+            "$addToSet": {"device_tokens": {"$each": valid_tokens}},
+            "$inc": {"event_count": 1},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {
+                "flush_at": now + timedelta(seconds=NotificationCoalescer.get_window_seconds()),
+                "created_at": now,
+            },
+        }
+        # The key is completed with the digest's notification once it is flushed
+        if idempotency_key:
+            update["$addToSet"]["idempotency_keys"] = idempotency_key
+        # A high priority event raises the whole digest, otherwise the first event's priority is kept
+        if params.priority == NotificationPriority.HIGH:
+            update["$set"]["priority"] = params.priority
+        else:
+            update["$setOnInsert"]["priority"] = params.priority
+
+        query = {
+            "account_id": params.account_id,
+            "collapse_key": params.collapse_key,
+            "status": NotificationDigestStatus.PENDING,
+        }
+        try:
+            digest_bson = NotificationDigestRepository.collection().find_one_and_update(
+                query, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent request opened the digest first, merge into it
+            digest_bson = NotificationDigestRepository.collection().find_one_and_update(
+                query, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+
+        return NotificationCoalescer.convert_digest_bson_to_digest(digest_bson)
+
+    @staticmethod
+    def convert_digest_bson_to_digest(digest_bson: Dict[str, Any]) -> NotificationDigest:
+        validated_digest_data = NotificationDigestModel.from_bson(digest_bson)
+        return NotificationDigest(
+            id=str(validated_digest_data.id),
+            account_id=validated_digest_data.account_id,
+            collapse_key=validated_digest_data.collapse_key,
+            event_count=validated_digest_data.event_count,
+            flush_at=validated_digest_data.flush_at.isoformat(),
+        )
+
+    @staticmethod
+    def claim_due_digests(limit: int) -> Iterator[NotificationDigestModel]:
+        """Atomically claim digests whose window has closed, including ones a crashed flush left behind"""
+        stale_seconds = ConfigService[int].get_value(key="notification.coalescing.stale_flush_seconds", default=600)
+
+        for _ in range(limit):
+            now = datetime.now()
+            digest_bson = NotificationDigestRepository.collection().find_one_and_update(
+                {
+                    "$or": [
+                        {"status": NotificationDigestStatus.PENDING, "flush_at": {"$lte": now}},
+                        {
+                            "status": NotificationDigestStatus.FLUSHING,
+                            "updated_at": {"$lte": now - timedelta(seconds=stale_seconds)},
+                        },
+                    ]
+                },
+                {"$set": {"status": NotificationDigestStatus.FLUSHING, "updated_at": now}},
+                sort=[("flush_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if digest_bson is None:
+                return
+            yield NotificationDigestModel.from_bson(digest_bson)
+
+    @staticmethod
+    def build_create_params(digest: NotificationDigestModel) -> CreateNotificationParams:
+        """Render a claimed digest into the single notification that replaces its events"""
+        events: List[Dict[str, Any]] = digest.events or []
+        latest_event = events[-1]
+
+        if digest.event_count == 1:
+            title, body = latest_event["title"], latest_event["body"]
+            data = latest_event.get("data")
+        else:
+            template_name = ConfigService[str].get_value(
+                key="notification.coalescing.template_name", default="notification_digest"
+            )
+            try:
+                template = NotificationReader.get_template_by_name(template_name)
+                title_template, body_template = template.title_template, template.body_template
+                template_data = dict(template.default_data or {})
+            except NotificationTemplateNotFoundError:
+                title_template, body_template = DEFAULT_DIGEST_TITLE_TEMPLATE, DEFAULT_DIGEST_BODY_TEMPLATE
+                template_data = {}
+
+            template_data.update({
+                "count": digest.event_count,
+                "other_count": digest.event_count - 1,
+                "latest_title": latest_event["title"],
+                "latest_body": latest_event["body"],
+                "collapse_key": digest.collapse_key,
+            })
+            title = NotificationUtil.render_template(title_template, template_data)
+            body = NotificationUtil.render_template(body_template, template_data)
+            data = {"collapse_key": digest.collapse_key, "digest_count": str(digest.event_count)}
+
+        return CreateNotificationParams(
+            account_id=digest.account_id,
+            title=title,
+            body=body,
+            notification_type=NotificationType.PUSH,
+            device_tokens=digest.device_tokens or [],
+            priority=digest.priority,
+            data=data,
+            image_url=latest_event.get("image_url"),
+            collapse_key=digest.collapse_key,
+        )
+
+    @staticmethod
+    def record_notification(digest: NotificationDigestModel, notification_id: str) -> None:
+        """Store the notification a claimed digest was turned into, so a re-claim sends it instead of a second one"""
+        NotificationDigestRepository.collection().update_one(
+            {"_id": digest.id, "notification_id": None},
+            {"$set": {"notification_id": notification_id, "updated_at": datetime.now()}},
+        )
+        digest.notification_id = notification_id
+
+    @staticmethod
+    def delete(digest: NotificationDigestModel) -> None:
+        NotificationDigestRepository.collection().delete_one({"_id": digest.id})
@@ -0,0 +1,171 @@
+from dataclasses import replace
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from modules.config.config_service import ConfigService
+from modules.notification.errors import NotificationValidationError
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.internal.store.notification_model import NotificationEventModel
+from modules.notification.internal.store.notification_repository import NotificationEventRepository
+from modules.notification.types import Notification, NotificationAck, NotificationEventType, NotificationStatus
+
+# Statuses an event-derived status may replace, so events never move a notification backwards
+EVENT_STATUS_PREDECESSORS = {
+    NotificationStatus.DELIVERED.value: [NotificationStatus.SENT.value],
+    NotificationStatus.CLICKED.value: [NotificationStatus.SENT.value, NotificationStatus.DELIVERED.value],
+}
+
+
+class NotificationEventManager:
+    """
+    Append-only delivered, opened and clicked events in a time-series collection keyed by account and
+    notification. A client ack is one small insert instead of a rewrite of the notification document, and the
+    status the events imply is derived on read until the rollup worker folds it into the notification.
+    """
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return ConfigService[bool].get_value(key="notification.events.enabled", default=False)
+
+    @staticmethod
+    def append(
+        account_id: str, notification_id: str, event_type: NotificationEventType, occurred_at: Optional[datetime] = None
+    ) -> NotificationEventModel:
+        now = NotificationUtil.utc_now()
+        event = NotificationEventModel(
+            account_id=account_id,
+            notification_id=notification_id,
+            event_type=event_type,
+            occurred_at=occurred_at or now,
+            received_at=now,
+        )
+        NotificationEventRepository.collection().insert_one(event.to_bson())
+        return event
+
+    @staticmethod
+    def build_ack_events(account_id: str, acks: List[NotificationAck]) -> List[NotificationEventModel]:
+        """Turn client acks into events, acks without a client timestamp take the time they were received"""
+        now = NotificationUtil.utc_now()
+        max_clock_skew = timedelta(
+            seconds=ConfigService[int].get_value(key="notification.acks.max_clock_skew_seconds", default=300)
+        )
+        events = []
+        for ack in acks:
+            occurred_at = now
+            if ack.occurred_at:
+                try:
+                    occurred_at = datetime.fromisoformat(ack.occurred_at.replace('Z', '+00:00'))
+                except ValueError:
+                    raise NotificationValidationError(f"Invalid occurred_at for the ack of {ack.notification_id}")
+                # Stored as naive UTC like every other event time, so a batch never mixes aware and naive values
+                occurred_at = NotificationUtil.to_utc(occurred_at).replace(tzinfo=None)
+                if occurred_at > now + max_clock_skew:
+                    raise NotificationValidationError(
+                        f"occurred_at is in the future for the ack of {ack.notification_id}"
+                    )
+
+            events.append(NotificationEventModel(
+                account_id=account_id,
+                notification_id=ack.notification_id,
+                event_type=ack.event_type,
+                occurred_at=occurred_at,
+                received_at=now,
+            ))
+        return events
+
+    @staticmethod
+    def apply_event(notification: Notification, event: NotificationEventModel) -> Notification:
+        """Return the notification as the just appended event leaves it"""
+        derived = NotificationUtil.derive_status_from_events({event.event_type: event.occurred_at})
+        if derived is None or notification.status not in EVENT_STATUS_PREDECESSORS[derived[0]]:
+            return notification
+
+        status, fields = derived
+        return replace(
+            notification,
+            status=status,
+            delivered_at=notification.delivered_at or fields["delivered_at"].isoformat(),
+            clicked_at=fields["clicked_at"].isoformat() if "clicked_at" in fields else notification.clicked_at
+        )
+
+    @staticmethod
+    def get_first_event_times(account_ids: List[str], notification_ids: List[str]) -> Dict[str, Dict[str, datetime]]:
+        """Get when each notification first saw each event type"""
+        cursor = NotificationEventRepository.collection().aggregate([
+            {"$match": {"meta.account_id": {"$in": account_ids}, "meta.notification_id": {"$in": notification_ids}}},
+            {
+                "$group": {
+                    "_id": {"notification_id": "$meta.notification_id", "event_type": "$event_type"},
+                    "occurred_at": {"$min": "$occurred_at"},
+                }
+            },
+        ])
+
+        event_times: Dict[str, Dict[str, datetime]] = {}
+        for result in cursor:
+            notification_event_times = event_times.setdefault(result["_id"]["notification_id"], {})
+            notification_event_times[result["_id"]["event_type"]] = result["occurred_at"]
+        return event_times
+
+    @staticmethod
+    def apply_pending_events(notification_bsons: List[Dict[str, Any]]) -> None:
+        """Overlay the status implied by events not rolled up yet onto sent notifications"""
+        if not NotificationEventManager.is_enabled():
+            return
+
+        # Only sent and delivered notifications can still be advanced by an event
+        candidates = [
+            notification_bson
+            for notification_bson in notification_bsons
+            if notification_bson.get("status") in EVENT_STATUS_PREDECESSORS[NotificationStatus.CLICKED.value]
+        ]
+        if not candidates:
+            return
+
+        event_times = NotificationEventManager.get_first_event_times(
+            list({notification_bson["account_id"] for notification_bson in candidates}),
+            [str(notification_bson["_id"]) for notification_bson in candidates]
+        )
+        for notification_bson in candidates:
+            derived = NotificationUtil.derive_status_from_events(event_times.get(str(notification_bson["_id"]), {}))
+            if derived is None or notification_bson["status"] not in EVENT_STATUS_PREDECESSORS[derived[0]]:
+                continue
+
+            status, fields = derived
+            notification_bson["status"] = status.value
+            for field, occurred_at in fields.items():
+                notification_bson[field] = notification_bson.get(field) or occurred_at
+
+    @staticmethod
+    def iter_event_times_since(since: datetime) -> Iterator[Tuple[str, str, Dict[str, datetime]]]:
+        """
+        Yield (account_id, notification_id, first time of each event type) for notifications with events received
+        since the given time. The window is on the ingestion time, so an ack a device sends long after the event
+        happened is still rolled up.
+        """
+        cursor = NotificationEventRepository.collection().aggregate([
+            {"$match": {"received_at": {"$gte": since}}},
+            {
+                "$group": {
+                    "_id": {
+                        "account_id": "$meta.account_id",
+                        "notification_id": "$meta.notification_id",
+                        "event_type": "$event_type",
+                    },
+                    "occurred_at": {"$min": "$occurred_at"},
+                }
+            },
+            {
+                "$group": {
+                    "_id": {"account_id": "$_id.account_id", "notification_id": "$_id.notification_id"},
+                    "events": {"$push": {"event_type": "$_id.event_type", "occurred_at": "$occurred_at"}},
+                }
+            },
+        ], allowDiskUse=True)
+
+        for result in cursor:
+            yield (
+                result["_id"]["account_id"],
+                result["_id"]["notification_id"],
+                {event["event_type"]: event["occurred_at"] for event in result["events"]},
+            )
@@ -1,43 +1,76 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
 
 from bson.objectid import ObjectId
-from pymongo import DESCENDING
+from pymongo import ASCENDING, DESCENDING
 
-from modules.notification.errors import NotificationNotFoundError, NotificationTemplateNotFoundError
+from modules.notification.errors import (
+    NotificationNotFoundError,
+    NotificationTemplateNotFoundError,
+    NotificationValidationError,
+)
+from modules.notification.internal.device_set_manager import DeviceSetManager
+from modules.notification.internal.device_token_cache import DeviceTokenCache
+from modules.notification.internal.notification_bucket_store import NotificationBucketStore
+from modules.notification.internal.notification_event_manager import NotificationEventManager
 from modules.notification.internal.notification_util import NotificationUtil
 from modules.notification.internal.store.notification_repository import (
     DeviceTokenRepository,
+    NotificationPreferencesRepository,
     NotificationRepository,
     NotificationTemplateRepository,
 )
 from modules.notification.types import (
     DeviceToken,
     Notification,
+    NotificationExportParams,
+    NotificationPreferences,
     NotificationSearchParams,
+    NotificationSummary,
     NotificationTemplate,
 )
 
+# Inbox list views never use device_tokens or template_data, which dominate document size
+NOTIFICATION_SUMMARY_PROJECTION = {
+    "account_id": 1,
+    "title": 1,
+    "body": 1,
+    "notification_type": 1,
+    "status": 1,
+    "priority": 1,
+    "topic": 1,
+    "data": 1,
+    "image_url": 1,
+    "scheduled_at": 1,
+    "sent_at": 1,
+    "delivered_at": 1,
+    "clicked_at": 1,
+    "created_at": 1,
+}
+
 
 class NotificationReader:
     @staticmethod
-    def get_notification_by_id(notification_id: str) -> Notification:
-        """Get notification by ID"""
-        try:
-            object_id = ObjectId(notification_id)
-        except Exception:
-            raise NotificationNotFoundError(notification_id)
-        
-        notification_bson = NotificationRepository.collection().find_one({"_id": object_id})
+    def get_notification_by_id(notification_id: str, account_id: Optional[str] = None) -> Notification:
+        """Get notification by ID, scoped to account_id when it is known"""
+        if NotificationBucketStore.is_enabled():
+            notification_bson = NotificationBucketStore.find_by_id(notification_id, account_id)
+        else:
+            notification_bson = NotificationRepository.collection().find_one(
+                NotificationUtil.build_notification_id_query(notification_id, account_id)
+            )
         
         if notification_bson is None:
             raise NotificationNotFoundError(notification_id)
         
+        DeviceSetManager.attach_device_tokens([notification_bson])
+        NotificationEventManager.apply_pending_events([notification_bson])
         return NotificationUtil.convert_notification_bson_to_notification(notification_bson)
 
     @staticmethod
-    def get_notifications(params: NotificationSearchParams) -> List[Notification]:
-        """Get notifications with filtering and pagination"""
-        query = {}
+    def _build_search_query(params: NotificationSearchParams) -> Dict[str, Any]:
+        """Build the Mongo query for notification search parameters"""
+        query: Dict[str, Any] = {}
         
         if params.account_id:
             query["account_id"] = params.account_id
@@ -48,21 +81,127 @@ class NotificationReader:
         if params.notification_type:
             query["notification_type"] = params.notification_type.value
         
-        cursor = (
-            NotificationRepository.collection()
-            .find(query)
-            .sort("created_at", DESCENDING)
-            .skip(params.offset)
-            .limit(params.limit)
-        )
+        return query
+
+    @staticmethod
+    def get_notifications(params: NotificationSearchParams) -> List[Notification]:
+        """Get notifications with filtering and pagination"""
+        if NotificationBucketStore.is_enabled():
+            filters = NotificationReader._build_search_query(params)
+            account_id = filters.pop("account_id", None)
+            notification_bsons = NotificationBucketStore.find_page(account_id, filters, params.offset, params.limit)
+        else:
+            cursor = (
+                NotificationRepository.collection()
+                .find(NotificationReader._build_search_query(params))
+                .sort("created_at", DESCENDING)
+                .skip(params.offset)
+                .limit(params.limit)
+            )
+            notification_bsons = list(cursor)
+        
+        # One device set lookup and one event lookup for the whole page
+        DeviceSetManager.attach_device_tokens(notification_bsons)
+        NotificationEventManager.apply_pending_events(notification_bsons)
         
         notifications = []
-        for notification_bson in cursor:
+        for notification_bson in notification_bsons:
             notification = NotificationUtil.convert_notification_bson_to_notification(notification_bson)
             notifications.append(notification)
         
         return notifications
 
+    @staticmethod
+    def get_notification_summaries(params: NotificationSearchParams) -> List[NotificationSummary]:
+        """Get inbox notification summaries without device tokens or template data"""
+        if NotificationBucketStore.is_enabled():
+            filters = NotificationReader._build_search_query(params)
+            account_id = filters.pop("account_id", None)
+            notification_bsons = NotificationBucketStore.find_page(
+                account_id, filters, params.offset, params.limit, NOTIFICATION_SUMMARY_PROJECTION
+            )
+        else:
+            cursor = (
+                NotificationRepository.collection()
+                .find(NotificationReader._build_search_query(params), NOTIFICATION_SUMMARY_PROJECTION)
+                .sort("created_at", DESCENDING)
+                .skip(params.offset)
+                .limit(params.limit)
+            )
+            notification_bsons = list(cursor)
+        
+        NotificationEventManager.apply_pending_events(notification_bsons)
+        return [NotificationUtil.convert_notification_bson_to_notification_summary(bson) for bson in notification_bsons]
+
+    @staticmethod
+    def iter_notifications_for_export(params: NotificationExportParams, batch_size: int) -> Iterator[Notification]:
+        """Stream an account's notifications oldest first straight from a Mongo cursor"""
+        # The query is built here rather than in the generator, so invalid dates fail before a response starts
+        query: Dict[str, Any] = {"account_id": params.account_id}
+        
+        if params.status:
+            query["status"] = params.status.value
+        
+        if params.notification_type:
+            query["notification_type"] = params.notification_type.value
+        
+        created_at_range = {}
+        try:
+            if params.created_after:
+                created_at_range["$gte"] = datetime.fromisoformat(params.created_after.replace('Z', '+00:00'))
+            if params.created_before:
+                created_at_range["$lt"] = datetime.fromisoformat(params.created_before.replace('Z', '+00:00'))
+        except ValueError:
+            raise NotificationValidationError("created_after and created_before must be ISO formatted datetimes")
+        
+        if created_at_range:
+            query["created_at"] = created_at_range
+        
+        projection = None if params.include_device_tokens else {"device_tokens": 0}
+        
+        return NotificationReader._iter_notifications_for_export(params, query, projection, batch_size)
+
+    @staticmethod
+    def _iter_notifications_for_export(
+        params: NotificationExportParams,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, Any]],
+        batch_size: int
+    ) -> Iterator[Notification]:
+        if NotificationBucketStore.is_enabled():
+            created_at_query = query.pop("created_at", {})
+            query.pop("account_id")
+            for notification_bson in NotificationBucketStore.iter_notifications(
+                params.account_id, query, projection, newest_first=False, batch_size=batch_size
+            ):
+                # The created_at range is applied per notification, buckets only bound it loosely
+                created_at = NotificationUtil.to_utc(notification_bson["created_at"])
+                if "$gte" in created_at_query and created_at < NotificationUtil.to_utc(created_at_query["$gte"]):
+                    continue
+                if "$lt" in created_at_query and created_at >= NotificationUtil.to_utc(created_at_query["$lt"]):
+                    continue
+                if params.include_device_tokens:
+                    DeviceSetManager.attach_device_tokens([notification_bson])
+                yield NotificationUtil.convert_notification_bson_to_notification(notification_bson)
+            return
+        
+        # Sorting on created_at keeps the (account_id, created_at) index in play, so no in-memory sort is needed
+        cursor = (
+            NotificationRepository.collection()
+            .find(query, projection)
+            .sort("created_at", ASCENDING)
+            .batch_size(batch_size)
+        )
+        
+        try:
+            for notification_bson in cursor:
+                # Device sets are cached once resolved, so repeated sets cost no extra reads
+                if params.include_device_tokens:
+                    DeviceSetManager.attach_device_tokens([notification_bson])
+                yield NotificationUtil.convert_notification_bson_to_notification(notification_bson)
+        finally:
+            cursor.close()
+
     @staticmethod
     def get_notifications_by_account_id(account_id: str, limit: int = 50, offset: int = 0) -> List[Notification]:
         """Get notifications for a specific account"""
@@ -74,8 +213,11 @@ class NotificationReader:
         """Get all pending notifications"""
         cursor = NotificationRepository.collection().find({"status": "PENDING"}).sort("created_at", 1)
         
+        notification_bsons = list(cursor)
+        DeviceSetManager.attach_device_tokens(notification_bsons)
+        
         notifications = []
-        for notification_bson in cursor:
+        for notification_bson in notification_bsons:
             notification = NotificationUtil.convert_notification_bson_to_notification(notification_bson)
             notifications.append(notification)
         
@@ -96,13 +238,54 @@ class NotificationReader:
             .sort("scheduled_at", 1)
         )
         
+        notification_bsons = list(cursor)
+        DeviceSetManager.attach_device_tokens(notification_bsons)
+        
         notifications = []
-        for notification_bson in cursor:
+        for notification_bson in notification_bsons:
             notification = NotificationUtil.convert_notification_bson_to_notification(notification_bson)
             notifications.append(notification)
         
         return notifications
 
+    @staticmethod
+    def get_pending_notifications_by_ids(notification_ids: List[str]) -> List[Notification]:
+        """Get the notifications of a schedule slice that are still waiting to be sent"""
+        if NotificationBucketStore.is_enabled():
+            notification_bsons = NotificationBucketStore.find_pending_by_ids(notification_ids)
+        else:
+            notification_bsons = list(NotificationRepository.collection().find({
+                "_id": {"$in": [ObjectId(notification_id) for notification_id in notification_ids]},
+                "status": "PENDING"
+            }))
+        
+        DeviceSetManager.attach_device_tokens(notification_bsons)
+        return [
+            NotificationUtil.convert_notification_bson_to_notification(notification_bson)
+            for notification_bson in notification_bsons
+        ]
+
+    @staticmethod
+    def get_notification_preferences_by_account_ids(account_ids: List[str]) -> Dict[str, NotificationPreferences]:
+        """Get the time zone and quiet hours of each account, defaults for accounts that never set them"""
+        cursor = NotificationPreferencesRepository.collection().find(
+            {"account_id": {"$in": account_ids}},
+            {"_id": 0, "account_id": 1, "time_zone": 1, "quiet_hours_start": 1, "quiet_hours_end": 1}
+        )
+        
+        preferences = {account_id: NotificationPreferences(account_id=account_id) for account_id in account_ids}
+        for preferences_bson in cursor:
+            preferences[preferences_bson["account_id"]] = NotificationUtil.convert_preferences_bson_to_preferences(
+                preferences_bson
+            )
+        
+        return preferences
+
+    @staticmethod
+    def get_notification_preferences(account_id: str) -> NotificationPreferences:
+        """Get the time zone and quiet hours of an account"""
+        return NotificationReader.get_notification_preferences_by_account_ids([account_id])[account_id]
+
     @staticmethod
     def get_template_by_id(template_id: str) -> NotificationTemplate:
         """Get notification template by ID"""
@@ -140,49 +323,104 @@ class NotificationReader:
         
         return templates
 
+    @staticmethod
+    def _get_active_devices_by_account_id(account_id: str) -> List[DeviceToken]:
+        """Get an account's active devices, newest first, through the device token cache"""
+        device_tokens = DeviceTokenCache.get(account_id)
+        if device_tokens is not None:
+            return device_tokens
+        
+        cursor = (
+            DeviceTokenRepository.collection()
+            .find({"account_id": account_id, "is_active": True}, {"_id": 0, "token": 1, "platform": 1})
+            .sort("created_at", DESCENDING)
+        )
+        device_tokens = [
+            DeviceToken(token=token_bson["token"], platform=token_bson["platform"]) for token_bson in cursor
+        ]
+        
+        DeviceTokenCache.set(account_id, device_tokens)
+        return device_tokens
+
     @staticmethod
     def get_device_tokens_by_account_id(account_id: str, platform: Optional[str] = None) -> List[DeviceToken]:
         """Get device tokens for an account"""
-        query = {"account_id": account_id, "is_active": True}
+        device_tokens = NotificationReader._get_active_devices_by_account_id(account_id)
         
         if platform:
-            query["platform"] = platform
+            return [device_token for device_token in device_tokens if device_token.platform == platform]
         
-        cursor = DeviceTokenRepository.collection().find(query).sort("created_at", DESCENDING)
+        return list(device_tokens)
+
+    @staticmethod
+    def get_active_device_tokens_by_account_id(account_id: str) -> List[str]:
+        """Get active device token strings for an account"""
+        return [device_token.token for device_token in NotificationReader._get_active_devices_by_account_id(account_id)]
+
+    @staticmethod
+    def get_active_device_tokens_by_account_ids(account_ids: List[str]) -> Dict[str, List[str]]:
+        """Get active device token strings of many accounts, the ones not cached are read in a single query"""
+        devices_by_account_id: Dict[str, List[DeviceToken]] = {}
+        for account_id in account_ids:
+            device_tokens = DeviceTokenCache.get(account_id)
+            if device_tokens is not None:
+                devices_by_account_id[account_id] = device_tokens
         
-        device_tokens = []
-        for token_bson in cursor:
-            device_token = DeviceToken(
-                token=token_bson["token"],
-                platform=token_bson["platform"]
+        uncached_account_ids = [account_id for account_id in account_ids if account_id not in devices_by_account_id]
+        if uncached_account_ids:
+            cursor = (
+                DeviceTokenRepository.collection()
+                .find(
+                    {"account_id": {"$in": uncached_account_ids}, "is_active": True},
+                    {"_id": 0, "account_id": 1, "token": 1, "platform": 1}
+                )
+                .sort("created_at", DESCENDING)
             )
-            device_tokens.append(device_token)
+            fetched_devices: Dict[str, List[DeviceToken]] = {account_id: [] for account_id in uncached_account_ids}
+            for token_bson in cursor:
+                fetched_devices[token_bson["account_id"]].append(
+                    DeviceToken(token=token_bson["token"], platform=token_bson["platform"])
+                )
+            
+            for account_id, device_tokens in fetched_devices.items():
+                DeviceTokenCache.set(account_id, device_tokens)
+            devices_by_account_id.update(fetched_devices)
         
-        return device_tokens
+        return {
+            account_id: [device_token.token for device_token in device_tokens]
+            for account_id, device_tokens in devices_by_account_id.items()
+        }
 
     @staticmethod
-    def get_active_device_tokens_by_account_id(account_id: str) -> List[str]:
-        """Get active device token strings for an account"""
+    def get_device_token_platforms(tokens: List[str]) -> Dict[str, str]:
+        """Get the recorded platform of each known device token"""
         cursor = DeviceTokenRepository.collection().find(
-            {"account_id": account_id, "is_active": True}
+            {"token": {"$in": tokens}},
+            {"_id": 0, "token": 1, "platform": 1}
         )
         
-        return [token_doc["token"] for token_doc in cursor]
+        return {token_doc["token"]: token_doc["platform"] for token_doc in cursor}
 
     @staticmethod
     def check_device_token_exists(token: str) -> bool:
         """Check if device token exists in database"""
-        result = DeviceTokenRepository.collection().find_one({"token": token})
+        result = DeviceTokenRepository.collection().find_one({"token": token}, {"_id": 1})
         return result is not None
 
     @staticmethod
     def get_notification_count_by_account_id(account_id: str) -> int:
         """Get total notification count for an account"""
+        if NotificationBucketStore.is_enabled():
+            return NotificationBucketStore.count_notifications(account_id)
+        
         return NotificationRepository.collection().count_documents({"account_id": account_id})
 
     @staticmethod
     def get_unread_notification_count_by_account_id(account_id: str) -> int:
         """Get unread notification count for an account"""
+        if NotificationBucketStore.is_enabled():
+            return NotificationBucketStore.count_unread_notifications(account_id)
+        
         return NotificationRepository.collection().count_documents({
             "account_id": account_id,
             "status": {"$in": ["PENDING", "SENT", "DELIVERED"]}
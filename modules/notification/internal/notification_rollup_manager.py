@@ -0,0 +1,160 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+
+from modules.config.config_service import ConfigService
+from modules.logger.logger import Logger
+from modules.notification.errors import NotificationValidationError
+from modules.notification.internal.store.notification_model import NotificationRollupModel
+from modules.notification.internal.store.notification_repository import NotificationRollupRepository
+from modules.notification.types import (
+    NotificationFunnel,
+    NotificationFunnelBucket,
+    NotificationFunnelParams,
+    NotificationRollupDimension,
+    NotificationStatus,
+)
+
+ROLLUP_COUNTERS = ["created", "sent", "failed", "delivered", "clicked"]
+
+STATUS_COUNTERS = {
+    NotificationStatus.SENT.value: "sent",
+    NotificationStatus.FAILED.value: "failed",
+    NotificationStatus.DELIVERED.value: "delivered",
+    NotificationStatus.CLICKED.value: "clicked",
+}
+
+RollupKey = Tuple[NotificationRollupDimension, str, datetime]
+
+
+class NotificationRollupManager:
+    """
+    Hourly funnel counters per template, template variant, campaign and platform, kept incrementally. Every
+    status transition adds to the counters of the hour it happened in through $inc upserts, one bulk write per
+    batch of transitions, so funnel dashboards read a handful of precomputed documents instead of aggregating
+    notifications. Template, variant and campaign counters follow notifications, platform counters count device
+    tokens sent and failed, since acks do not say which device they came from.
+    """
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return ConfigService[bool].get_value(key="notification.rollups.enabled", default=True)
+
+    @staticmethod
+    def get_hour(value: datetime) -> datetime:
+        return value.replace(minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def get_transition_counters(previous_status: Optional[str], status: str) -> List[str]:
+        """Get the counters a status change adds to, none when the status did not change"""
+        if previous_status == status or status not in STATUS_COUNTERS:
+            return []
+
+        # A click proves delivery, so a notification that skips delivered still counts towards it
+        if status == NotificationStatus.CLICKED.value and previous_status != NotificationStatus.DELIVERED.value:
+            return ["delivered", "clicked"]
+        return [STATUS_COUNTERS[status]]
+
+    @staticmethod
+    def _get_dimension_values(notification_bson: Dict[str, Any]) -> List[Tuple[NotificationRollupDimension, str]]:
+        dimension_values = []
+        if notification_bson.get("template_id"):
+            dimension_values.append((NotificationRollupDimension.TEMPLATE, notification_bson["template_id"]))
+            if notification_bson.get("variant_id"):
+                # Variant ids are only unique within their template
+                dimension_values.append((
+                    NotificationRollupDimension.VARIANT,
+                    f"{notification_bson['template_id']}:{notification_bson['variant_id']}"
+                ))
+        if notification_bson.get("campaign_id"):
+            dimension_values.append((NotificationRollupDimension.CAMPAIGN, notification_bson["campaign_id"]))
+        return dimension_values
+
+    @staticmethod
+    def record_transitions(transitions: List[Tuple[Dict[str, Any], List[str]]]) -> None:
+        """Add (notification, counters) transitions to the current hour of their template, variant and campaign"""
+        hour = NotificationRollupManager.get_hour(datetime.now())
+        increments: Dict[RollupKey, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for notification_bson, counters in transitions:
+            for dimension, value in NotificationRollupManager._get_dimension_values(notification_bson):
+                for counter in counters:
+                    increments[(dimension, value, hour)][counter] += 1
+
+        NotificationRollupManager._write(increments)
+
+    @staticmethod
+    def record_platform_outcomes(platforms: Dict[str, str], device_tokens: List[str], failed_tokens: List[str]) -> None:
+        """Add the sent and failed device tokens of one send to the current hour of their platforms"""
+        hour = NotificationRollupManager.get_hour(datetime.now())
+        failed = set(failed_tokens)
+        increments: Dict[RollupKey, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for token in device_tokens:
+            key = (NotificationRollupDimension.PLATFORM, platforms.get(token) or "unknown", hour)
+            increments[key]["failed" if token in failed else "sent"] += 1
+
+        NotificationRollupManager._write(increments)
+
+    @staticmethod
+    def _write(increments: Dict[RollupKey, Dict[str, int]]) -> None:
+        if not increments or not NotificationRollupManager.is_enabled():
+            return
+
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {"dimension": dimension, "value": value, "hour": hour},
+                {"$inc": dict(counters), "$set": {"updated_at": now}, "$setOnInsert": {"created_at": now}},
+                upsert=True
+            )
+            for (dimension, value, hour), counters in increments.items()
+        ]
+
+        # Counters are analytics only, a failed write never fails the transition it counts
+        try:
+            NotificationRollupRepository.collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            Logger.error(message=f"Failed to update {len(operations)} notification rollups: {str(e)}")
+
+    @staticmethod
+    def get_funnel(params: NotificationFunnelParams) -> NotificationFunnel:
+        """Sum the hourly counters of one template, variant, campaign or platform over a time range"""
+        try:
+            end_at = (
+                datetime.fromisoformat(params.end_at.replace('Z', '+00:00')) if params.end_at else datetime.now()
+            )
+            start_at = (
+                datetime.fromisoformat(params.start_at.replace('Z', '+00:00'))
+                if params.start_at
+                else end_at - timedelta(days=7)
+            )
+        except ValueError:
+            raise NotificationValidationError("start_at and end_at must be ISO formatted datetimes")
+
+        cursor = (
+            NotificationRollupRepository.collection()
+            .find({
+                "dimension": params.dimension.value,
+                "value": params.value,
+                "hour": {"$gte": NotificationRollupManager.get_hour(start_at), "$lt": end_at},
+            })
+            .sort("hour", ASCENDING)
+        )
+
+        buckets = []
+        totals = dict.fromkeys(ROLLUP_COUNTERS, 0)
+        for rollup_bson in cursor:
+            rollup = NotificationRollupModel.from_bson(rollup_bson)
+            buckets.append(NotificationFunnelBucket(
+                hour=rollup.hour.isoformat(),
+                created=rollup.created,
+                sent=rollup.sent,
+                failed=rollup.failed,
+                delivered=rollup.delivered,
+                clicked=rollup.clicked,
+            ))
+            for counter in ROLLUP_COUNTERS:
+                totals[counter] += getattr(rollup, counter)
+
+        return NotificationFunnel(dimension=params.dimension, value=params.value, buckets=buckets, **totals)
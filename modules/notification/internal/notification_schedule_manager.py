@@ -0,0 +1,100 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Tuple
+
+from pymongo import ReturnDocument
+
+from modules.config.config_service import ConfigService
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.internal.store.notification_model import NotificationScheduleBucketModel
+from modules.notification.internal.store.notification_repository import NotificationScheduleBucketRepository
+from modules.notification.types import NotificationScheduleBucketStatus
+
+
+class NotificationScheduleManager:
+    """
+    Time-bucketed index of scheduled notifications. Each (bucket_start, time_zone) slice is stored as capped
+    chunks of notification ids, so the scheduler claims only the slices that are due instead of scanning every
+    scheduled notification on each poll.
+    """
+
+    @staticmethod
+    def _get_bucket_seconds() -> int:
+        return ConfigService[int].get_value(key="notification.schedule.bucket_seconds", default=60)
+
+    @staticmethod
+    def get_bucket_start(send_at: datetime) -> datetime:
+        """Get the start of the UTC slice a send time falls into"""
+        bucket_seconds = NotificationScheduleManager._get_bucket_seconds()
+        timestamp = int(NotificationUtil.to_utc(send_at).timestamp())
+        return datetime.fromtimestamp(timestamp - timestamp % bucket_seconds, tz=timezone.utc)
+
+    @staticmethod
+    def add(entries: List[Tuple[str, datetime, str]]) -> None:
+        """Index (notification_id, send_at, time_zone) entries into their schedule buckets"""
+        max_entries = ConfigService[int].get_value(key="notification.schedule.bucket_max_entries", default=1000)
+
+        slices: Dict[Tuple[datetime, str], List[str]] = defaultdict(list)
+        for notification_id, send_at, time_zone in entries:
+            slices[(NotificationScheduleManager.get_bucket_start(send_at), time_zone)].append(notification_id)
+
+        now = datetime.now()
+        for (bucket_start, time_zone), notification_ids in slices.items():
+            for i in range(0, len(notification_ids), max_entries):
+                chunk = notification_ids[i:i + max_entries]
+                # Appends go to an open chunk with room left, otherwise the upsert starts a new one
+                NotificationScheduleBucketRepository.collection().update_one(
+                    {
+                        "bucket_start": bucket_start,
+                        "time_zone": time_zone,
+                        "status": NotificationScheduleBucketStatus.PENDING,
+                        "size": {"$lte": max_entries - len(chunk)},
+                    },
+                    {
+                        "$push": {"notification_ids": {"$each": chunk}},
+                        "$inc": {"size": len(chunk)},
+                        "$set": {"updated_at": now},
+                        "$setOnInsert": {"claimed_at": None, "created_at": now},
+                    },
+                    upsert=True
+                )
+
+    @staticmethod
+    def claim_due_buckets(limit: int) -> Iterator[NotificationScheduleBucketModel]:
+        """Atomically claim fully elapsed slices, including ones a crashed scheduler run left claimed"""
+        stale_seconds = ConfigService[int].get_value(key="notification.schedule.stale_claim_seconds", default=600)
+        bucket_seconds = NotificationScheduleManager._get_bucket_seconds()
+
+        for _ in range(limit):
+            now = datetime.now(timezone.utc)
+            bucket_bson = NotificationScheduleBucketRepository.collection().find_one_and_update(
+                {
+                    "$or": [
+                        {
+                            "status": NotificationScheduleBucketStatus.PENDING,
+                            # A slice is due once all of it is in the past, so nothing is sent early
+                            "bucket_start": {"$lte": now - timedelta(seconds=bucket_seconds)},
+                        },
+                        {
+                            "status": NotificationScheduleBucketStatus.CLAIMED,
+                            "claimed_at": {"$lte": now - timedelta(seconds=stale_seconds)},
+                        },
+                    ]
+                },
+                {
+                    "$set": {
+                        "status": NotificationScheduleBucketStatus.CLAIMED,
+                        "claimed_at": now,
+                        "updated_at": datetime.now(),
+                    }
+                },
+                sort=[("bucket_start", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if bucket_bson is None:
+                return
+            yield NotificationScheduleBucketModel.from_bson(bucket_bson)
+
+    @staticmethod
+    def delete(bucket: NotificationScheduleBucketModel) -> None:
+        NotificationScheduleBucketRepository.collection().delete_one({"_id": bucket.id})
@@ -0,0 +1,179 @@
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+from modules.config.config_service import ConfigService
+from modules.logger.logger import Logger
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.internal.store.notification_repository import NotificationRepository
+from modules.notification.types import Notification, NotificationStatus
+
+# Only changes that can add, move or cancel a schedule reach the scheduler
+SCHEDULE_CHANGE_PIPELINE = [
+    {
+        "$match": {
+            "$or": [
+                {"operationType": {"$in": ["insert", "replace", "delete"]}},
+                {"updateDescription.updatedFields.status": {"$exists": True}},
+                {"updateDescription.updatedFields.scheduled_at": {"$exists": True}},
+            ]
+        }
+    },
+    {
+        "$project": {
+            "operationType": 1,
+            "documentKey": 1,
+            "fullDocument._id": 1,
+            "fullDocument.account_id": 1,
+            "fullDocument.status": 1,
+            "fullDocument.scheduled_at": 1,
+        }
+    },
+]
+
+
+class NotificationTimingScheduler:
+    """
+    Fires scheduled notifications at their exact time. The next horizon of schedules is held in a min-heap
+    ordered by send time, new, moved and cancelled schedules arrive through a change stream, and the heap is
+    only refilled from Mongo once per half horizon instead of polling on every tick.
+    """
+
+    def __init__(self, dispatch: Callable[[str, Optional[str]], Optional[Notification]]) -> None:
+        self._dispatch = dispatch
+        self._horizon_seconds = ConfigService[int].get_value(key="notification.scheduler.horizon_seconds", default=300)
+        self._heap: List[Tuple[float, str]] = []
+        # Latest send time of each scheduled notification, heap entries that disagree are stale
+        self._send_times: Dict[str, float] = {}
+        # Shard key of each scheduled notification, so firing it targets a single shard
+        self._account_ids: Dict[str, Optional[str]] = {}
+        self._horizon_end = 0.0
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._executor = ThreadPoolExecutor(
+            max_workers=ConfigService[int].get_value(key="notification.scheduler.dispatch_concurrency", default=8)
+        )
+
+    def _schedule(self, notification_id: str, account_id: Optional[str], scheduled_at: datetime) -> None:
+        send_time = NotificationUtil.to_utc(scheduled_at).timestamp()
+        with self._condition:
+            if send_time > self._horizon_end:
+                # Beyond the horizon, the next horizon load picks it up
+                self._send_times.pop(notification_id, None)
+                self._account_ids.pop(notification_id, None)
+                return
+            self._send_times[notification_id] = send_time
+            self._account_ids[notification_id] = account_id
+            heapq.heappush(self._heap, (send_time, notification_id))
+            self._condition.notify()
+
+    def _cancel(self, notification_id: str) -> None:
+        with self._condition:
+            self._send_times.pop(notification_id, None)
+            self._account_ids.pop(notification_id, None)
+
+    def _load_horizon(self) -> None:
+        """Load every pending schedule due before the end of the next horizon"""
+        horizon_end = datetime.now(timezone.utc) + timedelta(seconds=self._horizon_seconds)
+        with self._condition:
+            # Extended before the query, so changes racing with it are kept by the change stream
+            self._horizon_end = horizon_end.timestamp()
+
+        cursor = NotificationRepository.collection().find(
+            {"status": NotificationStatus.PENDING.value, "scheduled_at": {"$lte": horizon_end}},
+            {"_id": 1, "account_id": 1, "scheduled_at": 1}
+        )
+        loaded_count = 0
+        for notification_bson in cursor:
+            self._schedule(
+                str(notification_bson["_id"]), notification_bson.get("account_id"), notification_bson["scheduled_at"]
+            )
+            loaded_count += 1
+
+        Logger.info(message=f"Notification scheduler loaded {loaded_count} schedules up to {horizon_end.isoformat()}")
+
+    def _apply_change(self, change: Mapping[str, Any]) -> None:
+        notification_id = str(change["documentKey"]["_id"])
+        notification_bson = change.get("fullDocument")
+
+        if (
+            change["operationType"] == "delete"
+            or not notification_bson
+            or notification_bson.get("status") != NotificationStatus.PENDING.value
+            or not notification_bson.get("scheduled_at")
+        ):
+            self._cancel(notification_id)
+            return
+
+        account_id = change["documentKey"].get("account_id") or notification_bson.get("account_id")
+        self._schedule(notification_id, account_id, notification_bson["scheduled_at"])
+
+    def _watch_changes(self) -> None:
+        """Follow the notifications change stream, resuming after the last seen event on errors"""
+        resume_token = None
+        while not self._stopped.is_set():
+            try:
+                with NotificationRepository.collection().watch(
+                    SCHEDULE_CHANGE_PIPELINE,
+                    full_document="updateLookup",
+                    resume_after=resume_token,
+                    max_await_time_ms=1000
+                ) as stream:
+                    while stream.alive and not self._stopped.is_set():
+                        change = stream.try_next()
+                        resume_token = stream.resume_token
+                        if change is not None:
+                            self._apply_change(change)
+            except PyMongoError as e:
+                Logger.error(message=f"Notification scheduler change stream failed, reconnecting: {str(e)}")
+                time.sleep(1)
+
+    def _fire(self, notification_id: str, account_id: Optional[str]) -> None:
+        try:
+            self._dispatch(notification_id, account_id)
+        except Exception as e:
+            Logger.error(message=f"Notification scheduler failed to dispatch {notification_id}: {str(e)}")
+
+    def _pop_due(self, now: float) -> List[Tuple[str, Optional[str]]]:
+        due_notifications = []
+        while self._heap and self._heap[0][0] <= now:
+            send_time, notification_id = heapq.heappop(self._heap)
+            if self._send_times.get(notification_id) == send_time:
+                del self._send_times[notification_id]
+                due_notifications.append((notification_id, self._account_ids.pop(notification_id, None)))
+        return due_notifications
+
+    def run(self) -> None:
+        """Run until stop() is called"""
+        watcher = threading.Thread(target=self._watch_changes, name="notification-schedule-watcher", daemon=True)
+        watcher.start()
+
+        self._load_horizon()
+        next_load = time.time() + self._horizon_seconds / 2
+
+        while not self._stopped.is_set():
+            with self._condition:
+                now = time.time()
+                due_notifications = self._pop_due(now)
+                if not due_notifications:
+                    next_fire = self._heap[0][0] if self._heap else next_load
+                    self._condition.wait(timeout=max(min(next_fire, next_load) - now, 0))
+
+            for notification_id, account_id in due_notifications:
+                self._executor.submit(self._fire, notification_id, account_id)
+
+            if time.time() >= next_load:
+                self._load_horizon()
+                next_load = time.time() + self._horizon_seconds / 2
+
+        self._executor.shutdown(wait=True)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify()
@@ -1,11 +1,51 @@
 import re
-from datetime import datetime
+import zlib
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
 from string import Template
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from modules.notification.errors import NotificationTemplateNotFoundError, NotificationValidationError
-from modules.notification.internal.store.notification_model import NotificationModel, NotificationTemplateModel
-from modules.notification.types import Notification, NotificationTemplate
+from bson.objectid import ObjectId
+
+from modules.config.config_service import ConfigService
+from modules.notification.errors import (
+    NotificationNotFoundError,
+    NotificationTemplateNotFoundError,
+    NotificationValidationError,
+)
+from modules.notification.internal.store.notification_model import (
+    CampaignModel,
+    DeliveryReceiptModel,
+    NotificationModel,
+    NotificationPreferencesModel,
+    NotificationTemplateModel,
+)
+from modules.notification.types import (
+    Campaign,
+    CampaignAudience,
+    CampaignShardProgress,
+    CampaignShardStatus,
+    Notification,
+    NotificationArchiveFormat,
+    NotificationCleanupMode,
+    NotificationDeliveryReceipt,
+    NotificationDispatchMode,
+    NotificationEventType,
+    NotificationPreferences,
+    NotificationPriority,
+    NotificationSegment,
+    NotificationStatus,
+    NotificationStorageEngine,
+    NotificationSummary,
+    NotificationTemplate,
+    NotificationTemplateVariant,
+    NotificationType,
+)
+
+ARCHIVE_ACCOUNT_BUCKET_COUNT = 16
+
+ARCHIVE_DATE_FIELDS = ["scheduled_at", "sent_at", "delivered_at", "clicked_at", "expire_at", "created_at", "updated_at"]
 
 
 class NotificationUtil:
@@ -32,6 +72,86 @@ class NotificationUtil:
             delivered_at=validated_notification_data.delivered_at.isoformat() if validated_notification_data.delivered_at else None,
             clicked_at=validated_notification_data.clicked_at.isoformat() if validated_notification_data.clicked_at else None,
             error_message=validated_notification_data.error_message,
+            collapse_key=validated_notification_data.collapse_key,
+            campaign_id=validated_notification_data.campaign_id,
+            variant_id=validated_notification_data.variant_id,
+        )
+
+    @staticmethod
+    def convert_delivery_receipt_bson_to_receipt(receipt_bson: dict[str, Any]) -> NotificationDeliveryReceipt:
+        """Convert a time-series receipt measurement to a NotificationDeliveryReceipt object"""
+        receipt = DeliveryReceiptModel.from_bson(receipt_bson)
+        return NotificationDeliveryReceipt(
+            notification_id=receipt.notification_id,
+            account_id=receipt.account_id,
+            token=receipt.token,
+            success=receipt.success,
+            attempt=receipt.attempt,
+            latency_ms=receipt.latency_ms,
+            sent_at=receipt.sent_at.isoformat(),
+            platform=receipt.platform,
+            message_id=receipt.message_id,
+            error_code=receipt.error_code,
+            variant_id=receipt.variant_id,
+        )
+
+    @staticmethod
+    def derive_status_from_events(
+        event_times: Dict[str, datetime]
+    ) -> Optional[Tuple[NotificationStatus, Dict[str, datetime]]]:
+        """Derive the status and timestamps a notification's first delivered, opened and clicked events imply"""
+        # An open or a click proves delivery even when the delivered ack itself never arrived
+        delivered_times = [event_times[event_type] for event_type in NotificationEventType if event_type in event_times]
+        if not delivered_times:
+            return None
+        
+        fields = {"delivered_at": min(delivered_times)}
+        if NotificationEventType.CLICKED in event_times:
+            fields["clicked_at"] = event_times[NotificationEventType.CLICKED]
+            return NotificationStatus.CLICKED, fields
+        return NotificationStatus.DELIVERED, fields
+
+    @staticmethod
+    def build_delivery_results(device_tokens: List[str], failed_tokens: List[str]) -> Dict[str, List[int]]:
+        """Record per-token outcomes as positions in the notification's device set instead of token strings"""
+        failed = set(failed_tokens)
+        return {
+            "sent": [index for index, token in enumerate(device_tokens) if token not in failed],
+            "failed": [index for index, token in enumerate(device_tokens) if token in failed],
+        }
+
+    @staticmethod
+    def build_notification_id_query(notification_id: str, account_id: Optional[str] = None) -> Dict[str, Any]:
+        """Build the query for one notification, with the shard key when the account is known"""
+        try:
+            object_id = ObjectId(notification_id)
+        except Exception:
+            raise NotificationNotFoundError(notification_id)
+        
+        if account_id:
+            return {"account_id": account_id, "_id": object_id}
+        return {"_id": object_id}
+
+    @staticmethod
+    def convert_notification_bson_to_notification_summary(notification_bson: dict[str, Any]) -> NotificationSummary:
+        """Convert projected BSON data straight to a NotificationSummary object"""
+        get = notification_bson.get
+        return NotificationSummary(
+            id=str(notification_bson["_id"]),
+            account_id=get("account_id", ""),
+            title=get("title", ""),
+            body=get("body", ""),
+            notification_type=NotificationType(get("notification_type", NotificationType.PUSH)),
+            status=NotificationStatus(get("status", NotificationStatus.PENDING)),
+            priority=NotificationPriority(get("priority", NotificationPriority.NORMAL)),
+            topic=get("topic"),
+            data=get("data"),
+            image_url=get("image_url"),
+            scheduled_at=get("scheduled_at").isoformat() if get("scheduled_at") else None,
+            sent_at=get("sent_at").isoformat() if get("sent_at") else None,
+            delivered_at=get("delivered_at").isoformat() if get("delivered_at") else None,
+            clicked_at=get("clicked_at").isoformat() if get("clicked_at") else None,
+            created_at=get("created_at").isoformat() if get("created_at") else None,
         )
 
     @staticmethod
@@ -44,6 +164,66 @@ class NotificationUtil:
             title_template=validated_template_data.title_template,
             body_template=validated_template_data.body_template,
             default_data=validated_template_data.default_data,
+            variants=[
+                NotificationTemplateVariant(
+                    id=variant["id"],
+                    title_template=variant["title_template"],
+                    body_template=variant["body_template"],
+                    weight=variant.get("weight", 1),
+                )
+                for variant in validated_template_data.variants
+            ] if validated_template_data.variants else None,
+        )
+
+    @staticmethod
+    def convert_campaign_bson_to_campaign(campaign_bson: dict[str, Any]) -> Campaign:
+        """Convert BSON data to Campaign object, campaign counters are the sums of its shards' counters"""
+        validated_campaign_data = CampaignModel.from_bson(campaign_bson)
+        shards = [
+            CampaignShardProgress(
+                shard=shard_bson["shard"],
+                status=CampaignShardStatus(shard_bson["status"]),
+                audience_size=shard_bson.get("audience_size", 0),
+                processed_count=shard_bson.get("processed_count", 0),
+                sent_count=shard_bson.get("sent_count", 0),
+                failed_count=shard_bson.get("failed_count", 0),
+                skipped_count=shard_bson.get("skipped_count", 0),
+            )
+            for shard_bson in validated_campaign_data.shards
+        ]
+        segment = validated_campaign_data.audience.get("segment")
+        return Campaign(
+            id=str(validated_campaign_data.id),
+            account_id=validated_campaign_data.account_id,
+            name=validated_campaign_data.name,
+            template_id=validated_campaign_data.template_id,
+            status=validated_campaign_data.status,
+            audience=CampaignAudience(
+                segment=NotificationSegment(**segment) if segment else None,
+                account_ids=validated_campaign_data.audience.get("account_ids"),
+            ),
+            shards=shards,
+            audience_size=sum(shard.audience_size for shard in shards),
+            processed_count=sum(shard.processed_count for shard in shards),
+            sent_count=sum(shard.sent_count for shard in shards),
+            failed_count=sum(shard.failed_count for shard in shards),
+            skipped_count=sum(shard.skipped_count for shard in shards),
+            template_data=validated_campaign_data.template_data,
+            created_at=validated_campaign_data.created_at.isoformat() if validated_campaign_data.created_at else None,
+            completed_at=(
+                validated_campaign_data.completed_at.isoformat() if validated_campaign_data.completed_at else None
+            ),
+        )
+
+    @staticmethod
+    def convert_preferences_bson_to_preferences(preferences_bson: dict[str, Any]) -> NotificationPreferences:
+        """Convert BSON data to NotificationPreferences object"""
+        validated_preferences_data = NotificationPreferencesModel.from_bson(preferences_bson)
+        return NotificationPreferences(
+            account_id=validated_preferences_data.account_id,
+            time_zone=validated_preferences_data.time_zone,
+            quiet_hours_start=validated_preferences_data.quiet_hours_start,
+            quiet_hours_end=validated_preferences_data.quiet_hours_end,
         )
 
     @staticmethod
@@ -98,6 +278,18 @@ class NotificationUtil:
         if len(body) > 4000:
             raise NotificationValidationError("Notification body too long (max 4000 characters)")
 
+    @staticmethod
+    def validate_template_variants(variants: List[NotificationTemplateVariant]) -> None:
+        """Validate the A/B variants of a template"""
+        variant_ids = [variant.id for variant in variants]
+        if not all(variant_ids) or len(set(variant_ids)) != len(variant_ids):
+            raise NotificationValidationError("Template variants need unique, non-empty ids")
+        
+        for variant in variants:
+            NotificationUtil.validate_notification_data(variant.title_template, variant.body_template)
+            if not isinstance(variant.weight, int) or variant.weight < 1:
+                raise NotificationValidationError(f"Weight of template variant {variant.id} must be a positive integer")
+
     @staticmethod
     def validate_topic_name(topic: str) -> None:
         """Validate FCM topic name"""
@@ -146,6 +338,73 @@ class NotificationUtil:
                 f"Missing template variables: {', '.join(missing_vars)}"
             )
 
+    @staticmethod
+    def get_time_zone(time_zone: str) -> ZoneInfo:
+        """Get an IANA time zone, e.g. 'Asia/Kolkata'"""
+        try:
+            return ZoneInfo(time_zone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise NotificationValidationError(f"Invalid time zone: {time_zone}")
+
+    @staticmethod
+    def parse_local_time(local_time: str) -> time:
+        """Parse an 'HH:MM' wall clock time"""
+        try:
+            return datetime.strptime(local_time, "%H:%M").time()
+        except (TypeError, ValueError):
+            raise NotificationValidationError(f"Invalid local time '{local_time}', expected HH:MM")
+
+    @staticmethod
+    def utc_now() -> datetime:
+        """Get the current time as naive UTC, the clock notification events are stored and compared in"""
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    @staticmethod
+    def to_utc(value: datetime) -> datetime:
+        """Convert a datetime to aware UTC, naive values are taken as UTC already"""
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+    @staticmethod
+    def get_next_local_occurrence(time_zone: str, local_time: str, now: datetime) -> datetime:
+        """Get the next UTC instant the wall clock in time_zone shows local_time"""
+        zone = NotificationUtil.get_time_zone(time_zone)
+        local_now = now.astimezone(zone)
+        wall_time = NotificationUtil.parse_local_time(local_time)
+        occurrence = datetime.combine(local_now.date(), wall_time, tzinfo=zone)
+        if occurrence <= local_now:
+            occurrence = datetime.combine(local_now.date() + timedelta(days=1), wall_time, tzinfo=zone)
+        return occurrence.astimezone(timezone.utc)
+
+    @staticmethod
+    def get_quiet_hours_end(preferences: NotificationPreferences, now: datetime) -> Optional[datetime]:
+        """Get the UTC instant the recipient's quiet hours end, or None when now is outside them"""
+        if not preferences.quiet_hours_start or not preferences.quiet_hours_end:
+            return None
+        
+        zone = NotificationUtil.get_time_zone(preferences.time_zone)
+        local_now = now.astimezone(zone)
+        start = NotificationUtil.parse_local_time(preferences.quiet_hours_start)
+        end = NotificationUtil.parse_local_time(preferences.quiet_hours_end)
+        current = local_now.time().replace(tzinfo=None)
+        
+        if start == end:
+            return None
+        if start < end:
+            in_quiet_hours = start <= current < end
+        else:
+            # Quiet hours wrap past midnight, e.g. 22:00 to 07:00
+            in_quiet_hours = current >= start or current < end
+        
+        if not in_quiet_hours:
+            return None
+        
+        quiet_hours_end = datetime.combine(local_now.date(), end, tzinfo=zone)
+        if quiet_hours_end <= local_now:
+            quiet_hours_end = datetime.combine(local_now.date() + timedelta(days=1), end, tzinfo=zone)
+        return quiet_hours_end.astimezone(timezone.utc)
+
     @staticmethod
     def sanitize_notification_data(data: Dict[str, Any]) -> Dict[str, Any]:
         """Sanitize notification data for security"""
@@ -172,4 +431,67 @@ class NotificationUtil:
             "account_id": account_id,
             "timestamp": datetime.now().isoformat(),
             "source": "backend_notification_system"
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def get_cleanup_mode() -> NotificationCleanupMode:
+        """Get the configured cleanup mode for old notifications"""
+        mode = ConfigService[str].get_value(
+            key="notification.cleanup.mode", default=NotificationCleanupMode.CHUNKED.value
+        )
+        return NotificationCleanupMode(mode.upper())
+
+    @staticmethod
+    def get_dispatch_mode() -> NotificationDispatchMode:
+        """Get how newly created notifications are handed to the sender"""
+        mode = ConfigService[str].get_value(
+            key="notification.dispatch.mode", default=NotificationDispatchMode.INLINE.value
+        )
+        return NotificationDispatchMode(mode.upper())
+
+    @staticmethod
+    def get_storage_engine() -> NotificationStorageEngine:
+        """Get whether notifications are stored one per document or packed into per-account buckets"""
+        engine = ConfigService[str].get_value(
+            key="notification.storage.engine", default=NotificationStorageEngine.DOCUMENT.value
+        )
+        return NotificationStorageEngine(engine.upper())
+
+    @staticmethod
+    def get_archive_format() -> NotificationArchiveFormat:
+        """Get the configured file format for archived notifications"""
+        archive_format = ConfigService[str].get_value(
+            key="notification.archive.format", default=NotificationArchiveFormat.NDJSON.value
+        )
+        return NotificationArchiveFormat(archive_format.upper())
+
+    @staticmethod
+    def get_archive_account_bucket(account_id: str) -> int:
+        """Get the stable archive partition bucket for an account"""
+        return zlib.crc32(account_id.encode("utf-8")) % ARCHIVE_ACCOUNT_BUCKET_COUNT
+
+    @staticmethod
+    def get_archive_partition_path(root_path: Path, partition_date: date, account_id: str) -> Path:
+        """Get the date and account partitioned directory for archived notifications"""
+        bucket = NotificationUtil.get_archive_account_bucket(account_id)
+        return root_path / f"date={partition_date.isoformat()}" / f"bucket={bucket:02d}"
+
+    @staticmethod
+    def convert_notification_bson_to_archive_record(notification_bson: dict[str, Any]) -> Dict[str, Any]:
+        """Convert BSON data to a JSON serializable archive record"""
+        record = dict(notification_bson)
+        record["_id"] = str(record["_id"])
+        for field in ARCHIVE_DATE_FIELDS:
+            if isinstance(record.get(field), datetime):
+                record[field] = record[field].isoformat()
+        return record
+
+    @staticmethod
+    def convert_archive_record_to_notification_bson(record: Dict[str, Any]) -> dict[str, Any]:
+        """Convert an archive record back to BSON shaped data"""
+        notification_bson = dict(record)
+        notification_bson["_id"] = ObjectId(notification_bson["_id"])
+        for field in ARCHIVE_DATE_FIELDS:
+            if notification_bson.get(field):
+                notification_bson[field] = datetime.fromisoformat(notification_bson[field])
+        return notification_bson
@@ -1,10 +1,19 @@
-from datetime import datetime
-from typing import Dict, List, Optional
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from bson.objectid import ObjectId
-from pymongo import ReturnDocument
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
 
+from modules.config.config_service import ConfigService
 from modules.notification.errors import NotificationNotFoundError, NotificationTemplateNotFoundError
+from modules.notification.internal.device_set_manager import DeviceSetManager
+from modules.notification.internal.device_token_cache import DeviceTokenCache
+from modules.notification.internal.notification_bucket_store import NotificationBucketStore
+from modules.notification.internal.notification_event_manager import EVENT_STATUS_PREDECESSORS
+from modules.notification.internal.notification_rollup_manager import NotificationRollupManager
+from modules.notification.internal.notification_schedule_manager import NotificationScheduleManager
 from modules.notification.internal.notification_util import NotificationUtil
 from modules.notification.internal.store.notification_model import (
     DeviceTokenModel,
@@ -13,6 +22,7 @@ from modules.notification.internal.store.notification_model import (
 )
 from modules.notification.internal.store.notification_repository import (
     DeviceTokenRepository,
+    NotificationPreferencesRepository,
     NotificationRepository,
     NotificationTemplateRepository,
 )
@@ -20,15 +30,44 @@ from modules.notification.types import (
     CreateNotificationParams,
     DeviceToken,
     Notification,
+    NotificationCleanupMode,
+    NotificationCleanupParams,
+    NotificationCleanupResult,
+    NotificationPreferences,
     NotificationStatus,
     NotificationTemplate,
+    NotificationTemplateVariant,
 )
 
+TERMINAL_NOTIFICATION_STATUSES = [
+    NotificationStatus.SENT.value,
+    NotificationStatus.DELIVERED.value,
+    NotificationStatus.CLICKED.value,
+    NotificationStatus.FAILED.value,
+]
+
+NOTIFICATION_TTL_INDEX_NAME = "expire_at_ttl"
+
 
 class NotificationWriter:
     @staticmethod
-    def create_notification(params: CreateNotificationParams) -> Notification:
-        """Create a new notification"""
+    def _get_retention_ms() -> int:
+        return ConfigService[int].get_value(key="notification.cleanup.days_old", default=90) * 24 * 60 * 60 * 1000
+
+    @staticmethod
+    def build_retention_query(days_old: int) -> Dict[str, Any]:
+        """
+        Match the notifications retention removes, terminal ones created more than days_old ago. The chunked and
+        archive cleanups delete by it and the TTL mode's expire_at is derived from the same status and timestamp.
+        """
+        return {
+            "created_at": {"$lt": datetime.now() - timedelta(days=days_old)},
+            "status": {"$in": TERMINAL_NOTIFICATION_STATUSES}
+        }
+
+    @staticmethod
+    def _build_notification_bson(params: CreateNotificationParams) -> Dict[str, Any]:
+        """Validate create parameters and build the notification document"""
         # Validate notification data
         NotificationUtil.validate_notification_data(params.title, params.body)
         
@@ -61,35 +100,151 @@ class NotificationWriter:
             notification_type=params.notification_type,
             status=NotificationStatus.PENDING,
             priority=params.priority,
-            device_tokens=valid_tokens,
+            device_tokens=[],
             topic=params.topic,
             data=sanitized_data,
             image_url=params.image_url,
             template_id=params.template_id,
             template_data=params.template_data,
             scheduled_at=scheduled_at,
+            collapse_key=params.collapse_key,
+            campaign_id=params.campaign_id,
+            variant_id=params.variant_id,
+            device_set_hash=DeviceSetManager.save(valid_tokens),
         ).to_bson()
         
-        # Insert into database
-        result = NotificationRepository.collection().insert_one(notification_bson)
+        # Tokens are stored once in their device set, the notification only references it by hash
+        del notification_bson["device_tokens"]
+        
+        return notification_bson
+
+    @staticmethod
+    def create_notification(params: CreateNotificationParams) -> Notification:
+        """Create a new notification"""
+        notification_bson = NotificationWriter._build_notification_bson(params)
+        
+        # Insert into database and retrieve the created notification
+        if NotificationBucketStore.is_enabled():
+            notification_id = NotificationBucketStore.insert_many([notification_bson])[0]
+            created_notification_bson = NotificationBucketStore.find_by_id(str(notification_id), params.account_id)
+        else:
+            notification_id = NotificationRepository.collection().insert_one(notification_bson).inserted_id
+            created_notification_bson = NotificationRepository.collection().find_one(
+                {"account_id": params.account_id, "_id": notification_id}
+            )
         
-        # Retrieve the created notification
-        created_notification_bson = NotificationRepository.collection().find_one({"_id": result.inserted_id})
+        # Scheduled notifications are picked up through the schedule index, not by scanning notifications
+        if notification_bson.get("scheduled_at"):
+            NotificationScheduleManager.add([(str(notification_id), notification_bson["scheduled_at"], "UTC")])
         
+        NotificationRollupManager.record_transitions([(notification_bson, ["created"])])
+        
+        DeviceSetManager.attach_device_tokens([created_notification_bson])
         return NotificationUtil.convert_notification_bson_to_notification(created_notification_bson)
 
+    @staticmethod
+    def create_scheduled_notifications(scheduled_params: List[Tuple[CreateNotificationParams, str]]) -> int:
+        """Create scheduled notifications in bulk and index each under its recipient's time zone"""
+        notification_bsons = [NotificationWriter._build_notification_bson(params) for params, _ in scheduled_params]
+        if not notification_bsons:
+            return 0
+        
+        if NotificationBucketStore.is_enabled():
+            inserted_ids = NotificationBucketStore.insert_many(notification_bsons)
+        else:
+            inserted_ids = NotificationRepository.collection().insert_many(notification_bsons).inserted_ids
+        
+        NotificationScheduleManager.add([
+            (str(notification_id), notification_bson["scheduled_at"], time_zone)
+            for notification_id, notification_bson, (_, time_zone) in zip(
+                inserted_ids, notification_bsons, scheduled_params
+            )
+        ])
+        NotificationRollupManager.record_transitions(
+            [(notification_bson, ["created"]) for notification_bson in notification_bsons]
+        )
+        return len(inserted_ids)
+
+    @staticmethod
+    def claim_notification_for_dispatch(
+        notification_id: str, account_id: Optional[str] = None
+    ) -> Optional[Notification]:
+        """Atomically claim a pending notification so only one dispatcher sends it, None if it is not claimable"""
+        claim_timeout_seconds = ConfigService[int].get_value(
+            key="notification.dispatch.claim_timeout_seconds", default=300
+        )
+        now = datetime.now()
+        
+        # A claim left by a dispatcher that died mid-send can be taken over once it is stale
+        claim_query = {
+            "status": NotificationStatus.PENDING.value,
+            "$or": [
+                {"dispatch_claimed_at": None},
+                {"dispatch_claimed_at": {"$lte": now - timedelta(seconds=claim_timeout_seconds)}}
+            ]
+        }
+        
+        if NotificationBucketStore.is_enabled():
+            claimed_notification = NotificationBucketStore.update_notification(
+                notification_id, {"dispatch_claimed_at": now, "updated_at": now}, account_id, claim_query
+            )
+        else:
+            claimed_notification = NotificationRepository.collection().find_one_and_update(
+                {**NotificationUtil.build_notification_id_query(notification_id, account_id), **claim_query},
+                {"$set": {"dispatch_claimed_at": now, "updated_at": now}},
+                return_document=ReturnDocument.AFTER
+            )
+        
+        if claimed_notification is None:
+            return None
+        
+        DeviceSetManager.attach_device_tokens([claimed_notification])
+        return NotificationUtil.convert_notification_bson_to_notification(claimed_notification)
+
+    @staticmethod
+    def defer_scheduled_notification(
+        notification_id: str, send_at: datetime, time_zone: str, account_id: Optional[str] = None
+    ) -> None:
+        """Move a due notification to a later send time, e.g. past the recipient's quiet hours"""
+        update_data = {"scheduled_at": send_at, "dispatch_claimed_at": None, "updated_at": datetime.now()}
+        if NotificationBucketStore.is_enabled():
+            NotificationBucketStore.update_notification(notification_id, update_data, account_id)
+        else:
+            NotificationRepository.collection().update_one(
+                NotificationUtil.build_notification_id_query(notification_id, account_id),
+                {"$set": update_data}
+            )
+        NotificationScheduleManager.add([(notification_id, send_at, time_zone)])
+
+    @staticmethod
+    def update_notification_preferences(preferences: NotificationPreferences) -> NotificationPreferences:
+        """Create or replace an account's time zone and quiet hours"""
+        NotificationPreferencesRepository.collection().update_one(
+            {"account_id": preferences.account_id},
+            {
+                "$set": {
+                    "time_zone": preferences.time_zone,
+                    "quiet_hours_start": preferences.quiet_hours_start,
+                    "quiet_hours_end": preferences.quiet_hours_end,
+                    "updated_at": datetime.now()
+                },
+                "$setOnInsert": {
+                    "created_at": datetime.now()
+                }
+            },
+            upsert=True
+        )
+        return preferences
+
     @staticmethod
     def update_notification_status(
         notification_id: str, 
         status: NotificationStatus, 
-        error_message: Optional[str] = None
+        error_message: Optional[str] = None,
+        account_id: Optional[str] = None,
+        delivery_results: Optional[Dict[str, List[int]]] = None
     ) -> Notification:
         """Update notification status"""
-        try:
-            object_id = ObjectId(notification_id)
-        except Exception:
-            raise NotificationNotFoundError(notification_id)
-        
         update_data = {
             "status": status.value,
             "updated_at": datetime.now()
@@ -106,56 +261,182 @@ class NotificationWriter:
         if error_message:
             update_data["error_message"] = error_message
         
-        updated_notification = NotificationRepository.collection().find_one_and_update(
-            {"_id": object_id},
-            {"$set": update_data},
-            return_document=ReturnDocument.AFTER
-        )
+        if delivery_results is not None:
+            update_data["delivery_results"] = delivery_results
         
-        if updated_notification is None:
+        # In TTL mode a terminal notification expires days_old after it was created, the same statuses and
+        # created_at cutoff the chunked and archive cleanups delete by. Values are set as literals in the pipeline.
+        update: Dict[str, Any] | List[Dict[str, Any]] = {"$set": update_data}
+        if (
+            status.value in TERMINAL_NOTIFICATION_STATUSES
+            and NotificationUtil.get_cleanup_mode() == NotificationCleanupMode.TTL
+        ):
+            update = [{
+                "$set": {
+                    **{field: {"$literal": value} for field, value in update_data.items()},
+                    "expire_at": {"$add": ["$created_at", NotificationWriter._get_retention_ms()]},
+                }
+            }]
+        
+        # The previous status tells whether this is a transition the funnel rollups should count
+        if NotificationBucketStore.is_enabled():
+            previous_notification = NotificationBucketStore.update_notification(
+                notification_id, update_data, account_id, return_document=ReturnDocument.BEFORE
+            )
+        else:
+            previous_notification = NotificationRepository.collection().find_one_and_update(
+                NotificationUtil.build_notification_id_query(notification_id, account_id),
+                update,
+                return_document=ReturnDocument.BEFORE
+            )
+        
+        if previous_notification is None:
             raise NotificationNotFoundError(notification_id)
         
+        NotificationRollupManager.record_transitions([(
+            previous_notification,
+            NotificationRollupManager.get_transition_counters(previous_notification.get("status"), status.value)
+        )])
+        
+        updated_notification = {**previous_notification, **update_data}
+        DeviceSetManager.attach_device_tokens([updated_notification])
         return NotificationUtil.convert_notification_bson_to_notification(updated_notification)
 
     @staticmethod
-    def mark_notification_as_sent(notification_id: str) -> Notification:
+    def mark_notification_as_sent(
+        notification_id: str,
+        account_id: Optional[str] = None,
+        delivery_results: Optional[Dict[str, List[int]]] = None
+    ) -> Notification:
         """Mark notification as sent"""
-        return NotificationWriter.update_notification_status(notification_id, NotificationStatus.SENT)
+        return NotificationWriter.update_notification_status(
+            notification_id, NotificationStatus.SENT, account_id=account_id, delivery_results=delivery_results
+        )
 
     @staticmethod
-    def mark_notification_as_failed(notification_id: str, error_message: str) -> Notification:
+    def mark_notification_as_failed(
+        notification_id: str,
+        error_message: str,
+        account_id: Optional[str] = None,
+        delivery_results: Optional[Dict[str, List[int]]] = None
+    ) -> Notification:
         """Mark notification as failed"""
         return NotificationWriter.update_notification_status(
-            notification_id, NotificationStatus.FAILED, error_message
+            notification_id, NotificationStatus.FAILED, error_message, account_id, delivery_results
         )
 
     @staticmethod
-    def mark_notification_as_delivered(notification_id: str) -> Notification:
+    def mark_notification_as_delivered(notification_id: str, account_id: Optional[str] = None) -> Notification:
         """Mark notification as delivered"""
-        return NotificationWriter.update_notification_status(notification_id, NotificationStatus.DELIVERED)
+        return NotificationWriter.update_notification_status(
+            notification_id, NotificationStatus.DELIVERED, account_id=account_id
+        )
 
     @staticmethod
-    def mark_notification_as_clicked(notification_id: str) -> Notification:
+    def mark_notification_as_clicked(notification_id: str, account_id: Optional[str] = None) -> Notification:
         """Mark notification as clicked"""
-        return NotificationWriter.update_notification_status(notification_id, NotificationStatus.CLICKED)
+        return NotificationWriter.update_notification_status(
+            notification_id, NotificationStatus.CLICKED, account_id=account_id
+        )
+
+    @staticmethod
+    def apply_event_statuses(rollups: List[Tuple[str, str, NotificationStatus, Dict[str, datetime]]]) -> int:
+        """
+        Fold event-derived statuses into their notifications, rollups are (account_id, notification_id, status,
+        timestamp fields). A notification only moves forward, so replaying a rollup changes nothing.
+        """
+        now = datetime.now()
+        
+        if NotificationBucketStore.is_enabled():
+            transitions = []
+            for account_id, notification_id, status, fields in rollups:
+                previous_notification = NotificationBucketStore.update_notification(
+                    notification_id,
+                    {"status": status.value, **fields, "updated_at": now},
+                    account_id,
+                    {"status": {"$in": EVENT_STATUS_PREDECESSORS[status]}},
+                    return_document=ReturnDocument.BEFORE
+                )
+                if previous_notification is not None:
+                    transitions.append((
+                        previous_notification,
+                        NotificationRollupManager.get_transition_counters(
+                            previous_notification["status"], status.value
+                        )
+                    ))
+            NotificationRollupManager.record_transitions(transitions)
+            return len(transitions)
+        
+        operations = [
+            UpdateOne(
+                {
+                    "account_id": account_id,
+                    "_id": ObjectId(notification_id),
+                    "status": {"$in": EVENT_STATUS_PREDECESSORS[status]}
+                },
+                {"$set": {"status": status.value, **fields, "updated_at": now}}
+            )
+            for account_id, notification_id, status, fields in rollups
+            if ObjectId.is_valid(notification_id)
+        ]
+        if not operations:
+            return 0
+        
+        # Read what the bulk write is about to move, so the funnel rollups count each transition from its
+        # previous status. A notification moved concurrently between the read and the write can be miscounted.
+        previous_notifications = {}
+        if NotificationRollupManager.is_enabled():
+            previous_notifications = {
+                str(notification_bson["_id"]): notification_bson
+                for notification_bson in NotificationRepository.collection().find(
+                    {
+                        "account_id": {"$in": list({rollup[0] for rollup in rollups})},
+                        "_id": {"$in": [ObjectId(rollup[1]) for rollup in rollups if ObjectId.is_valid(rollup[1])]},
+                        "status": {"$in": EVENT_STATUS_PREDECESSORS[NotificationStatus.CLICKED]}
+                    },
+                    {"account_id": 1, "status": 1, "template_id": 1, "campaign_id": 1, "variant_id": 1}
+                )
+            }
+        
+        updated_count = NotificationRepository.collection().bulk_write(operations, ordered=False).modified_count
+        
+        transitions = []
+        for account_id, notification_id, status, _ in rollups:
+            previous_notification = previous_notifications.get(notification_id)
+            if (
+                previous_notification is not None
+                and previous_notification["account_id"] == account_id
+                and previous_notification["status"] in EVENT_STATUS_PREDECESSORS[status]
+            ):
+                transitions.append((
+                    previous_notification,
+                    NotificationRollupManager.get_transition_counters(previous_notification["status"], status.value)
+                ))
+        NotificationRollupManager.record_transitions(transitions)
+        
+        return updated_count
 
     @staticmethod
     def create_notification_template(
         name: str,
         title_template: str,
         body_template: str,
-        default_data: Optional[Dict] = None
+        default_data: Optional[Dict] = None,
+        variants: Optional[List[NotificationTemplateVariant]] = None
     ) -> NotificationTemplate:
         """Create a new notification template"""
         # Validate template data
         NotificationUtil.validate_notification_data(title_template, body_template)
+        if variants:
+            NotificationUtil.validate_template_variants(variants)
         
         template_bson = NotificationTemplateModel(
             id=None,
             name=name,
             title_template=title_template,
             body_template=body_template,
-            default_data=default_data
+            default_data=default_data,
+            variants=[asdict(variant) for variant in variants] if variants else None
         ).to_bson()
         
         result = NotificationTemplateRepository.collection().insert_one(template_bson)
@@ -169,9 +450,10 @@ class NotificationWriter:
         name: Optional[str] = None,
         title_template: Optional[str] = None,
         body_template: Optional[str] = None,
-        default_data: Optional[Dict] = None
+        default_data: Optional[Dict] = None,
+        variants: Optional[List[NotificationTemplateVariant]] = None
     ) -> NotificationTemplate:
-        """Update notification template"""
+        """Update notification template, an empty variants list removes the template's variants"""
         try:
             object_id = ObjectId(template_id)
         except Exception:
@@ -187,6 +469,9 @@ class NotificationWriter:
             update_data["body_template"] = body_template
         if default_data is not None:
             update_data["default_data"] = default_data
+        if variants is not None:
+            NotificationUtil.validate_template_variants(variants)
+            update_data["variants"] = [asdict(variant) for variant in variants] or None
         
         updated_template = NotificationTemplateRepository.collection().find_one_and_update(
             {"_id": object_id},
@@ -213,12 +498,19 @@ class NotificationWriter:
     @staticmethod
     def register_device_token(account_id: str, token: str, platform: str) -> DeviceToken:
         """Register or update device token for an account"""
+        # A token moving between accounts leaves its previous owner. Finding the owner is the one token lookup
+        # that cannot be routed by account, it is answered from the token index of every shard
+        previous_account_ids = DeviceTokenRepository.collection().distinct(
+            "account_id", {"token": token, "account_id": {"$ne": account_id}}
+        )
+        for previous_account_id in previous_account_ids:
+            DeviceTokenRepository.collection().delete_many({"account_id": previous_account_id, "token": token})
+        
         # Use upsert to either update existing or insert new
         DeviceTokenRepository.collection().update_one(
-            {"token": token},  # Find by token
+            {"account_id": account_id, "token": token},
             {
                 "$set": {
-                    "account_id": account_id,
                     "platform": platform,
                     "is_active": True,
                     "updated_at": datetime.now()
@@ -230,15 +522,27 @@ class NotificationWriter:
             upsert=True  # Create if doesn't exist, update if exists
         )
         
+        # A token moving between accounts changes the devices of both
+        DeviceTokenCache.invalidate(account_id, *previous_account_ids)
+        
         return DeviceToken(token=token, platform=platform)
 
     @staticmethod
-    def deactivate_device_token(token: str) -> bool:
-        """Deactivate a device token"""
+    def deactivate_device_token(token: str, account_id: Optional[str] = None) -> bool:
+        """Deactivate a device token, only within account_id when it is known"""
+        if account_id:
+            account_ids = [account_id]
+            query = {"account_id": account_id, "token": token}
+        else:
+            account_ids = DeviceTokenRepository.collection().distinct("account_id", {"token": token})
+            query = {"token": token}
+        
         result = DeviceTokenRepository.collection().update_many(
-            {"token": token},
+            query,
             {"$set": {"is_active": False, "updated_at": datetime.now()}}
         )
+        
+        DeviceTokenCache.invalidate(*account_ids)
         return result.modified_count > 0
 
     @staticmethod
@@ -252,16 +556,148 @@ class NotificationWriter:
             query,
             {"$set": {"is_active": False, "updated_at": datetime.now()}}
         )
+        
+        DeviceTokenCache.invalidate(account_id)
         return result.modified_count
 
     @staticmethod
-    def cleanup_old_notifications(days_old: int = 90) -> int:
-        """Clean up old notifications"""
-        from datetime import timedelta
-        
-        cutoff_date = datetime.now() - timedelta(days=days_old)
-        result = NotificationRepository.collection().delete_many({
-            "created_at": {"$lt": cutoff_date},
-            "status": {"$in": ["SENT", "DELIVERED", "CLICKED", "FAILED"]}
-        })
-        return result.deleted_count
\ No newline at end of file
+    def _iterate_id_batches(
+        query: Dict[str, Any],
+        batch_size: int,
+        pause_seconds: float = 0,
+        max_documents: Optional[int] = None
+    ) -> Iterator[List[ObjectId]]:
+        """Yield _id-ordered batches of notification ids matching query, pausing between batches"""
+        collection = NotificationRepository.collection()
+        processed = 0
+        last_id = None
+        
+        while max_documents is None or processed < max_documents:
+            limit = batch_size if max_documents is None else min(batch_size, max_documents - processed)
+            batch_query = dict(query)
+            if last_id is not None:
+                batch_query["_id"] = {"$gt": last_id}
+            
+            # Walk the _id index so each batch resumes where the previous one stopped
+            cursor = (
+                collection.find(batch_query, {"_id": 1})
+                .sort("_id", ASCENDING)
+                .hint([("_id", ASCENDING)])
+                .limit(limit)
+            )
+            ids = [doc["_id"] for doc in cursor]
+            if not ids:
+                return
+            
+            yield ids
+            
+            processed += len(ids)
+            last_id = ids[-1]
+            if len(ids) < limit:
+                return
+            
+            if pause_seconds > 0:
+                time.sleep(pause_seconds)
+
+    @staticmethod
+    def migrate_device_tokens_to_device_sets(batch_size: int, pause_seconds: float = 0) -> int:
+        """
+        Replace inline device_tokens on existing notifications with a reference to their device set, and backfill
+        last_used_at on sets stored before it was tracked
+        """
+        DeviceSetManager.backfill_last_used_at()
+        collection = NotificationRepository.collection()
+        
+        updated_count = 0
+        for ids in NotificationWriter._iterate_id_batches(
+            {"device_tokens": {"$exists": True}}, batch_size, pause_seconds
+        ):
+            operations = [
+                UpdateOne(
+                    {"_id": notification_bson["_id"]},
+                    {
+                        "$set": {"device_set_hash": DeviceSetManager.save(notification_bson["device_tokens"])},
+                        "$unset": {"device_tokens": ""}
+                    }
+                )
+                for notification_bson in collection.find({"_id": {"$in": ids}}, {"device_tokens": 1})
+            ]
+            if operations:
+                updated_count += collection.bulk_write(operations, ordered=False).modified_count
+        
+        return updated_count
+
+    @staticmethod
+    def cleanup_old_notifications(
+        params: NotificationCleanupParams,
+        on_progress: Optional[Callable[[NotificationCleanupResult], None]] = None
+    ) -> NotificationCleanupResult:
+        """Clean up old notifications in _id-ordered batches"""
+        query = NotificationWriter.build_retention_query(params.days_old)
+        
+        started_at = time.monotonic()
+        deleted_count = 0
+        batch_count = 0
+        
+        for ids in NotificationWriter._iterate_id_batches(
+            query, params.batch_size, params.pause_seconds, params.max_documents
+        ):
+            result = NotificationRepository.collection().delete_many({"_id": {"$in": ids}})
+            deleted_count += result.deleted_count
+            batch_count += 1
+            
+            if on_progress:
+                on_progress(NotificationCleanupResult(
+                    mode=NotificationCleanupMode.CHUNKED,
+                    deleted_count=deleted_count,
+                    batch_count=batch_count,
+                    elapsed_seconds=time.monotonic() - started_at
+                ))
+        
+        # Buckets expire whole, once their newest notification is past retention
+        if NotificationBucketStore.is_enabled():
+            deleted_count += NotificationBucketStore.delete_buckets_before(cutoff_date, params.batch_size)
+        
+        # Stopping exactly at the cap means there may still be matching documents left
+        has_more = params.max_documents is not None and deleted_count >= params.max_documents
+        
+        return NotificationCleanupResult(
+            mode=NotificationCleanupMode.CHUNKED,
+            deleted_count=deleted_count,
+            batch_count=batch_count,
+            elapsed_seconds=time.monotonic() - started_at,
+            has_more=has_more
+        )
+
+    @staticmethod
+    def enable_ttl_cleanup(days_old: int, batch_size: int, pause_seconds: float = 0) -> int:
+        """Create the TTL index and backfill expire_at on existing terminal notifications"""
+        collection = NotificationRepository.collection()
+        collection.create_index("expire_at", name=NOTIFICATION_TTL_INDEX_NAME, expireAfterSeconds=0)
+        
+        retention_ms = days_old * 24 * 60 * 60 * 1000
+        query = {"status": {"$in": TERMINAL_NOTIFICATION_STATUSES}, "expire_at": None}
+        
+        updated_count = 0
+        for ids in NotificationWriter._iterate_id_batches(query, batch_size, pause_seconds):
+            # Counted from created_at, the same rule update_notification_status and the chunked cleanup apply
+            result = collection.update_many(
+                {"_id": {"$in": ids}}, [{"$set": {"expire_at": {"$add": ["$created_at", retention_ms]}}}]
+            )
+            updated_count += result.modified_count
+        
+        return updated_count
+
+    @staticmethod
+    def disable_ttl_cleanup(batch_size: int, pause_seconds: float = 0) -> int:
+        """Drop the TTL index and clear expire_at so chunked cleanup takes over"""
+        collection = NotificationRepository.collection()
+        if NOTIFICATION_TTL_INDEX_NAME in collection.index_information():
+            collection.drop_index(NOTIFICATION_TTL_INDEX_NAME)
+        
+        updated_count = 0
+        for ids in NotificationWriter._iterate_id_batches({"expire_at": {"$ne": None}}, batch_size, pause_seconds):
+            result = collection.update_many({"_id": {"$in": ids}}, {"$set": {"expire_at": None}})
+            updated_count += result.modified_count
+        
+        return updated_count
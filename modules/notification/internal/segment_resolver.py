@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+from modules.notification.errors import NotificationValidationError
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.internal.store.notification_repository import (
+    DeviceTokenRepository,
+    TopicSubscriptionRepository,
+)
+from modules.notification.types import DeviceToken, NotificationSegment
+
+VALID_PLATFORMS = ["ios", "android", "web"]
+
+
+class SegmentResolver:
+    @staticmethod
+    def _build_pipeline(segment: NotificationSegment) -> List[Dict[str, Any]]:
+        """Compile a segment definition into an aggregation over device_tokens and topic_subscriptions"""
+        match: Dict[str, Any] = {"is_active": True}
+
+        if segment.platforms:
+            invalid_platforms = [platform for platform in segment.platforms if platform not in VALID_PLATFORMS]
+            if invalid_platforms:
+                raise NotificationValidationError(f"Invalid segment platforms: {', '.join(invalid_platforms)}")
+            match["platform"] = {"$in": segment.platforms}
+
+        if segment.active_within_days is not None:
+            # Clients re-register their token on launch, which refreshes updated_at
+            match["updated_at"] = {"$gte": datetime.now() - timedelta(days=segment.active_within_days)}
+
+        pipeline: List[Dict[str, Any]] = [{"$match": match}]
+
+        if segment.topic:
+            NotificationUtil.validate_topic_name(segment.topic)
+            pipeline += [
+                {
+                    "$lookup": {
+                        "from": TopicSubscriptionRepository.collection_name,
+                        "localField": "token",
+                        "foreignField": "token",
+                        "pipeline": [{"$match": {"topic": segment.topic}}, {"$limit": 1}, {"$project": {"_id": 1}}],
+                        "as": "subscription",
+                    }
+                },
+                {"$match": {"subscription": {"$ne": []}}},
+            ]
+
+        pipeline.append({"$project": {"_id": 0, "account_id": 1, "token": 1, "platform": 1}})
+        return pipeline
+
+    @staticmethod
+    def count_audience(segment: NotificationSegment) -> int:
+        """Count the device tokens matching a segment"""
+        pipeline = SegmentResolver._build_pipeline(segment) + [{"$count": "audience_size"}]
+        result = list(DeviceTokenRepository.collection().aggregate(pipeline))
+        return result[0]["audience_size"] if result else 0
+
+    @staticmethod
+    def iter_audience_batches(segment: NotificationSegment, batch_size: int) -> Iterator[List[DeviceToken]]:
+        """Stream the device tokens matching a segment in batches, never holding the full audience"""
+        cursor = DeviceTokenRepository.collection().aggregate(
+            SegmentResolver._build_pipeline(segment), batchSize=batch_size
+        )
+
+        batch: List[DeviceToken] = []
+        try:
+            for token_bson in cursor:
+                batch.append(DeviceToken(token=token_bson["token"], platform=token_bson["platform"]))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+
+            if batch:
+                yield batch
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def iter_audience_accounts(
+        segment: NotificationSegment, batch_size: int
+    ) -> Iterator[Tuple[str, List[DeviceToken]]]:
+        """Stream each account owning device tokens that match a segment, together with those tokens"""
+        pipeline = SegmentResolver._build_pipeline(segment) + [
+            {"$group": {"_id": "$account_id", "tokens": {"$push": {"token": "$token", "platform": "$platform"}}}},
+        ]
+
+        cursor = DeviceTokenRepository.collection().aggregate(pipeline, batchSize=batch_size, allowDiskUse=True)
+        try:
+            for account_bson in cursor:
+                yield account_bson["_id"], [
+                    DeviceToken(token=token_bson["token"], platform=token_bson["platform"])
+                    for token_bson in account_bson["tokens"]
+                ]
+        finally:
+            cursor.close()
@@ -1,11 +1,21 @@
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
 from bson import ObjectId
 
 from modules.application.base_model import BaseModel
-from modules.notification.types import NotificationPriority, NotificationStatus, NotificationType
+from modules.notification.types import (
+    CampaignStatus,
+    IdempotencyKeyStatus,
+    NotificationDigestStatus,
+    NotificationEventType,
+    NotificationPriority,
+    NotificationRollupDimension,
+    NotificationScheduleBucketStatus,
+    NotificationStatus,
+    NotificationType,
+)
 
 
 @dataclass
@@ -28,6 +38,13 @@ class NotificationModel(BaseModel):
     delivered_at: Optional[datetime] = None
     clicked_at: Optional[datetime] = None
     error_message: Optional[str] = None
+    collapse_key: Optional[str] = None
+    campaign_id: Optional[str] = None
+    variant_id: Optional[str] = None
+    device_set_hash: Optional[str] = None
+    delivery_results: Optional[Dict[str, List[int]]] = None
+    dispatch_claimed_at: Optional[datetime] = None
+    expire_at: Optional[datetime] = None
     created_at: Optional[datetime] = datetime.now()
     updated_at: Optional[datetime] = datetime.now()
 
@@ -52,6 +69,13 @@ class NotificationModel(BaseModel):
             delivered_at=bson_data.get("delivered_at"),
             clicked_at=bson_data.get("clicked_at"),
             error_message=bson_data.get("error_message"),
+            collapse_key=bson_data.get("collapse_key"),
+            campaign_id=bson_data.get("campaign_id"),
+            variant_id=bson_data.get("variant_id"),
+            device_set_hash=bson_data.get("device_set_hash"),
+            delivery_results=bson_data.get("delivery_results"),
+            dispatch_claimed_at=bson_data.get("dispatch_claimed_at"),
+            expire_at=bson_data.get("expire_at"),
             created_at=bson_data.get("created_at"),
             updated_at=bson_data.get("updated_at"),
         )
@@ -68,6 +92,7 @@ class NotificationTemplateModel(BaseModel):
     body_template: str
     id: Optional[ObjectId | str] = None
     default_data: Optional[Dict[str, Any]] = None
+    variants: Optional[List[Dict[str, Any]]] = None
     created_at: Optional[datetime] = datetime.now()
     updated_at: Optional[datetime] = datetime.now()
 
@@ -79,6 +104,7 @@ class NotificationTemplateModel(BaseModel):
             title_template=bson_data.get("title_template", ""),
             body_template=bson_data.get("body_template", ""),
             default_data=bson_data.get("default_data"),
+            variants=bson_data.get("variants"),
             created_at=bson_data.get("created_at"),
             updated_at=bson_data.get("updated_at"),
         )
@@ -112,4 +138,432 @@ class DeviceTokenModel(BaseModel):
 
     @staticmethod
     def get_collection_name() -> str:
-        return "device_tokens"
\ No newline at end of file
+        return "device_tokens"
+
+
+@dataclass
+class TopicSubscriptionModel(BaseModel):
+    topic: str
+    token: str
+    account_id: Optional[str] = None
+    id: Optional[ObjectId | str] = None
+    created_at: Optional[datetime] = datetime.now()
+    updated_at: Optional[datetime] = datetime.now()
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "TopicSubscriptionModel":
+        return cls(
+            id=bson_data.get("_id"),
+            topic=bson_data.get("topic", ""),
+            token=bson_data.get("token", ""),
+            account_id=bson_data.get("account_id"),
+            created_at=bson_data.get("created_at"),
+            updated_at=bson_data.get("updated_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "topic_subscriptions"
+
+
+@dataclass
+class IdempotencyKeyModel(BaseModel):
+    account_id: str
+    key: str
+    status: IdempotencyKeyStatus
+    expires_at: datetime
+    notification_id: Optional[str] = None
+    id: Optional[ObjectId | str] = None
+    created_at: Optional[datetime] = datetime.now()
+    updated_at: Optional[datetime] = datetime.now()
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "IdempotencyKeyModel":
+        return cls(
+            id=bson_data.get("_id"),
+            account_id=bson_data.get("account_id", ""),
+            key=bson_data.get("key", ""),
+            status=IdempotencyKeyStatus(bson_data.get("status", IdempotencyKeyStatus.IN_PROGRESS)),
+            expires_at=bson_data.get("expires_at", datetime.now()),
+            notification_id=bson_data.get("notification_id"),
+            created_at=bson_data.get("created_at"),
+            updated_at=bson_data.get("updated_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "notification_idempotency_keys"
+
+
+@dataclass
+class NotificationDigestModel(BaseModel):
+    account_id: str
+    collapse_key: str
+    status: NotificationDigestStatus
+    flush_at: datetime
+    event_count: int = 0
+    events: Optional[List[Dict[str, Any]]] = None
+    device_tokens: Optional[List[str]] = None
+    priority: NotificationPriority = NotificationPriority.NORMAL
+    idempotency_keys: Optional[List[str]] = None
+    notification_id: Optional[str] = None
+    id: Optional[ObjectId | str] = None
+    created_at: Optional[datetime] = datetime.now()
+    updated_at: Optional[datetime] = datetime.now()
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "NotificationDigestModel":
+        return cls(
+            id=bson_data.get("_id"),
+            account_id=bson_data.get("account_id", ""),
+            collapse_key=bson_data.get("collapse_key", ""),
+            status=NotificationDigestStatus(bson_data.get("status", NotificationDigestStatus.PENDING)),
+            flush_at=bson_data.get("flush_at", datetime.now()),
+            event_count=bson_data.get("event_count", 0),
+            events=bson_data.get("events", []),
+            device_tokens=bson_data.get("device_tokens", []),
+            priority=NotificationPriority(bson_data.get("priority", NotificationPriority.NORMAL)),
+            idempotency_keys=bson_data.get("idempotency_keys", []),
+            notification_id=bson_data.get("notification_id"),
+            created_at=bson_data.get("created_at"),
+            updated_at=bson_data.get("updated_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "notification_digests"
+
+
+@dataclass
+class NotificationPreferencesModel(BaseModel):
+    account_id: str
+    time_zone: str = "UTC"
+    quiet_hours_start: Optional[str] = None
+    quiet_hours_end: Optional[str] = None
+    id: Optional[ObjectId | str] = None
+    created_at: Optional[datetime] = datetime.now()
+    updated_at: Optional[datetime] = datetime.now()
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "NotificationPreferencesModel":
+        return cls(
+            id=bson_data.get("_id"),
+            account_id=bson_data.get("account_id", ""),
+            time_zone=bson_data.get("time_zone", "UTC"),
+            quiet_hours_start=bson_data.get("quiet_hours_start"),
+            quiet_hours_end=bson_data.get("quiet_hours_end"),
+            created_at=bson_data.get("created_at"),
+            updated_at=bson_data.get("updated_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "notification_preferences"
+
+
+@dataclass
+class NotificationScheduleBucketModel(BaseModel):
+    bucket_start: datetime
+    time_zone: str
+    status: NotificationScheduleBucketStatus
+    notification_ids: List[str]
+    size: int = 0
+    id: Optional[ObjectId | str] = None
+    claimed_at: Optional[datetime] = None
+    created_at: Optional[datetime] = datetime.now()
+    updated_at: Optional[datetime] = datetime.now()
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "NotificationScheduleBucketModel":
+        return cls(
+            id=bson_data.get("_id"),
+            bucket_start=bson_data.get("bucket_start", datetime.now()),
+            time_zone=bson_data.get("time_zone", "UTC"),
+            status=NotificationScheduleBucketStatus(
+                bson_data.get("status", NotificationScheduleBucketStatus.PENDING)
+            ),
+            notification_ids=bson_data.get("notification_ids", []),
+            size=bson_data.get("size", 0),
+            claimed_at=bson_data.get("claimed_at"),
+            created_at=bson_data.get("created_at"),
+            updated_at=bson_data.get("updated_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "notification_schedule_buckets"
+
+
+@dataclass
+class ChangeStreamStateModel(BaseModel):
+    name: str
+    resume_token: Optional[Dict[str, Any]] = None
+    id: Optional[ObjectId | str] = None
+    created_at: Optional[datetime] = datetime.now()
+    updated_at: Optional[datetime] = datetime.now()
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "ChangeStreamStateModel":
+        return cls(
+            id=bson_data.get("_id"),
+            name=bson_data.get("name", ""),
+            resume_token=bson_data.get("resume_token"),
+            created_at=bson_data.get("created_at"),
+            updated_at=bson_data.get("updated_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "notification_change_stream_state"
+
+
+@dataclass
+class NotificationBucketModel(BaseModel):
+    account_id: str
+    notifications: List[Dict[str, Any]]
+    count: int = 0
+    unread_count: int = 0
+    id: Optional[ObjectId | str] = None
+    start_at: Optional[datetime] = None
+    end_at: Optional[datetime] = None
+    created_at: Optional[datetime] = datetime.now()
+    updated_at: Optional[datetime] = datetime.now()
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "NotificationBucketModel":
+        return cls(
+            id=bson_data.get("_id"),
+            account_id=bson_data.get("account_id", ""),
+            notifications=bson_data.get("notifications", []),
+            count=bson_data.get("count", 0),
+            unread_count=bson_data.get("unread_count", 0),
+            start_at=bson_data.get("start_at"),
+            end_at=bson_data.get("end_at"),
+            created_at=bson_data.get("created_at"),
+            updated_at=bson_data.get("updated_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "notification_buckets"
+
+
+@dataclass
+class DeviceSetModel(BaseModel):
+    hash: str
+    tokens: List[str]
+    id: Optional[ObjectId | str] = None
+    created_at: Optional[datetime] = datetime.now()
+    last_used_at: Optional[datetime] = datetime.now()
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "DeviceSetModel":
+        return cls(
+            id=bson_data.get("_id"),
+            hash=bson_data.get("hash", ""),
+            tokens=bson_data.get("tokens", []),
+            created_at=bson_data.get("created_at"),
+            last_used_at=bson_data.get("last_used_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "device_sets"
+
+
+@dataclass
+class DeliveryReceiptModel(BaseModel):
+    notification_id: str
+    account_id: str
+    token: str
+    success: bool
+    attempt: int
+    latency_ms: float
+    sent_at: datetime
+    platform: Optional[str] = None
+    message_id: Optional[str] = None
+    error_code: Optional[str] = None
+    variant_id: Optional[str] = None
+    id: Optional[ObjectId | str] = None
+
+    def to_bson(self) -> dict[str, Any]:
+        # Fields shared by a notification's receipts form the time-series meta, so they are stored once per bucket
+        return {
+            "meta": {
+                "notification_id": self.notification_id,
+                "account_id": self.account_id,
+                "platform": self.platform,
+                "variant_id": self.variant_id,
+            },
+            "sent_at": self.sent_at,
+            "token": self.token,
+            "success": self.success,
+            "attempt": self.attempt,
+            "latency_ms": self.latency_ms,
+            "message_id": self.message_id,
+            "error_code": self.error_code,
+        }
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "DeliveryReceiptModel":
+        meta = bson_data.get("meta", {})
+        return cls(
+            id=bson_data.get("_id"),
+            notification_id=meta.get("notification_id", ""),
+            account_id=meta.get("account_id", ""),
+            platform=meta.get("platform"),
+            variant_id=meta.get("variant_id"),
+            token=bson_data.get("token", ""),
+            success=bson_data.get("success", False),
+            attempt=bson_data.get("attempt", 1),
+            latency_ms=bson_data.get("latency_ms", 0.0),
+            sent_at=bson_data.get("sent_at", datetime.now()),
+            message_id=bson_data.get("message_id"),
+            error_code=bson_data.get("error_code"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "notification_delivery_receipts"
+
+
+@dataclass
+class NotificationEventModel(BaseModel):
+    account_id: str
+    notification_id: str
+    event_type: NotificationEventType
+    occurred_at: datetime
+    received_at: Optional[datetime] = None
+    id: Optional[ObjectId | str] = None
+
+    def to_bson(self) -> dict[str, Any]:
+        # Events of one notification share their meta, so the time-series buckets group them together
+        return {
+            "meta": {"account_id": self.account_id, "notification_id": self.notification_id},
+            "occurred_at": self.occurred_at,
+            "received_at": self.received_at or self.occurred_at,
+            "event_type": self.event_type,
+        }
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "NotificationEventModel":
+        meta = bson_data.get("meta", {})
+        return cls(
+            id=bson_data.get("_id"),
+            account_id=meta.get("account_id", ""),
+            notification_id=meta.get("notification_id", ""),
+            event_type=NotificationEventType(bson_data.get("event_type", NotificationEventType.DELIVERED)),
+            occurred_at=bson_data.get("occurred_at", datetime.now(timezone.utc).replace(tzinfo=None)),
+            received_at=bson_data.get("received_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "notification_events"
+
+
+@dataclass
+class NotificationRollupModel(BaseModel):
+    dimension: NotificationRollupDimension
+    value: str
+    hour: datetime
+    id: Optional[ObjectId | str] = None
+    created: int = 0
+    sent: int = 0
+    failed: int = 0
+    delivered: int = 0
+    clicked: int = 0
+    created_at: Optional[datetime] = datetime.now()
+    updated_at: Optional[datetime] = datetime.now()
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "NotificationRollupModel":
+        return cls(
+            id=bson_data.get("_id"),
+            dimension=NotificationRollupDimension(bson_data.get("dimension", NotificationRollupDimension.TEMPLATE)),
+            value=bson_data.get("value", ""),
+            hour=bson_data.get("hour", datetime.now()),
+            created=bson_data.get("created", 0),
+            sent=bson_data.get("sent", 0),
+            failed=bson_data.get("failed", 0),
+            delivered=bson_data.get("delivered", 0),
+            clicked=bson_data.get("clicked", 0),
+            created_at=bson_data.get("created_at"),
+            updated_at=bson_data.get("updated_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "notification_rollups"
+
+
+@dataclass
+class CampaignModel(BaseModel):
+    account_id: str
+    name: str
+    template_id: str
+    status: CampaignStatus
+    # {"segment": {...} | None, "account_ids": [...] | None}
+    audience: Dict[str, Any]
+    # One entry per audience shard, position i holds shard i's status, snapshot read position and counters
+    shards: List[Dict[str, Any]]
+    id: Optional[ObjectId | str] = None
+    template_data: Optional[Dict[str, Any]] = None
+    data: Optional[Dict[str, Any]] = None
+    image_url: Optional[str] = None
+    run_id: Optional[str] = None
+    completed_at: Optional[datetime] = None
+    created_at: Optional[datetime] = datetime.now()
+    updated_at: Optional[datetime] = datetime.now()
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "CampaignModel":
+        return cls(
+            id=bson_data.get("_id"),
+            account_id=bson_data.get("account_id", ""),
+            name=bson_data.get("name", ""),
+            template_id=bson_data.get("template_id", ""),
+            status=CampaignStatus(bson_data.get("status", CampaignStatus.RUNNING)),
+            audience=bson_data.get("audience", {}),
+            shards=bson_data.get("shards", []),
+            template_data=bson_data.get("template_data"),
+            data=bson_data.get("data"),
+            image_url=bson_data.get("image_url"),
+            run_id=bson_data.get("run_id"),
+            completed_at=bson_data.get("completed_at"),
+            created_at=bson_data.get("created_at"),
+            updated_at=bson_data.get("updated_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "notification_campaigns"
+
+
+@dataclass
+class CampaignAudienceChunkModel(BaseModel):
+    campaign_id: str
+    shard: int
+    # Accounts are grouped by the platforms of their tokens, e.g. "android" or "android,ios"
+    platform: str
+    seq: int
+    # [{"account_id": ..., "tokens": [...], "platforms": [...]}], platforms[i] is the platform of tokens[i]
+    entries: List[Dict[str, Any]]
+    id: Optional[ObjectId | str] = None
+    created_at: Optional[datetime] = datetime.now()
+
+    @classmethod
+    def from_bson(cls, bson_data: dict) -> "CampaignAudienceChunkModel":
+        return cls(
+            id=bson_data.get("_id"),
+            campaign_id=bson_data.get("campaign_id", ""),
+            shard=bson_data.get("shard", 0),
+            platform=bson_data.get("platform", ""),
+            seq=bson_data.get("seq", 0),
+            entries=bson_data.get("entries", []),
+            created_at=bson_data.get("created_at"),
+        )
+
+    @staticmethod
+    def get_collection_name() -> str:
+        return "campaign_audience_chunks"
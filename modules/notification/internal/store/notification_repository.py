@@ -1,11 +1,26 @@
+from pymongo import ASCENDING, DESCENDING, HASHED
 from pymongo.collection import Collection
 from pymongo.errors import OperationFailure
 
 from modules.application.repository import ApplicationRepository
+from modules.config.config_service import ConfigService
 from modules.notification.internal.store.notification_model import (
+    CampaignAudienceChunkModel,
+    CampaignModel,
+    ChangeStreamStateModel,
+    DeliveryReceiptModel,
+    DeviceSetModel,
     DeviceTokenModel,
+    IdempotencyKeyModel,
+    NotificationBucketModel,
+    NotificationDigestModel,
+    NotificationEventModel,
     NotificationModel,
+    NotificationPreferencesModel,
+    NotificationRollupModel,
+    NotificationScheduleBucketModel,
     NotificationTemplateModel,
+    TopicSubscriptionModel,
 )
 from modules.logger.logger import Logger
 
@@ -19,7 +34,6 @@ NOTIFICATION_VALIDATION_SCHEMA = {
             "notification_type",
             "status",
             "priority",
-            "device_tokens",
             "created_at",
             "updated_at",
         ],
@@ -41,6 +55,20 @@ NOTIFICATION_VALIDATION_SCHEMA = {
             "delivered_at": {"bsonType": ["date", "null"]},
             "clicked_at": {"bsonType": ["date", "null"]},
             "error_message": {"bsonType": ["string", "null"]},
+            "collapse_key": {"bsonType": ["string", "null"]},
+            "campaign_id": {"bsonType": ["string", "null"]},
+            "variant_id": {"bsonType": ["string", "null"]},
+            # Tokens are referenced by device set, device_tokens is only left on notifications written before
+            "device_set_hash": {"bsonType": ["string", "null"]},
+            "delivery_results": {
+                "bsonType": ["object", "null"],
+                "properties": {
+                    "sent": {"bsonType": "array", "items": {"bsonType": "int"}},
+                    "failed": {"bsonType": "array", "items": {"bsonType": "int"}},
+                },
+            },
+            "dispatch_claimed_at": {"bsonType": ["date", "null"]},
+            "expire_at": {"bsonType": ["date", "null"]},
             "created_at": {"bsonType": "date"},
             "updated_at": {"bsonType": "date"},
         },
@@ -56,6 +84,19 @@ NOTIFICATION_TEMPLATE_VALIDATION_SCHEMA = {
             "title_template": {"bsonType": "string"},
             "body_template": {"bsonType": "string"},
             "default_data": {"bsonType": ["object", "null"]},
+            "variants": {
+                "bsonType": ["array", "null"],
+                "items": {
+                    "bsonType": "object",
+                    "required": ["id", "title_template", "body_template", "weight"],
+                    "properties": {
+                        "id": {"bsonType": "string"},
+                        "title_template": {"bsonType": "string"},
+                        "body_template": {"bsonType": "string"},
+                        "weight": {"bsonType": "int", "minimum": 1},
+                    },
+                },
+            },
             "created_at": {"bsonType": "date"},
             "updated_at": {"bsonType": "date"},
         },
@@ -77,13 +118,254 @@ DEVICE_TOKEN_VALIDATION_SCHEMA = {
     }
 }
 
+TOPIC_SUBSCRIPTION_VALIDATION_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["topic", "token", "created_at", "updated_at"],
+        "properties": {
+            "topic": {"bsonType": "string"},
+            "token": {"bsonType": "string"},
+            "account_id": {"bsonType": ["string", "null"]},
+            "created_at": {"bsonType": "date"},
+            "updated_at": {"bsonType": "date"},
+        },
+    }
+}
+
+IDEMPOTENCY_KEY_VALIDATION_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["account_id", "key", "status", "expires_at", "created_at", "updated_at"],
+        "properties": {
+            "account_id": {"bsonType": "string"},
+            "key": {"bsonType": "string"},
+            "status": {"bsonType": "string", "enum": ["IN_PROGRESS", "COMPLETED"]},
+            "expires_at": {"bsonType": "date"},
+            "notification_id": {"bsonType": ["string", "null"]},
+            "created_at": {"bsonType": "date"},
+            "updated_at": {"bsonType": "date"},
+        },
+    }
+}
+
+NOTIFICATION_DIGEST_VALIDATION_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["account_id", "collapse_key", "status", "flush_at", "event_count", "created_at", "updated_at"],
+        "properties": {
+            "account_id": {"bsonType": "string"},
+            "collapse_key": {"bsonType": "string"},
+            "status": {"bsonType": "string", "enum": ["PENDING", "FLUSHING"]},
+            "flush_at": {"bsonType": "date"},
+            "event_count": {"bsonType": "int"},
+            "events": {"bsonType": "array", "items": {"bsonType": "object"}},
+            "device_tokens": {"bsonType": "array", "items": {"bsonType": "string"}},
+            "priority": {"bsonType": "string", "enum": ["LOW", "NORMAL", "HIGH"]},
+            "idempotency_keys": {"bsonType": "array", "items": {"bsonType": "string"}},
+            "notification_id": {"bsonType": "string"},
+            "created_at": {"bsonType": "date"},
+            "updated_at": {"bsonType": "date"},
+        },
+    }
+}
+
+NOTIFICATION_PREFERENCES_VALIDATION_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["account_id", "time_zone", "created_at", "updated_at"],
+        "properties": {
+            "account_id": {"bsonType": "string"},
+            "time_zone": {"bsonType": "string"},
+            "quiet_hours_start": {"bsonType": ["string", "null"], "pattern": "^([01][0-9]|2[0-3]):[0-5][0-9]$"},
+            "quiet_hours_end": {"bsonType": ["string", "null"], "pattern": "^([01][0-9]|2[0-3]):[0-5][0-9]$"},
+            "created_at": {"bsonType": "date"},
+            "updated_at": {"bsonType": "date"},
+        },
+    }
+}
+
+NOTIFICATION_SCHEDULE_BUCKET_VALIDATION_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["bucket_start", "time_zone", "status", "notification_ids", "size", "created_at", "updated_at"],
+        "properties": {
+            "bucket_start": {"bsonType": "date"},
+            "time_zone": {"bsonType": "string"},
+            "status": {"bsonType": "string", "enum": ["PENDING", "CLAIMED"]},
+            "notification_ids": {"bsonType": "array", "items": {"bsonType": "string"}},
+            "size": {"bsonType": "int"},
+            "claimed_at": {"bsonType": ["date", "null"]},
+            "created_at": {"bsonType": "date"},
+            "updated_at": {"bsonType": "date"},
+        },
+    }
+}
+
+CHANGE_STREAM_STATE_VALIDATION_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["name", "created_at", "updated_at"],
+        "properties": {
+            "name": {"bsonType": "string"},
+            "resume_token": {"bsonType": ["object", "null"]},
+            "created_at": {"bsonType": "date"},
+            "updated_at": {"bsonType": "date"},
+        },
+    }
+}
+
+NOTIFICATION_BUCKET_VALIDATION_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": [
+            "account_id",
+            "notifications",
+            "count",
+            "unread_count",
+            "start_at",
+            "end_at",
+            "created_at",
+            "updated_at",
+        ],
+        "properties": {
+            "account_id": {"bsonType": "string"},
+            "notifications": {
+                "bsonType": "array",
+                "items": {
+                    "bsonType": "object",
+                    "required": ["_id", "title", "body", "notification_type", "status", "priority"],
+                    "properties": {
+                        "_id": {"bsonType": "objectId"},
+                        "status": {
+                            "bsonType": "string",
+                            "enum": ["PENDING", "SENT", "FAILED", "DELIVERED", "CLICKED"],
+                        },
+                    },
+                },
+            },
+            "count": {"bsonType": "int"},
+            "unread_count": {"bsonType": "int"},
+            "start_at": {"bsonType": "date"},
+            "end_at": {"bsonType": "date"},
+            "created_at": {"bsonType": "date"},
+            "updated_at": {"bsonType": "date"},
+        },
+    }
+}
+
+DEVICE_SET_VALIDATION_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["hash", "tokens", "created_at"],
+        "properties": {
+            "hash": {"bsonType": "string"},
+            "tokens": {"bsonType": "array", "items": {"bsonType": "string"}},
+            "created_at": {"bsonType": "date"},
+            "last_used_at": {"bsonType": "date"},
+        },
+    }
+}
+
+NOTIFICATION_ROLLUP_VALIDATION_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["dimension", "value", "hour", "created_at", "updated_at"],
+        "properties": {
+            "dimension": {"bsonType": "string", "enum": ["TEMPLATE", "CAMPAIGN", "PLATFORM", "VARIANT"]},
+            "value": {"bsonType": "string"},
+            "hour": {"bsonType": "date"},
+            "created": {"bsonType": ["int", "long"]},
+            "sent": {"bsonType": ["int", "long"]},
+            "failed": {"bsonType": ["int", "long"]},
+            "delivered": {"bsonType": ["int", "long"]},
+            "clicked": {"bsonType": ["int", "long"]},
+            "created_at": {"bsonType": "date"},
+            "updated_at": {"bsonType": "date"},
+        },
+    }
+}
+
+CAMPAIGN_VALIDATION_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["account_id", "name", "template_id", "status", "audience", "shards", "created_at", "updated_at"],
+        "properties": {
+            "account_id": {"bsonType": "string"},
+            "name": {"bsonType": "string"},
+            "template_id": {"bsonType": "string"},
+            "status": {
+                "bsonType": "string",
+                "enum": ["SNAPSHOTTING", "RUNNING", "PAUSED", "CANCELLED", "COMPLETED"],
+            },
+            "audience": {
+                "bsonType": "object",
+                "properties": {
+                    "segment": {"bsonType": ["object", "null"]},
+                    "account_ids": {"bsonType": ["array", "null"], "items": {"bsonType": "string"}},
+                },
+            },
+            "shards": {
+                "bsonType": "array",
+                "items": {
+                    "bsonType": "object",
+                    "required": ["shard", "status"],
+                    "properties": {
+                        "shard": {"bsonType": "int"},
+                        "status": {"bsonType": "string", "enum": ["RUNNING", "COMPLETED"]},
+                        "last_platform": {"bsonType": ["string", "null"]},
+                        "last_seq": {"bsonType": ["int", "null"]},
+                    },
+                },
+            },
+            "template_data": {"bsonType": ["object", "null"]},
+            "data": {"bsonType": ["object", "null"]},
+            "image_url": {"bsonType": ["string", "null"]},
+            "run_id": {"bsonType": ["string", "null"]},
+            "completed_at": {"bsonType": ["date", "null"]},
+            "created_at": {"bsonType": "date"},
+            "updated_at": {"bsonType": "date"},
+        },
+    }
+}
+
+CAMPAIGN_AUDIENCE_CHUNK_VALIDATION_SCHEMA = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["campaign_id", "shard", "platform", "seq", "entries", "created_at"],
+        "properties": {
+            "campaign_id": {"bsonType": "string"},
+            "shard": {"bsonType": "int"},
+            "platform": {"bsonType": "string"},
+            "seq": {"bsonType": "int"},
+            "entries": {
+                "bsonType": "array",
+                "items": {
+                    "bsonType": "object",
+                    "required": ["account_id", "tokens"],
+                    "properties": {
+                        "account_id": {"bsonType": "string"},
+                        "tokens": {"bsonType": "array", "items": {"bsonType": "string"}},
+                        "platforms": {"bsonType": "array", "items": {"bsonType": "string"}},
+                    },
+                },
+            },
+            "created_at": {"bsonType": "date"},
+        },
+    }
+}
+
 
 class NotificationRepository(ApplicationRepository):
     collection_name = NotificationModel.get_collection_name()
+    shard_key = {"account_id": HASHED}
 
     @classmethod
     def on_init_collection(cls, collection: Collection) -> bool:
-        collection.create_index("account_id")
+        # Account lookups are served by the hashed and (account_id, created_at) indexes, a plain one is redundant
+        if "account_id_1" in collection.index_information():
+            collection.drop_index("account_id_1")
+        collection.create_index([("account_id", HASHED)])
+        collection.create_index([("account_id", ASCENDING), ("created_at", DESCENDING)])
         collection.create_index("status")
         collection.create_index("notification_type")
         collection.create_index("created_at")
@@ -132,13 +414,21 @@ class NotificationTemplateRepository(ApplicationRepository):
 
 class DeviceTokenRepository(ApplicationRepository):
     collection_name = DeviceTokenModel.get_collection_name()
+    shard_key = {"account_id": HASHED}
 
     @classmethod
     def on_init_collection(cls, collection: Collection) -> bool:
         collection.create_index("account_id")
-        collection.create_index("token", unique=True)
+        collection.create_index([("account_id", HASHED)])
+        # Unique indexes of a sharded collection must be prefixed by the shard key
+        collection.create_index([("account_id", ASCENDING), ("token", ASCENDING)], unique=True)
+        # Left alone when it exists, the sharding migration replaces the old unique token index
+        if "token_1" not in collection.index_information():
+            collection.create_index("token")
         collection.create_index("platform")
         collection.create_index("is_active")
+        # Supports segment resolution (equality, then platform, then activity range)
+        collection.create_index([("is_active", ASCENDING), ("platform", ASCENDING), ("updated_at", ASCENDING)])
 
         add_validation_command = {
             "collMod": cls.collection_name,
@@ -153,4 +443,367 @@ class DeviceTokenRepository(ApplicationRepository):
                 collection.database.create_collection(cls.collection_name, validator=DEVICE_TOKEN_VALIDATION_SCHEMA)
             else:
                 Logger.error(message=f"OperationFailure occurred for collection device_tokens: {e.details}")
-        return True
\ No newline at end of file
+        return True
+
+
+class TopicSubscriptionRepository(ApplicationRepository):
+    collection_name = TopicSubscriptionModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        # Token first so lookups from device_tokens can use the index as well
+        collection.create_index([("token", ASCENDING), ("topic", ASCENDING)], unique=True)
+        collection.create_index("topic")
+        collection.create_index("account_id")
+
+        add_validation_command = {
+            "collMod": cls.collection_name,
+            "validator": TOPIC_SUBSCRIPTION_VALIDATION_SCHEMA,
+            "validationLevel": "strict",
+        }
+
+        try:
+            collection.database.command(add_validation_command)
+        except OperationFailure as e:
+            if e.code == 26:  # NamespaceNotFound MongoDB error code
+                collection.database.create_collection(
+                    cls.collection_name, validator=TOPIC_SUBSCRIPTION_VALIDATION_SCHEMA
+                )
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection topic_subscriptions: {e.details}")
+        return True
+
+
+class IdempotencyKeyRepository(ApplicationRepository):
+    collection_name = IdempotencyKeyModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        collection.create_index([("account_id", ASCENDING), ("key", ASCENDING)], unique=True)
+        collection.create_index("expires_at", expireAfterSeconds=0)
+
+        add_validation_command = {
+            "collMod": cls.collection_name,
+            "validator": IDEMPOTENCY_KEY_VALIDATION_SCHEMA,
+            "validationLevel": "strict",
+        }
+
+        try:
+            collection.database.command(add_validation_command)
+        except OperationFailure as e:
+            if e.code == 26:  # NamespaceNotFound MongoDB error code
+                collection.database.create_collection(cls.collection_name, validator=IDEMPOTENCY_KEY_VALIDATION_SCHEMA)
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+        return True
+
+
+class NotificationDigestRepository(ApplicationRepository):
+    collection_name = NotificationDigestModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        # At most one open digest per account and collapse key, events of a burst all land on it
+        collection.create_index(
+            [("account_id", ASCENDING), ("collapse_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"status": "PENDING"},
+        )
+        collection.create_index([("status", ASCENDING), ("flush_at", ASCENDING)])
+
+        add_validation_command = {
+            "collMod": cls.collection_name,
+            "validator": NOTIFICATION_DIGEST_VALIDATION_SCHEMA,
+            "validationLevel": "strict",
+        }
+
+        try:
+            collection.database.command(add_validation_command)
+        except OperationFailure as e:
+            if e.code == 26:  # NamespaceNotFound MongoDB error code
+                collection.database.create_collection(
+                    cls.collection_name, validator=NOTIFICATION_DIGEST_VALIDATION_SCHEMA
+                )
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+        return True
+
+
+class NotificationPreferencesRepository(ApplicationRepository):
+    collection_name = NotificationPreferencesModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        collection.create_index("account_id", unique=True)
+
+        add_validation_command = {
+            "collMod": cls.collection_name,
+            "validator": NOTIFICATION_PREFERENCES_VALIDATION_SCHEMA,
+            "validationLevel": "strict",
+        }
+
+        try:
+            collection.database.command(add_validation_command)
+        except OperationFailure as e:
+            if e.code == 26:  # NamespaceNotFound MongoDB error code
+                collection.database.create_collection(
+                    cls.collection_name, validator=NOTIFICATION_PREFERENCES_VALIDATION_SCHEMA
+                )
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+        return True
+
+
+class NotificationScheduleBucketRepository(ApplicationRepository):
+    collection_name = NotificationScheduleBucketModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        # The scheduler only ever reads the due slice, oldest first
+        collection.create_index([("status", ASCENDING), ("bucket_start", ASCENDING)])
+        # Appends go to the open chunk of a (bucket_start, time_zone) slice
+        collection.create_index([("bucket_start", ASCENDING), ("time_zone", ASCENDING), ("size", ASCENDING)])
+
+        add_validation_command = {
+            "collMod": cls.collection_name,
+            "validator": NOTIFICATION_SCHEDULE_BUCKET_VALIDATION_SCHEMA,
+            "validationLevel": "strict",
+        }
+
+        try:
+            collection.database.command(add_validation_command)
+        except OperationFailure as e:
+            if e.code == 26:  # NamespaceNotFound MongoDB error code
+                collection.database.create_collection(
+                    cls.collection_name, validator=NOTIFICATION_SCHEDULE_BUCKET_VALIDATION_SCHEMA
+                )
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+        return True
+
+
+class ChangeStreamStateRepository(ApplicationRepository):
+    collection_name = ChangeStreamStateModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        collection.create_index("name", unique=True)
+
+        add_validation_command = {
+            "collMod": cls.collection_name,
+            "validator": CHANGE_STREAM_STATE_VALIDATION_SCHEMA,
+            "validationLevel": "strict",
+        }
+
+        try:
+            collection.database.command(add_validation_command)
+        except OperationFailure as e:
+            if e.code == 26:  # NamespaceNotFound MongoDB error code
+                collection.database.create_collection(
+                    cls.collection_name, validator=CHANGE_STREAM_STATE_VALIDATION_SCHEMA
+                )
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+        return True
+
+
+class NotificationBucketRepository(ApplicationRepository):
+    collection_name = NotificationBucketModel.get_collection_name()
+    shard_key = {"account_id": HASHED}
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        # Inbox pages walk an account's buckets newest first
+        collection.create_index([("account_id", ASCENDING), ("end_at", DESCENDING)])
+        collection.create_index([("account_id", HASHED)])
+        # One multikey entry per notification replaces the per-document indexes for lookups by id
+        collection.create_index("notifications._id")
+        collection.create_index("end_at")
+
+        add_validation_command = {
+            "collMod": cls.collection_name,
+            "validator": NOTIFICATION_BUCKET_VALIDATION_SCHEMA,
+            "validationLevel": "strict",
+        }
+
+        try:
+            collection.database.command(add_validation_command)
+        except OperationFailure as e:
+            if e.code == 26:  # NamespaceNotFound MongoDB error code
+                collection.database.create_collection(
+                    cls.collection_name, validator=NOTIFICATION_BUCKET_VALIDATION_SCHEMA
+                )
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+        return True
+
+
+class DeviceSetRepository(ApplicationRepository):
+    collection_name = DeviceSetModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        collection.create_index("hash", unique=True)
+        # A set no notification has used for longer than notifications are kept is unreferenced and expires
+        retention_seconds = (
+            ConfigService[int].get_value(key="notification.device_sets.retention_days", default=180) * 24 * 60 * 60
+        )
+        try:
+            collection.create_index("last_used_at", expireAfterSeconds=retention_seconds)
+        except OperationFailure as e:
+            if e.code == 85:  # IndexOptionsConflict MongoDB error code
+                # The retention setting changed since the index was built, its TTL is updated in place
+                collection.database.command({
+                    "collMod": cls.collection_name,
+                    "index": {"keyPattern": {"last_used_at": 1}, "expireAfterSeconds": retention_seconds},
+                })
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+
+        add_validation_command = {
+            "collMod": cls.collection_name,
+            "validator": DEVICE_SET_VALIDATION_SCHEMA,
+            "validationLevel": "strict",
+        }
+
+        try:
+            collection.database.command(add_validation_command)
+        except OperationFailure as e:
+            if e.code == 26:  # NamespaceNotFound MongoDB error code
+                collection.database.create_collection(cls.collection_name, validator=DEVICE_SET_VALIDATION_SCHEMA)
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+        return True
+
+
+class DeliveryReceiptRepository(ApplicationRepository):
+    collection_name = DeliveryReceiptModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        # A time-series collection has to be created explicitly, an index or insert would create a plain one
+        if not collection.database.list_collection_names(filter={"name": cls.collection_name}):
+            retention_days = ConfigService[int].get_value(
+                key="notification.delivery_receipts.retention_days", default=30
+            )
+            try:
+                collection.database.create_collection(
+                    cls.collection_name,
+                    timeseries={"timeField": "sent_at", "metaField": "meta", "granularity": "seconds"},
+                    expireAfterSeconds=retention_days * 24 * 60 * 60,
+                )
+            except OperationFailure as e:
+                if e.code != 48:  # NamespaceExists MongoDB error code
+                    Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+
+        collection.create_index([("meta.notification_id", ASCENDING), ("sent_at", ASCENDING)])
+        collection.create_index([("meta.account_id", ASCENDING), ("sent_at", DESCENDING)])
+        # Supports retry and pruning jobs looking for a given failure
+        collection.create_index([("error_code", ASCENDING), ("sent_at", DESCENDING)])
+        return True
+
+
+class NotificationEventRepository(ApplicationRepository):
+    collection_name = NotificationEventModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        # A time-series collection has to be created explicitly, an index or insert would create a plain one
+        if not collection.database.list_collection_names(filter={"name": cls.collection_name}):
+            retention_days = ConfigService[int].get_value(key="notification.events.retention_days", default=90)
+            try:
+                collection.database.create_collection(
+                    cls.collection_name,
+                    timeseries={"timeField": "occurred_at", "metaField": "meta", "granularity": "seconds"},
+                    expireAfterSeconds=retention_days * 24 * 60 * 60,
+                )
+            except OperationFailure as e:
+                if e.code != 48:  # NamespaceExists MongoDB error code
+                    Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+
+        collection.create_index([("meta.account_id", ASCENDING), ("meta.notification_id", ASCENDING)])
+        collection.create_index([("occurred_at", ASCENDING)])
+        # The rollup scans events by when they were received, client-supplied occurred_at can be far in the past
+        collection.create_index([("received_at", ASCENDING)])
+        return True
+
+
+class NotificationRollupRepository(ApplicationRepository):
+    collection_name = NotificationRollupModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        # One counter document per dimension value and hour, funnel reads are a range scan on hour
+        collection.create_index(
+            [("dimension", ASCENDING), ("value", ASCENDING), ("hour", ASCENDING)], unique=True
+        )
+
+        add_validation_command = {
+            "collMod": cls.collection_name,
+            "validator": NOTIFICATION_ROLLUP_VALIDATION_SCHEMA,
+            "validationLevel": "strict",
+        }
+
+        try:
+            collection.database.command(add_validation_command)
+        except OperationFailure as e:
+            if e.code == 26:  # NamespaceNotFound MongoDB error code
+                collection.database.create_collection(
+                    cls.collection_name, validator=NOTIFICATION_ROLLUP_VALIDATION_SCHEMA
+                )
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+        return True
+
+
+class CampaignRepository(ApplicationRepository):
+    collection_name = CampaignModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        collection.create_index([("account_id", ASCENDING), ("created_at", DESCENDING)])
+        collection.create_index("status")
+
+        add_validation_command = {
+            "collMod": cls.collection_name,
+            "validator": CAMPAIGN_VALIDATION_SCHEMA,
+            "validationLevel": "strict",
+        }
+
+        try:
+            collection.database.command(add_validation_command)
+        except OperationFailure as e:
+            if e.code == 26:  # NamespaceNotFound MongoDB error code
+                collection.database.create_collection(cls.collection_name, validator=CAMPAIGN_VALIDATION_SCHEMA)
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+        return True
+
+
+class CampaignAudienceChunkRepository(ApplicationRepository):
+    collection_name = CampaignAudienceChunkModel.get_collection_name()
+
+    @classmethod
+    def on_init_collection(cls, collection: Collection) -> bool:
+        # A shard's snapshot is read in (platform, seq) order, this index serves the whole scan
+        collection.create_index(
+            [("campaign_id", ASCENDING), ("shard", ASCENDING), ("platform", ASCENDING), ("seq", ASCENDING)],
+            unique=True
+        )
+
+        add_validation_command = {
+            "collMod": cls.collection_name,
+            "validator": CAMPAIGN_AUDIENCE_CHUNK_VALIDATION_SCHEMA,
+            "validationLevel": "strict",
+        }
+
+        try:
+            collection.database.command(add_validation_command)
+        except OperationFailure as e:
+            if e.code == 26:  # NamespaceNotFound MongoDB error code
+                collection.database.create_collection(
+                    cls.collection_name, validator=CAMPAIGN_AUDIENCE_CHUNK_VALIDATION_SCHEMA
+                )
+            else:
+                Logger.error(message=f"OperationFailure occurred for collection {cls.collection_name}: {e.details}")
+        return True
@@ -0,0 +1,74 @@
+import zlib
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple
+
+from modules.config.config_service import ConfigService
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.types import NotificationTemplate
+
+
+class TemplateVariantRenderer:
+    """
+    Assigns recipients to a template's weighted A/B variants and renders their content, all in process. The
+    variant is picked by a stable hash of template and account, so an account keeps its variant across sends
+    without a stored assignment. Content is rendered once per variant and distinct values of the variables the
+    variant uses, so a campaign renders a handful of strings however many accounts it reaches.
+    """
+
+    def __init__(self, template: NotificationTemplate, template_data: Dict[str, Any]) -> None:
+        self._template_id = template.id
+        self._template_data = template_data
+        self._variant_ids = [variant.id for variant in template.variants or []]
+        self._cumulative_weights = list(accumulate(variant.weight for variant in template.variants or []))
+
+        # A template without variants renders its own title and body under the variant id None
+        contents = [(None, template.title_template, template.body_template)] + [
+            (variant.id, variant.title_template, variant.body_template) for variant in template.variants or []
+        ]
+        self._contents: Dict[Optional[str], Tuple[str, str, List[str]]] = {
+            variant_id: (
+                title_template,
+                body_template,
+                sorted(
+                    set(NotificationUtil.extract_template_variables(title_template))
+                    | set(NotificationUtil.extract_template_variables(body_template))
+                ),
+            )
+            for variant_id, title_template, body_template in contents
+        }
+
+        self._rendered: Dict[Tuple[Optional[str], Tuple[Optional[str], ...]], Tuple[str, str]] = {}
+        self._max_rendered = ConfigService[int].get_value(
+            key="notification.templates.max_cached_renders", default=10000
+        )
+
+    def assign(self, account_id: str) -> Optional[str]:
+        """Get the variant id of an account, None when the template has no variants"""
+        if not self._variant_ids:
+            return None
+
+        point = zlib.crc32(f"{self._template_id}:{account_id}".encode("utf-8")) % self._cumulative_weights[-1]
+        return self._variant_ids[bisect_right(self._cumulative_weights, point)]
+
+    def render(self, account_id: str, data: Optional[Dict[str, Any]] = None) -> Tuple[Optional[str], str, str]:
+        """Get (variant_id, title, body) for an account, data overrides the template data for this recipient"""
+        variant_id = self.assign(account_id)
+        title_template, body_template, variables = self._contents[variant_id]
+        render_data = {**self._template_data, **data} if data else self._template_data
+
+        # Recipients agreeing on every variable the variant uses get the same content, so they share one render
+        key = (
+            variant_id,
+            tuple(str(render_data[variable]) if variable in render_data else None for variable in variables),
+        )
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            rendered = (
+                NotificationUtil.render_template(title_template, render_data),
+                NotificationUtil.render_template(body_template, render_data),
+            )
+            if len(self._rendered) < self._max_rendered:
+                self._rendered[key] = rendered
+
+        return variant_id, rendered[0], rendered[1]
@@ -0,0 +1,83 @@
+from datetime import datetime
+from typing import List, Set
+
+from pymongo import UpdateOne
+
+from modules.notification.internal.fcm_service import FCM_TOPIC_MANAGEMENT_BATCH_SIZE, FCMService
+from modules.notification.internal.notification_util import NotificationUtil
+from modules.notification.internal.store.notification_repository import TopicSubscriptionRepository
+from modules.notification.types import FCMResponse, SubscribeToTopicParams, UnsubscribeFromTopicParams
+
+
+class TopicSubscriptionManager:
+    @staticmethod
+    def _get_subscribed_tokens(topic: str, tokens: List[str]) -> Set[str]:
+        """Get which of the given tokens are already recorded as subscribed to topic"""
+        subscribed_tokens: Set[str] = set()
+        for i in range(0, len(tokens), FCM_TOPIC_MANAGEMENT_BATCH_SIZE):
+            cursor = TopicSubscriptionRepository.collection().find(
+                {"topic": topic, "token": {"$in": tokens[i:i + FCM_TOPIC_MANAGEMENT_BATCH_SIZE]}},
+                {"_id": 0, "token": 1}
+            )
+            subscribed_tokens.update(subscription["token"] for subscription in cursor)
+        return subscribed_tokens
+
+    @staticmethod
+    def subscribe(params: SubscribeToTopicParams) -> FCMResponse:
+        """Subscribe tokens to a topic, sending only tokens not already subscribed"""
+        NotificationUtil.validate_topic_name(params.topic)
+
+        tokens = list(dict.fromkeys(params.tokens))
+        subscribed_tokens = TopicSubscriptionManager._get_subscribed_tokens(params.topic, tokens)
+        new_tokens = [token for token in tokens if token not in subscribed_tokens]
+
+        if not new_tokens:
+            return FCMResponse(success_count=0, failure_count=0, failed_tokens=[])
+
+        response = FCMService.subscribe_to_topic(
+            SubscribeToTopicParams(tokens=new_tokens, topic=params.topic, account_id=params.account_id)
+        )
+
+        failed_tokens = set(response.failed_tokens)
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {"token": token, "topic": params.topic},
+                {
+                    "$set": {"account_id": params.account_id, "updated_at": now},
+                    "$setOnInsert": {"created_at": now}
+                },
+                upsert=True
+            )
+            for token in new_tokens
+            if token not in failed_tokens
+        ]
+        if operations:
+            TopicSubscriptionRepository.collection().bulk_write(operations, ordered=False)
+
+        return response
+
+    @staticmethod
+    def unsubscribe(params: UnsubscribeFromTopicParams) -> FCMResponse:
+        """Unsubscribe tokens from a topic, sending only tokens recorded as subscribed"""
+        NotificationUtil.validate_topic_name(params.topic)
+
+        tokens = list(dict.fromkeys(params.tokens))
+        subscribed_tokens = TopicSubscriptionManager._get_subscribed_tokens(params.topic, tokens)
+        tokens_to_remove = [token for token in tokens if token in subscribed_tokens]
+
+        if not tokens_to_remove:
+            return FCMResponse(success_count=0, failure_count=0, failed_tokens=[])
+
+        response = FCMService.unsubscribe_from_topic(
+            UnsubscribeFromTopicParams(tokens=tokens_to_remove, topic=params.topic, account_id=params.account_id)
+        )
+
+        failed_tokens = set(response.failed_tokens)
+        removed_tokens = [token for token in tokens_to_remove if token not in failed_tokens]
+        for i in range(0, len(removed_tokens), FCM_TOPIC_MANAGEMENT_BATCH_SIZE):
+            TopicSubscriptionRepository.collection().delete_many(
+                {"topic": params.topic, "token": {"$in": removed_tokens[i:i + FCM_TOPIC_MANAGEMENT_BATCH_SIZE]}}
+            )
+
+        return response
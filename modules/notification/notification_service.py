@@ -1,19 +1,81 @@
-from typing import Dict, List, Optional
+import uuid
+from collections import defaultdict
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
-from modules.notification.errors import NotificationTemplateNotFoundError, NotificationValidationError
+from modules.config.config_service import ConfigService
+from modules.logger.logger import Logger
+from modules.notification.errors import (
+    CampaignStateConflictError,
+    FCMServiceError,
+    NotificationTemplateNotFoundError,
+    NotificationValidationError,
+)
+from modules.notification.internal.campaign_audience_snapshot import CampaignAudienceSnapshot
+from modules.notification.internal.campaign_manager import CAMPAIGN_PROGRESS_COUNTERS, CampaignManager
+from modules.notification.internal.delivery_receipt_manager import DeliveryReceiptManager
+from modules.notification.internal.fcm_service import FCM_SEND_BATCH_SIZE, FCMService
+from modules.notification.internal.idempotency_manager import IdempotencyManager
+from modules.notification.internal.notification_ack_buffer import NotificationAckBuffer
+from modules.notification.internal.notification_archive_reader import NotificationArchiveReader
+from modules.notification.internal.notification_archive_writer import NotificationArchiveWriter
+from modules.notification.internal.notification_change_stream_dispatcher import NotificationChangeStreamDispatcher
+from modules.notification.internal.notification_coalescer import NotificationCoalescer
+from modules.notification.internal.notification_event_manager import NotificationEventManager
 from modules.notification.internal.notification_reader import NotificationReader
+from modules.notification.internal.notification_rollup_manager import NotificationRollupManager
+from modules.notification.internal.notification_schedule_manager import NotificationScheduleManager
+from modules.notification.internal.notification_timing_scheduler import NotificationTimingScheduler
 from modules.notification.internal.notification_util import NotificationUtil
 from modules.notification.internal.notification_writer import NotificationWriter
+from modules.notification.internal.segment_resolver import SegmentResolver
+from modules.notification.internal.template_variant_renderer import TemplateVariantRenderer
+from modules.notification.internal.topic_subscription_manager import TopicSubscriptionManager
 from modules.notification.types import (
+    Campaign,
+    CampaignShardStatus,
+    CampaignStatus,
+    CreateCampaignParams,
     CreateNotificationParams,
     DeviceToken,
+    FCMResponse,
+    IdempotentNotificationResult,
+    LocalTimeScheduleResult,
     Notification,
+    NotificationAck,
+    NotificationAckResult,
+    NotificationArchivePage,
+    NotificationArchiveSearchParams,
+    NotificationCleanupMode,
+    NotificationCleanupParams,
+    NotificationCleanupResult,
+    NotificationData,
+    NotificationDeliveryReceipt,
+    NotificationDigest,
+    NotificationDispatchMode,
+    NotificationEventType,
+    NotificationExportParams,
+    NotificationFunnel,
+    NotificationFunnelParams,
+    NotificationPreferences,
+    NotificationPriority,
     NotificationSearchParams,
+    NotificationSegment,
     NotificationStatus,
+    NotificationStorageEngine,
+    NotificationSummary,
     NotificationTemplate,
+    NotificationTemplateVariant,
     NotificationType,
+    ScheduleLocalTimeNotificationParams,
+    SegmentNotificationResult,
+    SendDeviceNotificationParams,
+    SendNotificationParams,
+    SendSegmentNotificationParams,
+    SubscribeToTopicParams,
+    UnsubscribeFromTopicParams,
 )
-from modules.logger.logger import Logger
 
 
 class NotificationService:
@@ -22,6 +84,361 @@ class NotificationService:
         """Create a new notification"""
         return NotificationWriter.create_notification(params)
 
+    @staticmethod
+    def create_notification_idempotent(
+        params: CreateNotificationParams,
+        idempotency_key: Optional[str] = None
+    ) -> IdempotentNotificationResult:
+        """Create a notification once per idempotency key and, optionally, once per content within a window"""
+        claimed_keys: List[str] = []
+        
+        # A key is only tracked once its claim succeeded, a key another request holds is never released here
+        if idempotency_key:
+            ttl_seconds = ConfigService[int].get_value(key="notification.idempotency.ttl_seconds", default=86400)
+            notification_id = IdempotencyManager.claim(params.account_id, idempotency_key, ttl_seconds)
+            if notification_id:
+                return IdempotentNotificationResult(
+                    notification=NotificationReader.get_notification_by_id(notification_id, params.account_id),
+                    is_replay=True
+                )
+            claimed_keys.append(idempotency_key)
+        
+        try:
+            dedup_window_seconds = ConfigService[int].get_value(key="notification.dedup.window_seconds", default=0)
+            if dedup_window_seconds > 0:
+                content_key = IdempotencyManager.get_content_key(params.account_id, params.title, params.body)
+                notification_id = IdempotencyManager.claim(params.account_id, content_key, dedup_window_seconds)
+                if notification_id:
+                    for key in claimed_keys:
+                        IdempotencyManager.complete(params.account_id, key, notification_id)
+                    return IdempotentNotificationResult(
+                        notification=NotificationReader.get_notification_by_id(notification_id, params.account_id),
+                        is_replay=True
+                    )
+                claimed_keys.append(content_key)
+            
+            notification = NotificationWriter.create_notification(params)
+        except Exception:
+            for key in claimed_keys:
+                IdempotencyManager.release(params.account_id, key)
+            raise
+        
+        for key in claimed_keys:
+            IdempotencyManager.complete(params.account_id, key, notification.id)
+        
+        return IdempotentNotificationResult(notification=notification, is_replay=False)
+
+    @staticmethod
+    def dispatch_notification(
+        notification: Notification, device_tokens: Optional[List[DeviceToken]] = None
+    ) -> Notification:
+        """
+        Send a created notification to its device tokens and record the outcome, device_tokens carries the platforms
+        of the tokens when the caller already has them
+        """
+        if not ConfigService[bool].get_value(key="notification.fcm.enabled", default=False):
+            # Until FCM is configured sends are only logged
+            Logger.info(
+                message=f"MOCK: Would send notification '{notification.title}' to tokens: {notification.device_tokens}"
+            )
+            return NotificationWriter.mark_notification_as_sent(notification.id, notification.account_id)
+        
+        # Otherwise platforms come from the account's cached devices, so no cross-account token lookup is needed
+        if device_tokens is None:
+            device_tokens = NotificationReader.get_device_tokens_by_account_id(notification.account_id)
+        platforms = {device_token.token: device_token.platform for device_token in device_tokens}
+        
+        try:
+            response = FCMService.send_to_devices(SendDeviceNotificationParams(
+                recipients=[
+                    DeviceToken(token=token, platform=platforms.get(token, "")) for token in notification.device_tokens
+                ],
+                notification=NotificationData(
+                    title=notification.title,
+                    body=notification.body,
+                    image_url=notification.image_url,
+                    data=notification.data
+                ),
+                priority=notification.priority,
+                collapse_key=notification.collapse_key
+            ))
+        except FCMServiceError as e:
+            return NotificationWriter.mark_notification_as_failed(notification.id, str(e), notification.account_id)
+        
+        NotificationService._record_delivery_receipts(notification, response)
+        NotificationRollupManager.record_platform_outcomes(
+            platforms, notification.device_tokens, response.failed_tokens
+        )
+        
+        delivery_results = NotificationUtil.build_delivery_results(notification.device_tokens, response.failed_tokens)
+        if response.success_count == 0:
+            return NotificationWriter.mark_notification_as_failed(
+                notification.id,
+                f"Delivery failed for all {response.failure_count} device tokens",
+                notification.account_id,
+                delivery_results
+            )
+        
+        return NotificationWriter.mark_notification_as_sent(notification.id, notification.account_id, delivery_results)
+
+    @staticmethod
+    def _record_delivery_receipts(notification: Notification, response: FCMResponse) -> None:
+        """Keep per-token outcomes of a send, a failure here never fails the send itself"""
+        if not ConfigService[bool].get_value(key="notification.delivery_receipts.enabled", default=True):
+            return
+        
+        try:
+            DeliveryReceiptManager.record(notification, response.receipts or [])
+        except Exception as e:
+            Logger.error(message=f"Failed to record delivery receipts for notification {notification.id}: {str(e)}")
+
+    @staticmethod
+    def get_delivery_receipts(notification_id: str, account_id: str) -> List[NotificationDeliveryReceipt]:
+        """Get the per-token delivery outcomes of an account's notification"""
+        # Raises when the notification does not belong to the account
+        NotificationReader.get_notification_by_id(notification_id, account_id)
+        return DeliveryReceiptManager.get_receipts(notification_id, account_id)
+
+    @staticmethod
+    def get_failed_delivery_receipts(
+        since: datetime, error_codes: Optional[List[str]] = None, limit: int = 1000
+    ) -> List[NotificationDeliveryReceipt]:
+        """Get recent failed per-token deliveries, e.g. for retry or token pruning jobs"""
+        return DeliveryReceiptManager.get_failed_receipts(since, error_codes, limit)
+
+    @staticmethod
+    def get_notification_funnel(params: NotificationFunnelParams) -> NotificationFunnel:
+        """Get the hourly created, sent, failed, delivered and clicked counts of a template, campaign or platform"""
+        return NotificationRollupManager.get_funnel(params)
+
+    @staticmethod
+    def dispatch_created_notification(
+        notification: Notification, device_tokens: Optional[List[DeviceToken]] = None
+    ) -> Notification:
+        """Send a newly created notification now, or leave it to the change stream dispatcher when one is used"""
+        # Bucketed notifications are pushed into existing documents, which the dispatcher's stream never sees
+        if (
+            NotificationUtil.get_dispatch_mode() == NotificationDispatchMode.CHANGE_STREAM
+            and NotificationUtil.get_storage_engine() == NotificationStorageEngine.DOCUMENT
+        ):
+            return notification
+        
+        return NotificationService.dispatch_notification(notification, device_tokens)
+
+    @staticmethod
+    def dispatch_pending_notification(
+        notification_id: str, account_id: Optional[str] = None, device_tokens: Optional[List[DeviceToken]] = None
+    ) -> Optional[Notification]:
+        """Claim a pending notification and send it, None when it was already sent or is being sent elsewhere"""
+        notification = NotificationWriter.claim_notification_for_dispatch(notification_id, account_id)
+        if notification is None:
+            return None
+        
+        return NotificationService.dispatch_notification(notification, device_tokens)
+
+    @staticmethod
+    def create_change_stream_dispatcher() -> NotificationChangeStreamDispatcher:
+        """Create the long-running dispatcher that sends notifications as they are inserted"""
+        return NotificationChangeStreamDispatcher(dispatch=NotificationService.dispatch_pending_notification)
+
+    @staticmethod
+    def coalesce_notification(
+        params: CreateNotificationParams,
+        idempotency_key: Optional[str] = None
+    ) -> Optional[NotificationDigest]:
+        """
+        Hold a notification with a collapse key in its pending digest, returns None when coalescing is off or the
+        idempotency key already belongs to a flushed digest, whose notification create_notification_idempotent replays
+        """
+        if not params.collapse_key or params.scheduled_at or NotificationCoalescer.get_window_seconds() <= 0:
+            return None
+        
+        # The key is claimed before the event joins the digest, so a retried request is never merged twice
+        if idempotency_key:
+            ttl_seconds = ConfigService[int].get_value(key="notification.idempotency.ttl_seconds", default=86400)
+            if IdempotencyManager.claim(params.account_id, idempotency_key, ttl_seconds):
+                return None
+        
+        try:
+            return NotificationCoalescer.add(params, idempotency_key)
+        except Exception:
+            if idempotency_key:
+                IdempotencyManager.release(params.account_id, idempotency_key)
+            raise
+
+    @staticmethod
+    def flush_due_digests() -> List[Notification]:
+        """Turn every digest whose window has closed into one notification and send it"""
+        limit = ConfigService[int].get_value(key="notification.coalescing.flush_limit", default=1000)
+        notifications = []
+        
+        for digest in NotificationCoalescer.claim_due_digests(limit):
+            try:
+                # A digest re-claimed after a failed flush already has its notification, which is sent at most once
+                if digest.notification_id:
+                    for key in digest.idempotency_keys or []:
+                        IdempotencyManager.complete(digest.account_id, key, digest.notification_id)
+                    notification = NotificationService.dispatch_pending_notification(
+                        digest.notification_id, digest.account_id
+                    )
+                else:
+                    notification = NotificationWriter.create_notification(
+                        NotificationCoalescer.build_create_params(digest)
+                    )
+                    NotificationCoalescer.record_notification(digest, notification.id)
+                    for key in digest.idempotency_keys or []:
+                        IdempotencyManager.complete(digest.account_id, key, notification.id)
+                    notification = NotificationService.dispatch_created_notification(notification)
+                
+                if notification:
+                    notifications.append(notification)
+                NotificationCoalescer.delete(digest)
+            except Exception as e:
+                # The digest stays claimed and is picked up again once its claim goes stale
+                Logger.error(message=f"Failed to flush notification digest {digest.id}: {str(e)}")
+        
+        return notifications
+
+    @staticmethod
+    def get_notification_preferences(account_id: str) -> NotificationPreferences:
+        """Get the time zone and quiet hours of an account"""
+        return NotificationReader.get_notification_preferences(account_id)
+
+    @staticmethod
+    def update_notification_preferences(preferences: NotificationPreferences) -> NotificationPreferences:
+        """Set the time zone and quiet hours of an account"""
+        NotificationUtil.get_time_zone(preferences.time_zone)
+        
+        if bool(preferences.quiet_hours_start) != bool(preferences.quiet_hours_end):
+            raise NotificationValidationError("Quiet hours need both a start and an end")
+        if preferences.quiet_hours_start and preferences.quiet_hours_end:
+            NotificationUtil.parse_local_time(preferences.quiet_hours_start)
+            NotificationUtil.parse_local_time(preferences.quiet_hours_end)
+        
+        return NotificationWriter.update_notification_preferences(preferences)
+
+    @staticmethod
+    def schedule_local_time_notification(params: ScheduleLocalTimeNotificationParams) -> LocalTimeScheduleResult:
+        """Schedule a notification for the next occurrence of a wall clock time in each recipient's time zone"""
+        NotificationUtil.validate_notification_data(params.title, params.body)
+        NotificationUtil.parse_local_time(params.local_time)
+        
+        batch_size = ConfigService[int].get_value(key="notification.schedule.create_batch_size", default=1000)
+        account_ids = list(dict.fromkeys(params.account_ids))
+        now = datetime.now(timezone.utc)
+        send_times: Dict[str, datetime] = {}
+        skipped_account_ids: List[str] = []
+        scheduled_count = 0
+        
+        for i in range(0, len(account_ids), batch_size):
+            batch_account_ids = account_ids[i:i + batch_size]
+            preferences = NotificationReader.get_notification_preferences_by_account_ids(batch_account_ids)
+            device_tokens_by_account_id = NotificationReader.get_active_device_tokens_by_account_ids(batch_account_ids)
+            
+            # Recipients are expanded into one send time per time zone, not per account
+            accounts_by_time_zone: Dict[str, List[str]] = defaultdict(list)
+            for account_id, account_preferences in preferences.items():
+                accounts_by_time_zone[account_preferences.time_zone].append(account_id)
+            
+            scheduled_params: List[Tuple[CreateNotificationParams, str]] = []
+            for time_zone, time_zone_account_ids in accounts_by_time_zone.items():
+                if time_zone not in send_times:
+                    send_times[time_zone] = NotificationUtil.get_next_local_occurrence(
+                        time_zone, params.local_time, now
+                    )
+                
+                for account_id in time_zone_account_ids:
+                    device_tokens = device_tokens_by_account_id[account_id]
+                    if not device_tokens:
+                        skipped_account_ids.append(account_id)
+                        continue
+                    
+                    scheduled_params.append((
+                        CreateNotificationParams(
+                            account_id=account_id,
+                            title=params.title,
+                            body=params.body,
+                            notification_type=NotificationType.PUSH,
+                            device_tokens=device_tokens,
+                            priority=params.priority,
+                            data=params.data,
+                            image_url=params.image_url,
+                            scheduled_at=send_times[time_zone].isoformat()
+                        ),
+                        time_zone
+                    ))
+            
+            scheduled_count += NotificationWriter.create_scheduled_notifications(scheduled_params)
+        
+        Logger.info(
+            message=f"Scheduled '{params.title}' at {params.local_time} local time for {scheduled_count} accounts "
+            f"across {len(send_times)} time zones"
+        )
+        
+        return LocalTimeScheduleResult(
+            scheduled_count=scheduled_count,
+            skipped_account_ids=skipped_account_ids,
+            time_zone_count=len(send_times)
+        )
+
+    @staticmethod
+    def dispatch_scheduled_notification(
+        notification_id: str,
+        account_id: Optional[str] = None,
+        preferences: Optional[NotificationPreferences] = None
+    ) -> Optional[Notification]:
+        """Claim a due scheduled notification and send it, or defer it past the recipient's quiet hours"""
+        notification = NotificationWriter.claim_notification_for_dispatch(notification_id, account_id)
+        if notification is None:
+            # Already sent, cancelled or being sent by another dispatcher
+            return None
+        
+        # Quiet hours are applied at claim time so preference changes after scheduling are honoured
+        preferences = preferences or NotificationReader.get_notification_preferences(notification.account_id)
+        quiet_hours_end = NotificationUtil.get_quiet_hours_end(preferences, datetime.now(timezone.utc))
+        if quiet_hours_end and notification.priority != NotificationPriority.HIGH:
+            NotificationWriter.defer_scheduled_notification(
+                notification.id, quiet_hours_end, preferences.time_zone, notification.account_id
+            )
+            return None
+        
+        return NotificationService.dispatch_notification(notification)
+
+    @staticmethod
+    def process_scheduled_notifications() -> List[Notification]:
+        """Send the notifications of every due schedule slice, deferring recipients that are in quiet hours"""
+        limit = ConfigService[int].get_value(key="notification.schedule.claim_limit", default=1000)
+        processed_notifications = []
+        
+        for bucket in NotificationScheduleManager.claim_due_buckets(limit):
+            notifications = NotificationReader.get_pending_notifications_by_ids(bucket.notification_ids)
+            preferences = NotificationReader.get_notification_preferences_by_account_ids(
+                list({notification.account_id for notification in notifications})
+            )
+            has_failures = False
+            
+            for notification in notifications:
+                try:
+                    processed_notification = NotificationService.dispatch_scheduled_notification(
+                        notification.id, notification.account_id, preferences[notification.account_id]
+                    )
+                    if processed_notification:
+                        processed_notifications.append(processed_notification)
+                except Exception as e:
+                    has_failures = True
+                    Logger.error(message=f"Failed to process scheduled notification {notification.id}: {str(e)}")
+            
+            # A slice with failures stays claimed and is retried once its claim goes stale, sent ones are skipped
+            if not has_failures:
+                NotificationScheduleManager.delete(bucket)
+        
+        return processed_notifications
+
+    @staticmethod
+    def create_timing_scheduler() -> NotificationTimingScheduler:
+        """Create the long-running scheduler that fires scheduled notifications at their exact time"""
+        return NotificationTimingScheduler(dispatch=NotificationService.dispatch_scheduled_notification)
+
     @staticmethod
     def send_notification_to_account(
         account_id: str,
@@ -55,25 +472,44 @@ class NotificationService:
             Logger.info(message=f"Created notification {notification.id} for account {account_id}")
             
             # Mark as sent for now
-            NotificationWriter.mark_notification_as_sent(notification.id)
+            NotificationWriter.mark_notification_as_sent(notification.id, account_id)
             
             return notification
             
         except Exception as e:
             # Mark notification as failed
-            NotificationWriter.mark_notification_as_failed(notification.id, str(e))
+            NotificationWriter.mark_notification_as_failed(notification.id, str(e), account_id)
             raise
 
     @staticmethod
-    def get_notification_by_id(notification_id: str) -> Notification:
+    def get_notification_by_id(notification_id: str, account_id: Optional[str] = None) -> Notification:
         """Get notification by ID"""
-        return NotificationReader.get_notification_by_id(notification_id)
+        return NotificationReader.get_notification_by_id(notification_id, account_id)
 
     @staticmethod
     def get_notifications(params: NotificationSearchParams) -> List[Notification]:
         """Get notifications with filtering and pagination"""
         return NotificationReader.get_notifications(params)
 
+    @staticmethod
+    def get_notification_summaries(params: NotificationSearchParams) -> List[NotificationSummary]:
+        """Get inbox notification summaries with filtering and pagination"""
+        return NotificationReader.get_notification_summaries(params)
+
+    @staticmethod
+    def export_notifications(
+        params: NotificationExportParams,
+        batch_size: Optional[int] = None
+    ) -> Iterator[Notification]:
+        """Stream all matching notifications of an account for export"""
+        default_batch_size = ConfigService[int].get_value(key="notification.export.batch_size", default=1000)
+        max_batch_size = ConfigService[int].get_value(key="notification.export.max_batch_size", default=5000)
+        if batch_size is not None and batch_size < 1:
+            raise NotificationValidationError("batch_size must be a positive integer")
+        effective_batch_size = min(batch_size if batch_size is not None else default_batch_size, max_batch_size)
+        
+        return NotificationReader.iter_notifications_for_export(params, effective_batch_size)
+
     @staticmethod
     def get_notifications_for_account(
         account_id: str, 
@@ -84,24 +520,103 @@ class NotificationService:
         return NotificationReader.get_notifications_by_account_id(account_id, limit, offset)
 
     @staticmethod
-    def mark_notification_as_sent(notification_id: str) -> Notification:
+    def mark_notification_as_sent(notification_id: str, account_id: Optional[str] = None) -> Notification:
         """Mark notification as sent"""
-        return NotificationWriter.mark_notification_as_sent(notification_id)
+        return NotificationWriter.mark_notification_as_sent(notification_id, account_id)
 
     @staticmethod
-    def mark_notification_as_failed(notification_id: str, error_message: str) -> Notification:
+    def mark_notification_as_failed(
+        notification_id: str, error_message: str, account_id: Optional[str] = None
+    ) -> Notification:
         """Mark notification as failed"""
-        return NotificationWriter.mark_notification_as_failed(notification_id, error_message)
+        return NotificationWriter.mark_notification_as_failed(notification_id, error_message, account_id)
+
+    @staticmethod
+    def _record_notification_event(
+        notification_id: str, account_id: str, event_type: NotificationEventType
+    ) -> Notification:
+        """Append an event for a notification the account owns, returns the notification as the event leaves it"""
+        notification = NotificationReader.get_notification_by_id(notification_id, account_id)
+        event = NotificationEventManager.append(account_id, notification_id, event_type)
+        return NotificationEventManager.apply_event(notification, event)
 
     @staticmethod
-    def mark_notification_as_delivered(notification_id: str) -> Notification:
+    def mark_notification_as_delivered(notification_id: str, account_id: Optional[str] = None) -> Notification:
         """Mark notification as delivered"""
-        return NotificationWriter.mark_notification_as_delivered(notification_id)
+        if account_id and NotificationEventManager.is_enabled():
+            return NotificationService._record_notification_event(
+                notification_id, account_id, NotificationEventType.DELIVERED
+            )
+        
+        return NotificationWriter.mark_notification_as_delivered(notification_id, account_id)
+
+    @staticmethod
+    def mark_notification_as_opened(notification_id: str, account_id: str) -> Notification:
+        """Record that the account opened a notification, which also implies it was delivered"""
+        if NotificationEventManager.is_enabled():
+            return NotificationService._record_notification_event(
+                notification_id, account_id, NotificationEventType.OPENED
+            )
+        
+        # Without the event path the open is stored as the delivery it implies, a clicked notification is kept as is
+        NotificationWriter.apply_event_statuses(
+            [(account_id, notification_id, NotificationStatus.DELIVERED, {"delivered_at": NotificationUtil.utc_now()})]
+        )
+        return NotificationReader.get_notification_by_id(notification_id, account_id)
 
     @staticmethod
-    def mark_notification_as_clicked(notification_id: str) -> Notification:
+    def mark_notification_as_clicked(notification_id: str, account_id: Optional[str] = None) -> Notification:
         """Mark notification as clicked"""
-        return NotificationWriter.mark_notification_as_clicked(notification_id)
+        if account_id and NotificationEventManager.is_enabled():
+            return NotificationService._record_notification_event(
+                notification_id, account_id, NotificationEventType.CLICKED
+            )
+        
+        return NotificationWriter.mark_notification_as_clicked(notification_id, account_id)
+
+    @staticmethod
+    def record_notification_acks(account_id: str, acks: List[NotificationAck]) -> NotificationAckResult:
+        """Store a batch of client acks through the shared group commit, returns once they are written"""
+        max_acks = ConfigService[int].get_value(key="notification.acks.max_per_request", default=500)
+        if len(acks) > max_acks:
+            raise NotificationValidationError(f"At most {max_acks} acks can be sent in one request")
+        
+        events = NotificationEventManager.build_ack_events(account_id, acks)
+        
+        if events:
+            NotificationAckBuffer.add(events)
+        
+        return NotificationAckResult(accepted_count=len(events))
+
+    @staticmethod
+    def rollup_notification_events() -> int:
+        """Fold the status implied by recent notification events into the notifications, returns the number updated"""
+        if not NotificationEventManager.is_enabled():
+            return 0
+        
+        # Overlapping windows are harmless since a rollup never moves a notification backwards
+        lookback_seconds = ConfigService[int].get_value(key="notification.events.rollup_lookback_seconds", default=300)
+        batch_size = ConfigService[int].get_value(key="notification.events.rollup_batch_size", default=1000)
+        since = NotificationUtil.utc_now() - timedelta(seconds=lookback_seconds)
+        
+        updated_count = 0
+        rollups = []
+        for account_id, notification_id, event_times in NotificationEventManager.iter_event_times_since(since):
+            derived = NotificationUtil.derive_status_from_events(event_times)
+            if derived is None:
+                continue
+            
+            status, fields = derived
+            rollups.append((account_id, notification_id, status, fields))
+            if len(rollups) >= batch_size:
+                updated_count += NotificationWriter.apply_event_statuses(rollups)
+                rollups = []
+        
+        if rollups:
+            updated_count += NotificationWriter.apply_event_statuses(rollups)
+        
+        Logger.info(message=f"Rolled up notification events into {updated_count} notifications")
+        return updated_count
 
     @staticmethod
     def register_device_token(account_id: str, token: str, platform: str) -> DeviceToken:
@@ -117,9 +632,101 @@ class NotificationService:
         return NotificationWriter.register_device_token(account_id, token, platform)
 
     @staticmethod
-    def deactivate_device_token(token: str) -> bool:
+    def deactivate_device_token(token: str, account_id: Optional[str] = None) -> bool:
         """Deactivate a device token"""
-        return NotificationWriter.deactivate_device_token(token)
+        return NotificationWriter.deactivate_device_token(token, account_id)
+
+    @staticmethod
+    def get_active_device_tokens_for_account(account_id: str) -> List[str]:
+        """Get active device token strings for an account"""
+        return NotificationReader.get_active_device_tokens_by_account_id(account_id)
+
+    @staticmethod
+    def subscribe_to_topic(params: SubscribeToTopicParams) -> FCMResponse:
+        """Subscribe device tokens to a topic"""
+        return TopicSubscriptionManager.subscribe(params)
+
+    @staticmethod
+    def unsubscribe_from_topic(params: UnsubscribeFromTopicParams) -> FCMResponse:
+        """Unsubscribe device tokens from a topic"""
+        return TopicSubscriptionManager.unsubscribe(params)
+
+    @staticmethod
+    def count_segment_audience(segment: NotificationSegment) -> int:
+        """Count the device tokens matching a segment"""
+        return SegmentResolver.count_audience(segment)
+
+    @staticmethod
+    def is_admin_account(account_id: str) -> bool:
+        """Whether an account may send notifications to accounts other than its own"""
+        return account_id in ConfigService[List[str]].get_value(key="notification.admin_account_ids", default=[])
+
+    @staticmethod
+    def send_segment_notification(params: SendSegmentNotificationParams) -> SegmentNotificationResult:
+        """Count a segment's audience and start sending to it in the background, unless dry_run is set"""
+        NotificationUtil.validate_notification_data(params.notification.title, params.notification.body)
+        
+        audience_size = SegmentResolver.count_audience(params.segment)
+        Logger.info(message=f"Segment notification '{params.notification.title}' audience size: {audience_size}")
+        
+        if params.dry_run or audience_size == 0:
+            return SegmentNotificationResult(
+                audience_size=audience_size, success_count=0, failure_count=0, batch_count=0
+            )
+        
+        # Import here to avoid circular imports
+        from modules.application.application_service import ApplicationService
+        from modules.notification.workers.notification_worker import NotificationSegmentWorker
+        
+        worker_id = ApplicationService.run_worker_immediately(
+            cls=NotificationSegmentWorker,
+            arguments=(asdict(params.segment), asdict(params.notification))
+        )
+        
+        return SegmentNotificationResult(
+            audience_size=audience_size, success_count=0, failure_count=0, batch_count=0, worker_id=worker_id
+        )
+
+    @staticmethod
+    def fan_out_segment_notification(
+        segment: NotificationSegment, notification: NotificationData
+    ) -> SegmentNotificationResult:
+        """Send a notification to every device token matching a segment, streaming the audience in batches"""
+        audience_size = SegmentResolver.count_audience(segment)
+        
+        batch_size = min(
+            ConfigService[int].get_value(key="notification.segment.batch_size", default=FCM_SEND_BATCH_SIZE),
+            FCM_SEND_BATCH_SIZE
+        )
+        success_count = 0
+        failure_count = 0
+        batch_count = 0
+        
+        for device_tokens in SegmentResolver.iter_audience_batches(segment, batch_size):
+            batch_count += 1
+            try:
+                response = FCMService.send_to_devices(SendDeviceNotificationParams(
+                    recipients=device_tokens,
+                    notification=notification
+                ))
+                success_count += response.success_count
+                failure_count += response.failure_count
+            except FCMServiceError as e:
+                # Keep going so one failed batch does not abort the whole fan-out
+                Logger.error(message=f"Segment notification batch {batch_count} failed: {e.message}")
+                failure_count += len(device_tokens)
+        
+        Logger.info(
+            message=f"Segment notification sent to {audience_size} devices in {batch_count} batches. "
+            f"Success: {success_count}, Failed: {failure_count}"
+        )
+        
+        return SegmentNotificationResult(
+            audience_size=audience_size,
+            success_count=success_count,
+            failure_count=failure_count,
+            batch_count=batch_count
+        )
 
     @staticmethod
     def get_device_tokens_for_account(account_id: str, platform: Optional[str] = None) -> List[DeviceToken]:
@@ -131,10 +738,13 @@ class NotificationService:
         name: str,
         title_template: str,
         body_template: str,
-        default_data: Optional[Dict] = None
+        default_data: Optional[Dict] = None,
+        variants: Optional[List[NotificationTemplateVariant]] = None
     ) -> NotificationTemplate:
-        """Create a new notification template"""
-        return NotificationWriter.create_notification_template(name, title_template, body_template, default_data)
+        """Create a new notification template, optionally with weighted A/B variants of its title and body"""
+        return NotificationWriter.create_notification_template(
+            name, title_template, body_template, default_data, variants
+        )
 
     @staticmethod
     def get_notification_template_by_id(template_id: str) -> NotificationTemplate:
@@ -157,11 +767,12 @@ class NotificationService:
         name: Optional[str] = None,
         title_template: Optional[str] = None,
         body_template: Optional[str] = None,
-        default_data: Optional[Dict] = None
+        default_data: Optional[Dict] = None,
+        variants: Optional[List[NotificationTemplateVariant]] = None
     ) -> NotificationTemplate:
         """Update notification template"""
         return NotificationWriter.update_notification_template(
-            template_id, name, title_template, body_template, default_data
+            template_id, name, title_template, body_template, default_data, variants
         )
 
     @staticmethod
@@ -180,11 +791,268 @@ class NotificationService:
         return NotificationReader.get_unread_notification_count_by_account_id(account_id)
 
     @staticmethod
-    def cleanup_old_notifications(days_old: int = 90) -> int:
-        """Clean up old notifications"""
-        deleted_count = NotificationWriter.cleanup_old_notifications(days_old)
-        Logger.info(message=f"Cleaned up {deleted_count} old notifications")
-        return deleted_count
+    def _get_cleanup_params(days_old: Optional[int] = None) -> NotificationCleanupParams:
+        """Build cleanup parameters from configuration"""
+        return NotificationCleanupParams(
+            days_old=(
+                days_old
+                if days_old is not None
+                else ConfigService[int].get_value(key="notification.cleanup.days_old", default=90)
+            ),
+            batch_size=ConfigService[int].get_value(key="notification.cleanup.batch_size", default=1000),
+            pause_seconds=ConfigService[float].get_value(key="notification.cleanup.pause_seconds", default=0.1),
+            max_documents=(
+                ConfigService[int].get_value(key="notification.cleanup.max_documents_per_run")
+                if ConfigService.has_value("notification.cleanup.max_documents_per_run")
+                else None
+            ),
+        )
+
+    @staticmethod
+    def cleanup_old_notifications(
+        days_old: Optional[int] = None,
+        on_progress: Optional[Callable[[NotificationCleanupResult], None]] = None
+    ) -> NotificationCleanupResult:
+        """Clean up old notifications using the configured cleanup mode"""
+        mode = NotificationUtil.get_cleanup_mode()
+        
+        if mode == NotificationCleanupMode.TTL:
+            # MongoDB expires terminal notifications natively through the TTL index
+            Logger.info(message="Notification cleanup is handled by the TTL index, skipping chunked delete")
+            return NotificationCleanupResult(mode=mode, deleted_count=0, batch_count=0, elapsed_seconds=0)
+        
+        params = NotificationService._get_cleanup_params(days_old)
+        
+        if mode == NotificationCleanupMode.ARCHIVE:
+            result = NotificationArchiveWriter.archive_old_notifications(params, on_progress)
+            Logger.info(message=f"Archived {result.deleted_count} old notifications in {result.batch_count} batches")
+            return result
+        
+        result = NotificationWriter.cleanup_old_notifications(params, on_progress)
+        Logger.info(message=f"Cleaned up {result.deleted_count} old notifications in {result.batch_count} batches")
+        return result
+
+    @staticmethod
+    def get_archived_notifications(params: NotificationArchiveSearchParams) -> NotificationArchivePage:
+        """Get a page of an account's archived notifications within a date range, next_cursor resumes after it"""
+        return NotificationArchiveReader.get_archived_notifications(params)
+
+    @staticmethod
+    def migrate_cleanup_mode(mode: NotificationCleanupMode, days_old: Optional[int] = None) -> int:
+        """Switch existing notifications between chunked and TTL cleanup, returns the number of documents updated"""
+        params = NotificationService._get_cleanup_params(days_old)
+        
+        if mode == NotificationCleanupMode.TTL:
+            updated_count = NotificationWriter.enable_ttl_cleanup(
+                params.days_old, params.batch_size, params.pause_seconds
+            )
+        else:
+            updated_count = NotificationWriter.disable_ttl_cleanup(params.batch_size, params.pause_seconds)
+        
+        Logger.info(message=f"Migrated notification cleanup to {mode} mode, updated {updated_count} notifications")
+        return updated_count
+
+    @staticmethod
+    def migrate_device_sets() -> int:
+        """Move device tokens stored inline on existing notifications into device sets, returns the number migrated"""
+        params = NotificationService._get_cleanup_params()
+        
+        updated_count = NotificationWriter.migrate_device_tokens_to_device_sets(params.batch_size, params.pause_seconds)
+        
+        Logger.info(message=f"Migrated device tokens of {updated_count} notifications to device sets")
+        return updated_count
+
+    @staticmethod
+    def create_campaign(params: CreateCampaignParams) -> Campaign:
+        """Store a campaign and start snapshotting its audience, sending begins once the snapshot is written"""
+        template = NotificationReader.get_template_by_id(params.template_id)
+        template_data = {**(template.default_data or {}), **(params.template_data or {})}
+        NotificationUtil.validate_template_data(template.title_template, template_data)
+        NotificationUtil.validate_template_data(template.body_template, template_data)
+        for variant in template.variants or []:
+            NotificationUtil.validate_template_data(variant.title_template, template_data)
+            NotificationUtil.validate_template_data(variant.body_template, template_data)
+        
+        if not params.audience.segment and not params.audience.account_ids:
+            raise NotificationValidationError("A campaign audience needs a segment or account_ids")
+        
+        campaign_bson = CampaignManager.create(params, run_id=uuid.uuid4().hex)
+        
+        # Import here to avoid circular imports
+        from modules.application.application_service import ApplicationService
+        from modules.notification.workers.notification_worker import NotificationCampaignSnapshotWorker
+        
+        ApplicationService.run_worker_immediately(
+            cls=NotificationCampaignSnapshotWorker,
+            arguments=(str(campaign_bson["_id"]), campaign_bson["run_id"])
+        )
+        
+        Logger.info(message=f"Started the audience snapshot of campaign {campaign_bson['_id']}")
+        return NotificationUtil.convert_campaign_bson_to_campaign(campaign_bson)
+
+    @staticmethod
+    def snapshot_campaign_audience(campaign_id: str, run_id: str) -> None:
+        """Resolve a campaign's audience once into its snapshot, then start a worker per audience shard"""
+        campaign_bson = CampaignManager.get(campaign_id)
+        if campaign_bson.get("run_id") != run_id or campaign_bson["status"] != CampaignStatus.SNAPSHOTTING:
+            return
+        
+        shard_stats = CampaignAudienceSnapshot.build(campaign_bson)
+        campaign_bson = CampaignManager.start(campaign_id, run_id, shard_stats)
+        if campaign_bson is None:
+            # Cancelled while the snapshot was written, the cancel could not see these chunks yet
+            CampaignAudienceSnapshot.delete(campaign_id)
+            return
+        
+        NotificationService._start_campaign_shards(campaign_bson)
+        Logger.info(
+            message=f"Campaign {campaign_id} snapshotted {sum(stats['audience_size'] for stats in shard_stats)} "
+            f"accounts, sending across {len(campaign_bson['shards'])} shards"
+        )
+
+    @staticmethod
+    def _start_campaign_shards(campaign_bson: Dict) -> None:
+        """Start a worker for every shard of the campaign that is not done yet"""
+        # Import here to avoid circular imports
+        from modules.application.application_service import ApplicationService
+        from modules.notification.workers.notification_worker import NotificationCampaignWorker
+        
+        for shard_bson in campaign_bson["shards"]:
+            if shard_bson["status"] == CampaignShardStatus.RUNNING:
+                ApplicationService.run_worker_immediately(
+                    cls=NotificationCampaignWorker,
+                    arguments=(str(campaign_bson["_id"]), shard_bson["shard"], campaign_bson["run_id"])
+                )
+
+    @staticmethod
+    def get_campaign(campaign_id: str, account_id: str) -> Campaign:
+        """Get a campaign with its per-shard progress"""
+        return NotificationUtil.convert_campaign_bson_to_campaign(CampaignManager.get(campaign_id, account_id))
+
+    @staticmethod
+    def _transition_campaign(
+        campaign_id: str,
+        account_id: str,
+        action: str,
+        from_statuses: List[CampaignStatus],
+        status: CampaignStatus,
+        run_id: Optional[str] = None
+    ) -> Dict:
+        campaign_bson = CampaignManager.transition(campaign_id, account_id, from_statuses, status, run_id)
+        if campaign_bson is None:
+            current_status = CampaignManager.get(campaign_id, account_id)["status"]
+            raise CampaignStateConflictError(campaign_id, action, current_status)
+        
+        Logger.info(message=f"Campaign {campaign_id} is now {status}")
+        return campaign_bson
+
+    @staticmethod
+    def pause_campaign(campaign_id: str, account_id: str) -> Campaign:
+        """Pause a running campaign, its workers stop after the batch they are sending"""
+        campaign_bson = NotificationService._transition_campaign(
+            campaign_id, account_id, "pause", [CampaignStatus.RUNNING], CampaignStatus.PAUSED
+        )
+        return NotificationUtil.convert_campaign_bson_to_campaign(campaign_bson)
+
+    @staticmethod
+    def resume_campaign(campaign_id: str, account_id: str) -> Campaign:
+        """Resume a paused campaign from each shard's last sent snapshot chunk"""
+        # A new run_id retires any worker of the previous run that has not noticed the pause yet
+        campaign_bson = NotificationService._transition_campaign(
+            campaign_id, account_id, "resume", [CampaignStatus.PAUSED], CampaignStatus.RUNNING, uuid.uuid4().hex
+        )
+        NotificationService._start_campaign_shards(campaign_bson)
+        return NotificationUtil.convert_campaign_bson_to_campaign(campaign_bson)
+
+    @staticmethod
+    def cancel_campaign(campaign_id: str, account_id: str) -> Campaign:
+        """Cancel a campaign that has not finished for good and drop its audience snapshot"""
+        campaign_bson = NotificationService._transition_campaign(
+            campaign_id,
+            account_id,
+            "cancel",
+            [CampaignStatus.SNAPSHOTTING, CampaignStatus.RUNNING, CampaignStatus.PAUSED],
+            CampaignStatus.CANCELLED
+        )
+        CampaignAudienceSnapshot.delete(campaign_id)
+        return NotificationUtil.convert_campaign_bson_to_campaign(campaign_bson)
+
+    @staticmethod
+    def _send_campaign_notification(
+        campaign_bson: Dict, account_id: str, device_tokens: List[DeviceToken], renderer: TemplateVariantRenderer
+    ) -> str:
+        """Send a campaign's notification to one account's snapshotted devices, returns the counter it adds to"""
+        campaign_id = str(campaign_bson["_id"])
+        variant_id, title, body = renderer.render(account_id)
+        create_params = CreateNotificationParams(
+            account_id=account_id,
+            title=title,
+            body=body,
+            notification_type=NotificationType.PUSH,
+            device_tokens=[device_token.token for device_token in device_tokens],
+            data=campaign_bson.get("data"),
+            image_url=campaign_bson.get("image_url"),
+            template_id=campaign_bson["template_id"],
+            template_data=campaign_bson.get("template_data"),
+            campaign_id=campaign_id,
+            variant_id=variant_id
+        )
+        
+        try:
+            # Keyed on the campaign, so a retried or resumed shard never sends an account a second notification
+            result = NotificationService.create_notification_idempotent(create_params, f"campaign:{campaign_id}")
+            notification = result.notification
+            if notification.status == NotificationStatus.PENDING:
+                if result.is_replay:
+                    notification = (
+                        NotificationService.dispatch_pending_notification(notification.id, account_id, device_tokens)
+                        or notification
+                    )
+                else:
+                    notification = NotificationService.dispatch_created_notification(notification, device_tokens)
+        except Exception as e:
+            Logger.error(message=f"Failed to send campaign {campaign_id} to account {account_id}: {str(e)}")
+            return "failed_count"
+        
+        return "failed_count" if notification.status == NotificationStatus.FAILED else "sent_count"
+
+    @staticmethod
+    def run_campaign_shard(campaign_id: str, shard: int, run_id: str) -> None:
+        """Send one audience shard of a campaign chunk by chunk, until it is done, paused or cancelled"""
+        campaign_bson = CampaignManager.get(campaign_id)
+        if campaign_bson.get("run_id") != run_id or campaign_bson["status"] != CampaignStatus.RUNNING:
+            return
+        
+        # Recipients share the campaign's template data, so each variant is rendered once for the whole shard
+        template = NotificationReader.get_template_by_id(campaign_bson["template_id"])
+        template_data = {**(template.default_data or {}), **(campaign_bson.get("template_data") or {})}
+        renderer = TemplateVariantRenderer(template, template_data)
+        
+        shard_bson = campaign_bson["shards"][shard]
+        chunks = CampaignAudienceSnapshot.iter_chunks(
+            campaign_id, shard, shard_bson.get("last_platform"), shard_bson.get("last_seq")
+        )
+        for chunk in chunks:
+            counts = dict.fromkeys(CAMPAIGN_PROGRESS_COUNTERS, 0)
+            for entry in chunk["entries"]:
+                counts["processed_count"] += 1
+                # The snapshot carries each token's platform, so sending needs no per-account device lookup
+                device_tokens = [
+                    DeviceToken(token=token, platform=platform)
+                    for token, platform in zip(entry["tokens"], entry.get("platforms") or [""] * len(entry["tokens"]))
+                ]
+                counts[NotificationService._send_campaign_notification(
+                    campaign_bson, entry["account_id"], device_tokens, renderer
+                )] += 1
+            
+            if not CampaignManager.record_progress(campaign_id, shard, run_id, chunk["platform"], chunk["seq"], counts):
+                Logger.info(message=f"Campaign {campaign_id} shard {shard} stopped, the campaign is no longer running")
+                return
+        
+        Logger.info(message=f"Campaign {campaign_id} shard {shard} completed")
+        if CampaignManager.complete_shard(campaign_id, shard, run_id):
+            CampaignAudienceSnapshot.delete(campaign_id)
+            Logger.info(message=f"Campaign {campaign_id} completed")
 
     @staticmethod
     def send_bulk_notification(
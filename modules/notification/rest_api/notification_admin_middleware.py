@@ -0,0 +1,22 @@
+from functools import wraps
+from typing import Any, Callable
+
+from flask import request
+
+from modules.notification.errors import NotificationAdminAccessError
+from modules.notification.notification_service import NotificationService
+
+
+def notification_admin_middleware(next_func: Callable) -> Callable:
+    """Allow only admin and service accounts, for endpoints that send to accounts other than the caller's"""
+
+    @wraps(next_func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        # Runs after access_auth_middleware, which sets the authenticated account_id
+        account_id = getattr(request, "account_id", None)
+        if not account_id or not NotificationService.is_admin_account(account_id):
+            raise NotificationAdminAccessError()
+
+        return next_func(*args, **kwargs)
+
+    return wrapper
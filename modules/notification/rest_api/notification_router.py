@@ -1,12 +1,22 @@
 from flask import Blueprint
 
 from modules.notification.rest_api.notification_view import (
+    CampaignDetailView,
+    CampaignView,
     DeviceTokenView,
+    LocalTimeNotificationView,
+    NotificationAckView,
+    NotificationArchiveView,
     NotificationDetailView,
+    NotificationExportView,
+    NotificationFunnelView,
+    NotificationPreferencesView,
+    NotificationReceiptsView,
     NotificationStatsView,
     NotificationTemplateDetailView,
     NotificationTemplateView,
     NotificationView,
+    SegmentNotificationView,
     TopicView,
 )
 
@@ -21,12 +31,48 @@ class NotificationRouter:
             methods=["GET", "POST"]
         )
         
+        blueprint.add_url_rule(
+            "/notifications/export", 
+            view_func=NotificationExportView.as_view("notification_export_view"),
+            methods=["GET"]
+        )
+        
+        blueprint.add_url_rule(
+            "/notifications/archive", 
+            view_func=NotificationArchiveView.as_view("notification_archive_view"),
+            methods=["GET"]
+        )
+        
+        blueprint.add_url_rule(
+            "/notifications/preferences", 
+            view_func=NotificationPreferencesView.as_view("notification_preferences_view"),
+            methods=["GET", "PUT"]
+        )
+        
+        blueprint.add_url_rule(
+            "/notifications/acks", 
+            view_func=NotificationAckView.as_view("notification_ack_view"),
+            methods=["POST"]
+        )
+        
+        blueprint.add_url_rule(
+            "/notifications/local-time", 
+            view_func=LocalTimeNotificationView.as_view("local_time_notification_view"),
+            methods=["POST"]
+        )
+        
         blueprint.add_url_rule(
             "/notifications/<notification_id>", 
             view_func=NotificationDetailView.as_view("notification_detail_view"),
             methods=["GET", "PATCH"]
         )
         
+        blueprint.add_url_rule(
+            "/notifications/<notification_id>/receipts", 
+            view_func=NotificationReceiptsView.as_view("notification_receipts_view"),
+            methods=["GET"]
+        )
+        
         # Device token routes
         blueprint.add_url_rule(
             "/device-tokens", 
@@ -47,6 +93,26 @@ class NotificationRouter:
             methods=["DELETE"]
         )
         
+        # Segment routes
+        blueprint.add_url_rule(
+            "/segments/notifications", 
+            view_func=SegmentNotificationView.as_view("segment_notification_view"),
+            methods=["POST"]
+        )
+        
+        # Campaign routes
+        blueprint.add_url_rule(
+            "/campaigns", 
+            view_func=CampaignView.as_view("campaign_view"),
+            methods=["POST"]
+        )
+        
+        blueprint.add_url_rule(
+            "/campaigns/<campaign_id>", 
+            view_func=CampaignDetailView.as_view("campaign_detail_view"),
+            methods=["GET", "PATCH"]
+        )
+        
         # Template routes
         blueprint.add_url_rule(
             "/templates", 
@@ -67,4 +133,10 @@ class NotificationRouter:
             methods=["GET"]
         )
         
+        blueprint.add_url_rule(
+            "/stats/funnel", 
+            view_func=NotificationFunnelView.as_view("notification_funnel_view"),
+            methods=["GET"]
+        )
+        
         return blueprint
\ No newline at end of file
@@ -1,20 +1,35 @@
-from dataclasses import asdict
 from typing import Dict, List
 
-from flask import jsonify, request
+from flask import Response, jsonify, request
 from flask.typing import ResponseReturnValue
 from flask.views import MethodView
 
+from modules.application.json_provider import JSONSerializer
 from modules.authentication.rest_api.access_auth_middleware import access_auth_middleware
+from modules.notification.errors import IdempotencyKeyInProgressError
 from modules.notification.notification_service import NotificationService
+from modules.notification.rest_api.notification_admin_middleware import notification_admin_middleware
 from modules.notification.types import (
+    CampaignAudience,
+    CreateCampaignParams,
     CreateNotificationParams,
+    NotificationAck,
+    NotificationArchiveSearchParams,
     NotificationData,
+    NotificationEventType,
+    NotificationExportParams,
+    NotificationFunnelParams,
+    NotificationPreferences,
     NotificationPriority,
+    NotificationRollupDimension,
     NotificationSearchParams,
+    NotificationSegment,
     NotificationStatus,
+    NotificationTemplateVariant,
     NotificationType,
+    ScheduleLocalTimeNotificationParams,
     SendNotificationParams,
+    SendSegmentNotificationParams,
     SendTopicNotificationParams,
     SubscribeToTopicParams,
     UnsubscribeFromTopicParams,
@@ -40,6 +55,9 @@ class NotificationView(MethodView):
         template_id = request_data.get('template_id')
         template_data = request_data.get('template_data')
         scheduled_at = request_data.get('scheduled_at')
+        collapse_key = request_data.get('collapse_key')
+        campaign_id = request_data.get('campaign_id')
+        idempotency_key = request.headers.get('Idempotency-Key')
         
         # Create notification
         create_params = CreateNotificationParams(
@@ -54,27 +72,37 @@ class NotificationView(MethodView):
             image_url=image_url,
             template_id=template_id,
             template_data=template_data,
-            scheduled_at=scheduled_at
+            scheduled_at=scheduled_at,
+            collapse_key=collapse_key,
+            campaign_id=campaign_id
         )
         
         try:
-            notification = NotificationService.create_notification(create_params)
+            # Bursts sharing a collapse key are merged into one digest notification sent when the window closes,
+            # the idempotency key is checked first so a retried request is not merged twice
+            digest = NotificationService.coalesce_notification(create_params, idempotency_key)
+            if digest:
+                return jsonify(digest), 202
             
-            # If not scheduled, mark as sent for now (until FCM is configured)
+            result = NotificationService.create_notification_idempotent(create_params, idempotency_key)
+            notification = result.notification
+            
+            # A retried request gets the original notification back without sending it again
+            if result.is_replay:
+                return jsonify(notification), 200, {'Idempotent-Replayed': 'true'}
+            
+            # Scheduled notifications are sent by the scheduler worker
             if not scheduled_at:
-                from modules.logger.logger import Logger
-                Logger.info(message=f"MOCK: Would send notification '{title}' to tokens: {device_tokens}")
-                
-                # Mark as sent for testing
-                notification = NotificationService.mark_notification_as_sent(notification.id)
+                notification = NotificationService.dispatch_created_notification(notification)
             
-            notification_dict = asdict(notification)
-            return jsonify(notification_dict), 201
+            return jsonify(notification), 201
             
+        except IdempotencyKeyInProgressError:
+            raise
         except Exception as e:
             # If notification was created but sending failed, mark it as failed
             if 'notification' in locals():
-                NotificationService.mark_notification_as_failed(notification.id, str(e))
+                NotificationService.mark_notification_as_failed(notification.id, str(e), account_id)
             
             # Return error response
             from modules.logger.logger import Logger
@@ -105,12 +133,11 @@ class NotificationView(MethodView):
             offset=offset
         )
         
-        notifications = NotificationService.get_notifications(search_params)
-        notifications_dict = [asdict(notification) for notification in notifications]
+        notifications = NotificationService.get_notification_summaries(search_params)
         
         return jsonify({
-            'notifications': notifications_dict,
-            'count': len(notifications_dict),
+            'notifications': notifications,
+            'count': len(notifications),
             'limit': limit,
             'offset': offset
         }), 200
@@ -120,25 +147,133 @@ class NotificationDetailView(MethodView):
     @access_auth_middleware
     def get(self, notification_id: str) -> ResponseReturnValue:
         """Get specific notification"""
-        notification = NotificationService.get_notification_by_id(notification_id)
-        notification_dict = asdict(notification)
-        return jsonify(notification_dict), 200
+        account_id = getattr(request, 'account_id')
+        notification = NotificationService.get_notification_by_id(notification_id, account_id)
+        return jsonify(notification), 200
 
     @access_auth_middleware
     def patch(self, notification_id: str) -> ResponseReturnValue:
-        """Update notification status (delivered/clicked)"""
+        """Update notification status (delivered/opened/clicked)"""
         request_data = request.get_json()
+        account_id = getattr(request, 'account_id')
         action = request_data.get('action')
         
         if action == 'delivered':
-            notification = NotificationService.mark_notification_as_delivered(notification_id)
+            notification = NotificationService.mark_notification_as_delivered(notification_id, account_id)
+        elif action == 'opened':
+            notification = NotificationService.mark_notification_as_opened(notification_id, account_id)
         elif action == 'clicked':
-            notification = NotificationService.mark_notification_as_clicked(notification_id)
+            notification = NotificationService.mark_notification_as_clicked(notification_id, account_id)
         else:
-            return jsonify({'error': 'Invalid action. Use "delivered" or "clicked"'}), 400
+            return jsonify({'error': 'Invalid action. Use "delivered", "opened" or "clicked"'}), 400
+        
+        return jsonify(notification), 200
+
+
+class NotificationReceiptsView(MethodView):
+    @access_auth_middleware
+    def get(self, notification_id: str) -> ResponseReturnValue:
+        """Get the per-token delivery receipts of a notification"""
+        account_id = getattr(request, 'account_id')
+        receipts = NotificationService.get_delivery_receipts(notification_id, account_id)
+        return jsonify({'receipts': receipts}), 200
+
+
+class NotificationAckView(MethodView):
+    @access_auth_middleware
+    def post(self) -> ResponseReturnValue:
+        """Record a batch of delivered/opened/clicked acks from the client SDK"""
+        request_data = request.get_json()
+        account_id = getattr(request, 'account_id')
+        
+        acks = []
+        for ack_data in request_data.get('acks', []):
+            action = ack_data.get('action')
+            if action not in ('delivered', 'opened', 'clicked') or not ack_data.get('notification_id'):
+                return jsonify({'error': 'Each ack needs a notification_id and a "delivered", "opened" or '
+                                         '"clicked" action'}), 400
+            
+            acks.append(NotificationAck(
+                notification_id=ack_data['notification_id'],
+                event_type=NotificationEventType(action.upper()),
+                occurred_at=ack_data.get('occurred_at')
+            ))
+        
+        # Responds once the acks are stored, a failed batch returns 503 and the SDK retries it
+        result = NotificationService.record_notification_acks(account_id, acks)
+        return jsonify(result), 200
+
+
+class NotificationExportView(MethodView):
+    @access_auth_middleware
+    def get(self) -> ResponseReturnValue:
+        """Stream the authenticated user's notification history as NDJSON"""
+        account_id = getattr(request, 'account_id')
+        
+        status = request.args.get('status')
+        notification_type = request.args.get('notification_type')
+        batch_size = request.args.get('batch_size')
+        
+        if batch_size is not None and not batch_size.isdigit():
+            return jsonify({'error': 'batch_size must be a positive integer'}), 400
+        
+        export_params = NotificationExportParams(
+            account_id=account_id,
+            status=NotificationStatus(status) if status else None,
+            notification_type=NotificationType(notification_type) if notification_type else None,
+            created_after=request.args.get('created_after'),
+            created_before=request.args.get('created_before'),
+            include_device_tokens=request.args.get('include_device_tokens', 'false').lower() == 'true'
+        )
+        
+        # Dates and batch_size are validated here, invalid values get a 400 instead of a broken stream
+        notifications = NotificationService.export_notifications(
+            export_params, int(batch_size) if batch_size is not None else None
+        )
+        
+        # Documents are written as they come off the cursor, so memory stays flat for any history size
+        return Response(
+            JSONSerializer.iter_ndjson(notifications),
+            status=200,
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': 'attachment; filename="notifications.ndjson"'}
+        )
+
+
+class NotificationArchiveView(MethodView):
+    @access_auth_middleware
+    def get(self) -> ResponseReturnValue:
+        """Get a page of archived notifications for the authenticated user within a date range"""
+        account_id = getattr(request, 'account_id')
+        
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        
+        if not start_date or not end_date:
+            return jsonify({'error': 'start_date and end_date are required'}), 400
+        
+        limit = request.args.get('limit', '100')
+        if not limit.isdigit() or int(limit) < 1:
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+        
+        # Archive ranges can span years of history, so they are read page by page through next_cursor
+        search_params = NotificationArchiveSearchParams(
+            account_id=account_id,
+            start_date=start_date,
+            end_date=end_date,
+            limit=int(limit),
+            cursor=request.args.get('cursor')
+        )
         
-        notification_dict = asdict(notification)
-        return jsonify(notification_dict), 200
+        page = NotificationService.get_archived_notifications(search_params)
+        
+        return jsonify({
+            'notifications': page.notifications,
+            'count': len(page.notifications),
+            'next_cursor': page.next_cursor,
+            'start_date': start_date,
+            'end_date': end_date
+        }), 200
 
 
 class DeviceTokenView(MethodView):
@@ -152,9 +287,8 @@ class DeviceTokenView(MethodView):
         platform = request_data.get('platform')
         
         device_token = NotificationService.register_device_token(account_id, token, platform)
-        device_token_dict = asdict(device_token)
         
-        return jsonify(device_token_dict), 201
+        return jsonify(device_token), 201
 
     @access_auth_middleware
     def get(self) -> ResponseReturnValue:
@@ -163,17 +297,17 @@ class DeviceTokenView(MethodView):
         platform = request.args.get('platform')
         
         device_tokens = NotificationService.get_device_tokens_for_account(account_id, platform)
-        device_tokens_dict = [asdict(token) for token in device_tokens]
         
-        return jsonify({'device_tokens': device_tokens_dict}), 200
+        return jsonify({'device_tokens': device_tokens}), 200
 
     @access_auth_middleware
     def delete(self) -> ResponseReturnValue:
         """Deactivate device token"""
         request_data = request.get_json()
+        account_id = getattr(request, 'account_id')
         token = request_data.get('token')
         
-        success = NotificationService.deactivate_device_token(token)
+        success = NotificationService.deactivate_device_token(token, account_id)
         
         if success:
             return jsonify({'message': 'Device token deactivated successfully'}), 200
@@ -191,16 +325,14 @@ class TopicView(MethodView):
         topic = request_data.get('topic')
         tokens = request_data.get('tokens', [])
         
-        # If no tokens provided, get all tokens for the account
+        # If no tokens provided, use all active tokens for the account
         if not tokens:
-            device_tokens = NotificationService.get_device_tokens_for_account(account_id)
-            tokens = [dt.token for dt in device_tokens]
+            tokens = NotificationService.get_active_device_tokens_for_account(account_id)
         
-        subscribe_params = SubscribeToTopicParams(tokens=tokens, topic=topic)
+        subscribe_params = SubscribeToTopicParams(tokens=tokens, topic=topic, account_id=account_id)
         response = NotificationService.subscribe_to_topic(subscribe_params)
         
-        response_dict = asdict(response)
-        return jsonify(response_dict), 200
+        return jsonify(response), 200
 
     @access_auth_middleware
     def delete(self) -> ResponseReturnValue:
@@ -211,16 +343,95 @@ class TopicView(MethodView):
         topic = request_data.get('topic')
         tokens = request_data.get('tokens', [])
         
-        # If no tokens provided, get all tokens for the account
+        # If no tokens provided, use all active tokens for the account
         if not tokens:
-            device_tokens = NotificationService.get_device_tokens_for_account(account_id)
-            tokens = [dt.token for dt in device_tokens]
+            tokens = NotificationService.get_active_device_tokens_for_account(account_id)
         
-        unsubscribe_params = UnsubscribeFromTopicParams(tokens=tokens, topic=topic)
+        unsubscribe_params = UnsubscribeFromTopicParams(tokens=tokens, topic=topic, account_id=account_id)
         response = NotificationService.unsubscribe_from_topic(unsubscribe_params)
         
-        response_dict = asdict(response)
-        return jsonify(response_dict), 200
+        return jsonify(response), 200
+
+
+class SegmentNotificationView(MethodView):
+    @access_auth_middleware
+    @notification_admin_middleware
+    def post(self) -> ResponseReturnValue:
+        """Send notification to a segment in the background, or only report its audience size when dry_run is set"""
+        request_data = request.get_json()
+        
+        segment_data = request_data.get('segment', {})
+        notification_data = request_data.get('notification', {})
+        
+        segment = NotificationSegment(
+            platforms=segment_data.get('platforms'),
+            topic=segment_data.get('topic'),
+            active_within_days=segment_data.get('active_within_days')
+        )
+        notification = NotificationData(
+            title=notification_data.get('title'),
+            body=notification_data.get('body'),
+            image_url=notification_data.get('image_url'),
+            data=notification_data.get('data')
+        )
+        
+        send_params = SendSegmentNotificationParams(
+            segment=segment,
+            notification=notification,
+            dry_run=request_data.get('dry_run', False)
+        )
+        result = NotificationService.send_segment_notification(send_params)
+        
+        # The fan-out runs in a worker, the response only confirms it was started
+        return jsonify(result), 202 if result.worker_id else 200
+
+
+class NotificationPreferencesView(MethodView):
+    @access_auth_middleware
+    def get(self) -> ResponseReturnValue:
+        """Get the authenticated user's time zone and quiet hours"""
+        account_id = getattr(request, 'account_id')
+        
+        preferences = NotificationService.get_notification_preferences(account_id)
+        
+        return jsonify(preferences), 200
+
+    @access_auth_middleware
+    def put(self) -> ResponseReturnValue:
+        """Set the authenticated user's time zone and quiet hours"""
+        request_data = request.get_json()
+        account_id = getattr(request, 'account_id')
+        
+        preferences = NotificationPreferences(
+            account_id=account_id,
+            time_zone=request_data.get('time_zone', 'UTC'),
+            quiet_hours_start=request_data.get('quiet_hours_start'),
+            quiet_hours_end=request_data.get('quiet_hours_end')
+        )
+        preferences = NotificationService.update_notification_preferences(preferences)
+        
+        return jsonify(preferences), 200
+
+
+class LocalTimeNotificationView(MethodView):
+    @access_auth_middleware
+    @notification_admin_middleware
+    def post(self) -> ResponseReturnValue:
+        """Schedule a notification at a wall clock time in each recipient's own time zone"""
+        request_data = request.get_json()
+        
+        schedule_params = ScheduleLocalTimeNotificationParams(
+            account_ids=request_data.get('account_ids', []),
+            title=request_data.get('title'),
+            body=request_data.get('body'),
+            local_time=request_data.get('local_time'),
+            priority=NotificationPriority(request_data.get('priority', 'NORMAL')),
+            data=request_data.get('data'),
+            image_url=request_data.get('image_url')
+        )
+        result = NotificationService.schedule_local_time_notification(schedule_params)
+        
+        return jsonify(result), 201
 
 
 class NotificationTemplateView(MethodView):
@@ -232,29 +443,37 @@ class NotificationTemplateView(MethodView):
         title_template = request_data.get('title_template')
         body_template = request_data.get('body_template')
         default_data = request_data.get('default_data')
+        variants_data = request_data.get('variants')
+        
+        variants = [
+            NotificationTemplateVariant(
+                id=variant_data.get('id'),
+                title_template=variant_data.get('title_template'),
+                body_template=variant_data.get('body_template'),
+                weight=variant_data.get('weight', 1)
+            )
+            for variant_data in variants_data
+        ] if variants_data is not None else None
         
         template = NotificationService.create_notification_template(
-            name, title_template, body_template, default_data
+            name, title_template, body_template, default_data, variants
         )
-        template_dict = asdict(template)
         
-        return jsonify(template_dict), 201
+        return jsonify(template), 201
 
     def get(self) -> ResponseReturnValue:
         """Get all notification templates"""
         templates = NotificationService.get_all_notification_templates()
-        templates_dict = [asdict(template) for template in templates]
         
-        return jsonify({'templates': templates_dict}), 200
+        return jsonify({'templates': templates}), 200
 
 
 class NotificationTemplateDetailView(MethodView):
     def get(self, template_id: str) -> ResponseReturnValue:
         """Get specific notification template"""
         template = NotificationService.get_notification_template_by_id(template_id)
-        template_dict = asdict(template)
         
-        return jsonify(template_dict), 200
+        return jsonify(template), 200
 
     def put(self, template_id: str) -> ResponseReturnValue:
         """Update notification template"""
@@ -264,13 +483,23 @@ class NotificationTemplateDetailView(MethodView):
         title_template = request_data.get('title_template')
         body_template = request_data.get('body_template')
         default_data = request_data.get('default_data')
+        variants_data = request_data.get('variants')
+        
+        variants = [
+            NotificationTemplateVariant(
+                id=variant_data.get('id'),
+                title_template=variant_data.get('title_template'),
+                body_template=variant_data.get('body_template'),
+                weight=variant_data.get('weight', 1)
+            )
+            for variant_data in variants_data
+        ] if variants_data is not None else None
         
         template = NotificationService.update_notification_template(
-            template_id, name, title_template, body_template, default_data
+            template_id, name, title_template, body_template, default_data, variants
         )
-        template_dict = asdict(template)
         
-        return jsonify(template_dict), 200
+        return jsonify(template), 200
 
     def delete(self, template_id: str) -> ResponseReturnValue:
         """Delete notification template"""
@@ -297,4 +526,89 @@ class NotificationStatsView(MethodView):
             'read_notifications': total_count - unread_count
         }
         
-        return jsonify(stats), 200
\ No newline at end of file
+        return jsonify(stats), 200
+
+
+class NotificationFunnelView(MethodView):
+    @access_auth_middleware
+    @notification_admin_middleware
+    def get(self) -> ResponseReturnValue:
+        """Get precomputed hourly funnel counts for a template, template variant, campaign or platform"""
+        dimension = request.args.get('dimension', '').upper()
+        value = request.args.get('value')
+        
+        if dimension not in NotificationRollupDimension.__members__ or not value:
+            return jsonify({
+                'error': 'dimension must be "template", "variant", "campaign" or "platform" and value is required'
+            }), 400
+        
+        funnel_params = NotificationFunnelParams(
+            dimension=NotificationRollupDimension(dimension),
+            value=value,
+            start_at=request.args.get('start_at'),
+            end_at=request.args.get('end_at')
+        )
+        
+        funnel = NotificationService.get_notification_funnel(funnel_params)
+        return jsonify(funnel), 200
+
+
+class CampaignView(MethodView):
+    @access_auth_middleware
+    @notification_admin_middleware
+    def post(self) -> ResponseReturnValue:
+        """Create a campaign, it is sent in the background and can be followed through GET /campaigns/<id>"""
+        request_data = request.get_json()
+        account_id = getattr(request, 'account_id')
+        
+        audience_data = request_data.get('audience', {})
+        segment_data = audience_data.get('segment')
+        
+        audience = CampaignAudience(
+            segment=NotificationSegment(
+                platforms=segment_data.get('platforms'),
+                topic=segment_data.get('topic'),
+                active_within_days=segment_data.get('active_within_days')
+            ) if segment_data is not None else None,
+            account_ids=audience_data.get('account_ids')
+        )
+        
+        create_params = CreateCampaignParams(
+            account_id=account_id,
+            name=request_data.get('name'),
+            template_id=request_data.get('template_id'),
+            audience=audience,
+            template_data=request_data.get('template_data'),
+            data=request_data.get('data'),
+            image_url=request_data.get('image_url')
+        )
+        
+        campaign = NotificationService.create_campaign(create_params)
+        return jsonify(campaign), 202
+
+
+class CampaignDetailView(MethodView):
+    @access_auth_middleware
+    def get(self, campaign_id: str) -> ResponseReturnValue:
+        """Get a campaign with its per-shard progress"""
+        account_id = getattr(request, 'account_id')
+        campaign = NotificationService.get_campaign(campaign_id, account_id)
+        return jsonify(campaign), 200
+
+    @access_auth_middleware
+    def patch(self, campaign_id: str) -> ResponseReturnValue:
+        """Pause, resume or cancel a campaign"""
+        request_data = request.get_json()
+        account_id = getattr(request, 'account_id')
+        action = request_data.get('action')
+        
+        if action == 'pause':
+            campaign = NotificationService.pause_campaign(campaign_id, account_id)
+        elif action == 'resume':
+            campaign = NotificationService.resume_campaign(campaign_id, account_id)
+        elif action == 'cancel':
+            campaign = NotificationService.cancel_campaign(campaign_id, account_id)
+        else:
+            return jsonify({'error': 'Invalid action. Use "pause", "resume" or "cancel"'}), 400
+        
+        return jsonify(campaign), 200
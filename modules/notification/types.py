@@ -3,6 +3,12 @@ from enum import StrEnum
 from typing import Any, Dict, List, Optional, Union
 
 
+class NotificationPriority(StrEnum):
+    LOW = "LOW"
+    NORMAL = "NORMAL"
+    HIGH = "HIGH"
+
+
 @dataclass(frozen=True)
 class DeviceToken:
     token: str
@@ -22,6 +28,16 @@ class SendNotificationParams:
     recipient_tokens: List[str]
     notification: NotificationData
     topic: Optional[str] = None
+    priority: NotificationPriority = NotificationPriority.NORMAL
+    collapse_key: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class SendDeviceNotificationParams:
+    recipients: List[DeviceToken]
+    notification: NotificationData
+    priority: NotificationPriority = NotificationPriority.NORMAL
+    collapse_key: Optional[str] = None
 
 
 @dataclass(frozen=True)
@@ -34,12 +50,45 @@ class SendTopicNotificationParams:
 class SubscribeToTopicParams:
     tokens: List[str]
     topic: str
+    account_id: Optional[str] = None
 
 
 @dataclass(frozen=True)
 class UnsubscribeFromTopicParams:
     tokens: List[str]
     topic: str
+    account_id: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NotificationSegment:
+    platforms: Optional[List[str]] = None
+    topic: Optional[str] = None
+    active_within_days: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class SendSegmentNotificationParams:
+    segment: NotificationSegment
+    notification: NotificationData
+    dry_run: bool = False
+
+
+@dataclass(frozen=True)
+class SegmentNotificationResult:
+    audience_size: int
+    success_count: int
+    failure_count: int
+    batch_count: int
+    worker_id: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NotificationTemplateVariant:
+    id: str
+    title_template: str
+    body_template: str
+    weight: int = 1
 
 
 @dataclass(frozen=True)
@@ -49,6 +98,7 @@ class NotificationTemplate:
     title_template: str
     body_template: str
     default_data: Optional[Dict[str, Any]] = None
+    variants: Optional[List[NotificationTemplateVariant]] = None
 
 
 @dataclass(frozen=True)
@@ -74,10 +124,66 @@ class NotificationType(StrEnum):
     IN_APP = "IN_APP"
 
 
-class NotificationPriority(StrEnum):
-    LOW = "LOW"
-    NORMAL = "NORMAL"
-    HIGH = "HIGH"
+class NotificationCleanupMode(StrEnum):
+    CHUNKED = "CHUNKED"
+    TTL = "TTL"
+    ARCHIVE = "ARCHIVE"
+
+
+class NotificationArchiveFormat(StrEnum):
+    NDJSON = "NDJSON"
+    PARQUET = "PARQUET"
+
+
+class IdempotencyKeyStatus(StrEnum):
+    IN_PROGRESS = "IN_PROGRESS"
+    COMPLETED = "COMPLETED"
+
+
+class NotificationDigestStatus(StrEnum):
+    PENDING = "PENDING"
+    FLUSHING = "FLUSHING"
+
+
+class NotificationDispatchMode(StrEnum):
+    INLINE = "INLINE"
+    CHANGE_STREAM = "CHANGE_STREAM"
+
+
+class NotificationStorageEngine(StrEnum):
+    DOCUMENT = "DOCUMENT"
+    BUCKET = "BUCKET"
+
+
+class NotificationEventType(StrEnum):
+    DELIVERED = "DELIVERED"
+    OPENED = "OPENED"
+    CLICKED = "CLICKED"
+
+
+class NotificationRollupDimension(StrEnum):
+    TEMPLATE = "TEMPLATE"
+    CAMPAIGN = "CAMPAIGN"
+    PLATFORM = "PLATFORM"
+    VARIANT = "VARIANT"  # value is "<template_id>:<variant_id>"
+
+
+class CampaignStatus(StrEnum):
+    SNAPSHOTTING = "SNAPSHOTTING"
+    RUNNING = "RUNNING"
+    PAUSED = "PAUSED"
+    CANCELLED = "CANCELLED"
+    COMPLETED = "COMPLETED"
+
+
+class CampaignShardStatus(StrEnum):
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+
+
+class NotificationScheduleBucketStatus(StrEnum):
+    PENDING = "PENDING"
+    CLAIMED = "CLAIMED"
 
 
 @dataclass(frozen=True)
@@ -100,6 +206,28 @@ class Notification:
     delivered_at: Optional[str] = None
     clicked_at: Optional[str] = None
     error_message: Optional[str] = None
+    collapse_key: Optional[str] = None
+    campaign_id: Optional[str] = None
+    variant_id: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NotificationSummary:
+    id: str
+    account_id: str
+    title: str
+    body: str
+    notification_type: NotificationType
+    status: NotificationStatus
+    priority: NotificationPriority
+    topic: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+    image_url: Optional[str] = None
+    scheduled_at: Optional[str] = None
+    sent_at: Optional[str] = None
+    delivered_at: Optional[str] = None
+    clicked_at: Optional[str] = None
+    created_at: Optional[str] = None
 
 
 @dataclass(frozen=True)
@@ -116,6 +244,50 @@ class CreateNotificationParams:
     template_id: Optional[str] = None
     template_data: Optional[Dict[str, Any]] = None
     scheduled_at: Optional[str] = None
+    collapse_key: Optional[str] = None
+    campaign_id: Optional[str] = None
+    variant_id: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NotificationDigest:
+    id: str
+    account_id: str
+    collapse_key: str
+    event_count: int
+    flush_at: str
+
+
+@dataclass(frozen=True)
+class NotificationPreferences:
+    account_id: str
+    time_zone: str = "UTC"
+    quiet_hours_start: Optional[str] = None  # 'HH:MM' in time_zone
+    quiet_hours_end: Optional[str] = None  # 'HH:MM' in time_zone
+
+
+@dataclass(frozen=True)
+class ScheduleLocalTimeNotificationParams:
+    account_ids: List[str]
+    title: str
+    body: str
+    local_time: str  # 'HH:MM' in each recipient's time zone
+    priority: NotificationPriority = NotificationPriority.NORMAL
+    data: Optional[Dict[str, Any]] = None
+    image_url: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class LocalTimeScheduleResult:
+    scheduled_count: int
+    skipped_account_ids: List[str]
+    time_zone_count: int
+
+
+@dataclass(frozen=True)
+class IdempotentNotificationResult:
+    notification: Notification
+    is_replay: bool
 
 
 @dataclass(frozen=True)
@@ -127,6 +299,78 @@ class NotificationSearchParams:
     offset: int = 0
 
 
+@dataclass(frozen=True)
+class NotificationCleanupParams:
+    days_old: int = 90
+    batch_size: int = 1000
+    pause_seconds: float = 0.1
+    max_documents: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class NotificationCleanupResult:
+    mode: NotificationCleanupMode
+    deleted_count: int
+    batch_count: int
+    elapsed_seconds: float
+    has_more: bool = False
+
+
+@dataclass(frozen=True)
+class NotificationExportParams:
+    account_id: str
+    status: Optional[NotificationStatus] = None
+    notification_type: Optional[NotificationType] = None
+    created_after: Optional[str] = None
+    created_before: Optional[str] = None
+    include_device_tokens: bool = False
+
+
+@dataclass(frozen=True)
+class NotificationArchiveSearchParams:
+    account_id: str
+    start_date: str
+    end_date: str
+    limit: int = 100
+    cursor: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NotificationArchivePage:
+    notifications: List[Notification]
+    next_cursor: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NotificationFunnelParams:
+    dimension: NotificationRollupDimension
+    value: str
+    start_at: Optional[str] = None
+    end_at: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NotificationFunnelBucket:
+    hour: str
+    created: int = 0
+    sent: int = 0
+    failed: int = 0
+    delivered: int = 0
+    clicked: int = 0
+
+
+@dataclass(frozen=True)
+class NotificationFunnel:
+    dimension: NotificationRollupDimension
+    value: str
+    created: int
+    sent: int
+    failed: int
+    delivered: int
+    clicked: int
+    buckets: List[NotificationFunnelBucket]
+
+
 @dataclass(frozen=True)
 class NotificationErrorCode:
     NOTIFICATION_NOT_FOUND = "NOTIFICATION_ERR_01"
@@ -134,6 +378,12 @@ class NotificationErrorCode:
     TEMPLATE_NOT_FOUND = "NOTIFICATION_ERR_03"
     FCM_SERVICE_ERROR = "NOTIFICATION_ERR_04"
     VALIDATION_ERROR = "NOTIFICATION_ERR_05"
+    ARCHIVE_ERROR = "NOTIFICATION_ERR_06"
+    IDEMPOTENCY_KEY_IN_PROGRESS = "NOTIFICATION_ERR_07"
+    ACK_FLUSH_FAILED = "NOTIFICATION_ERR_08"
+    CAMPAIGN_NOT_FOUND = "NOTIFICATION_ERR_09"
+    CAMPAIGN_STATE_CONFLICT = "NOTIFICATION_ERR_10"
+    ADMIN_ACCESS_REQUIRED = "NOTIFICATION_ERR_11"
 
 
 @dataclass(frozen=True)
@@ -147,4 +397,90 @@ class FCMResponse:
     success_count: int
     failure_count: int
     failed_tokens: List[str]
-    message_id: Optional[str] = None
\ No newline at end of file
+    message_id: Optional[str] = None
+    receipts: Optional[List["DeliveryReceipt"]] = None
+
+
+@dataclass(frozen=True)
+class DeliveryReceipt:
+    token: str
+    success: bool
+    attempt: int
+    latency_ms: float
+    platform: Optional[str] = None
+    message_id: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NotificationDeliveryReceipt:
+    notification_id: str
+    account_id: str
+    token: str
+    success: bool
+    attempt: int
+    latency_ms: float
+    sent_at: str
+    platform: Optional[str] = None
+    message_id: Optional[str] = None
+    error_code: Optional[str] = None
+    variant_id: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NotificationAck:
+    notification_id: str
+    event_type: NotificationEventType
+    occurred_at: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class NotificationAckResult:
+    accepted_count: int
+
+
+@dataclass(frozen=True)
+class CampaignAudience:
+    segment: Optional[NotificationSegment] = None
+    account_ids: Optional[List[str]] = None
+
+
+@dataclass(frozen=True)
+class CreateCampaignParams:
+    account_id: str
+    name: str
+    template_id: str
+    audience: CampaignAudience
+    template_data: Optional[Dict[str, Any]] = None
+    data: Optional[Dict[str, Any]] = None
+    image_url: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class CampaignShardProgress:
+    shard: int
+    status: CampaignShardStatus
+    audience_size: int = 0
+    processed_count: int = 0
+    sent_count: int = 0
+    failed_count: int = 0
+    skipped_count: int = 0
+
+
+@dataclass(frozen=True)
+class Campaign:
+    id: str
+    account_id: str
+    name: str
+    template_id: str
+    status: CampaignStatus
+    audience: CampaignAudience
+    shards: List[CampaignShardProgress]
+    audience_size: int
+    processed_count: int
+    sent_count: int
+    failed_count: int
+    skipped_count: int
+    template_data: Optional[Dict[str, Any]] = None
+    created_at: Optional[str] = None
+    completed_at: Optional[str] = None
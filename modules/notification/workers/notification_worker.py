@@ -45,16 +45,152 @@ class NotificationCleanupWorker(BaseWorker):
             # Import here to avoid circular imports
             from modules.notification.notification_service import NotificationService
             
+            from modules.notification.types import NotificationCleanupResult
+            
             Logger.info(message="Starting notification cleanup")
             
-            # Clean up notifications older than 90 days
-            deleted_count = NotificationService.cleanup_old_notifications(days_old=90)
+            def report_progress(progress: NotificationCleanupResult) -> None:
+                throughput = progress.deleted_count / progress.elapsed_seconds if progress.elapsed_seconds else 0
+                Logger.info(
+                    message=f"Notification cleanup progress: {progress.deleted_count} deleted in "
+                    f"{progress.batch_count} batches ({throughput:.1f} docs/s)"
+                )
+            
+            # Clean up terminal notifications older than the configured retention
+            result = NotificationService.cleanup_old_notifications(on_progress=report_progress)
             
-            Logger.info(message=f"Cleaned up {deleted_count} old notifications")
+            throughput = result.deleted_count / result.elapsed_seconds if result.elapsed_seconds else 0
+            Logger.info(
+                message=f"Cleaned up {result.deleted_count} old notifications in {result.elapsed_seconds:.1f}s "
+                f"({throughput:.1f} docs/s, mode: {result.mode}, more remaining: {result.has_more})"
+            )
             
         except Exception as e:
             Logger.error(message=f"Error during notification cleanup: {str(e)}")
             raise
 
     async def run(self, *args: Any) -> None:
-        await super().run(*args)
\ No newline at end of file
+        await super().run(*args)
+
+
+class NotificationDigestWorker(BaseWorker):
+    """Worker to flush coalesced notification digests"""
+    
+    max_execution_time_in_seconds = 300  # 5 minutes
+    max_retries = 2
+
+    @staticmethod
+    async def execute(*args: Any) -> None:
+        try:
+            # Import here to avoid circular imports
+            from modules.notification.notification_service import NotificationService
+            
+            # Send one digest notification per account and collapse key whose window has closed
+            flushed_notifications = NotificationService.flush_due_digests()
+            
+            if flushed_notifications:
+                Logger.info(message=f"Flushed {len(flushed_notifications)} notification digests")
+            
+        except Exception as e:
+            Logger.error(message=f"Error flushing notification digests: {str(e)}")
+            raise
+
+    async def run(self, *args: Any) -> None:
+        await super().run(*args)
+
+
+class NotificationEventRollupWorker(BaseWorker):
+    """Worker to fold recent delivered, opened and clicked events into notification statuses"""
+    
+    max_execution_time_in_seconds = 300  # 5 minutes
+    max_retries = 2
+
+    @staticmethod
+    async def execute(*args: Any) -> None:
+        try:
+            # Import here to avoid circular imports
+            from modules.notification.notification_service import NotificationService
+            
+            NotificationService.rollup_notification_events()
+            
+        except Exception as e:
+            Logger.error(message=f"Error rolling up notification events: {str(e)}")
+            raise
+
+    async def run(self, *args: Any) -> None:
+        await super().run(*args)
+
+
+class NotificationSegmentWorker(BaseWorker):
+    """Worker to send a notification to every device token matching a segment"""
+    
+    max_execution_time_in_seconds = 3600  # 1 hour
+    # A retry would resend to every device already reached, so a failed fan-out is not retried
+    max_retries = 1
+
+    @staticmethod
+    async def execute(*args: Any) -> None:
+        segment_data, notification_data = args
+        try:
+            # Import here to avoid circular imports
+            from modules.notification.notification_service import NotificationService
+            from modules.notification.types import NotificationData, NotificationSegment
+            
+            NotificationService.fan_out_segment_notification(
+                NotificationSegment(**segment_data), NotificationData(**notification_data)
+            )
+            
+        except Exception as e:
+            Logger.error(message=f"Error sending segment notification: {str(e)}")
+            raise
+
+    async def run(self, *args: Any) -> None:
+        await super().run(*args)
+
+
+class NotificationCampaignSnapshotWorker(BaseWorker):
+    """Worker to snapshot a campaign's audience and start its shard workers"""
+    
+    max_execution_time_in_seconds = 3600  # 1 hour
+    max_retries = 3
+
+    @staticmethod
+    async def execute(*args: Any) -> None:
+        campaign_id, run_id = args
+        try:
+            # Import here to avoid circular imports
+            from modules.notification.notification_service import NotificationService
+            
+            # A retry rebuilds the snapshot from scratch, no shard has read it yet
+            NotificationService.snapshot_campaign_audience(campaign_id, run_id)
+            
+        except Exception as e:
+            Logger.error(message=f"Error snapshotting the audience of campaign {campaign_id}: {str(e)}")
+            raise
+
+    async def run(self, *args: Any) -> None:
+        await super().run(*args)
+
+
+class NotificationCampaignWorker(BaseWorker):
+    """Worker to send one audience shard of a campaign"""
+    
+    max_execution_time_in_seconds = 3600  # 1 hour
+    max_retries = 3
+
+    @staticmethod
+    async def execute(*args: Any) -> None:
+        campaign_id, shard, run_id = args
+        try:
+            # Import here to avoid circular imports
+            from modules.notification.notification_service import NotificationService
+            
+            # A retry resumes after the shard's last sent snapshot chunk
+            NotificationService.run_campaign_shard(campaign_id, shard, run_id)
+            
+        except Exception as e:
+            Logger.error(message=f"Error sending campaign {campaign_id} shard {shard}: {str(e)}")
+            raise
+
+    async def run(self, *args: Any) -> None:
+        await super().run(*args)
@@ -0,0 +1,33 @@
+import signal
+from types import FrameType
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from modules.logger.logger import Logger
+from modules.logger.logger_manager import LoggerManager
+from modules.notification.notification_service import NotificationService
+
+
+def main() -> None:
+    load_dotenv()
+
+    # Mount logger
+    LoggerManager.mount_logger()
+
+    scheduler = NotificationService.create_timing_scheduler()
+
+    def handle_shutdown(signum: int, frame: Optional[FrameType]) -> None:
+        Logger.info(message=f"Received signal {signum}, stopping notification scheduler...")
+        scheduler.stop()
+
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
+
+    Logger.info(message="Starting notification scheduler")
+    scheduler.run()
+    Logger.info(message="Notification scheduler stopped")
+
+
+if __name__ == "__main__":
+    main()
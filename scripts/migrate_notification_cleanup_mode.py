@@ -0,0 +1,23 @@
+import sys
+
+from dotenv import load_dotenv
+
+from modules.logger.logger_manager import LoggerManager
+from modules.notification.notification_service import NotificationService
+from modules.notification.types import NotificationCleanupMode
+
+
+def run() -> None:
+    load_dotenv()
+    LoggerManager.mount_logger()
+
+    if len(sys.argv) < 2:
+        print(f"Usage: python -m scripts.migrate_notification_cleanup_mode <{'|'.join(NotificationCleanupMode)}>")
+        sys.exit(1)
+
+    mode = NotificationCleanupMode(sys.argv[1].upper())
+    updated_count = NotificationService.migrate_cleanup_mode(mode)
+    print(f"Migrated notification cleanup to {mode} mode, updated {updated_count} notifications")
+
+
+run()
@@ -0,0 +1,15 @@
+from dotenv import load_dotenv
+
+from modules.logger.logger_manager import LoggerManager
+from modules.notification.notification_service import NotificationService
+
+
+def run() -> None:
+    load_dotenv()
+    LoggerManager.mount_logger()
+
+    updated_count = NotificationService.migrate_device_sets()
+    print(f"Migrated device tokens of {updated_count} notifications to device sets")
+
+
+run()
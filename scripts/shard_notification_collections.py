@@ -0,0 +1,57 @@
+import sys
+
+from dotenv import load_dotenv
+
+from modules.logger.logger_manager import LoggerManager
+from modules.notification.internal.store.notification_repository import (
+    DeviceTokenRepository,
+    NotificationBucketRepository,
+    NotificationRepository,
+)
+
+SHARDED_REPOSITORIES = [NotificationRepository, NotificationBucketRepository, DeviceTokenRepository]
+
+
+def _replace_unique_token_index() -> None:
+    # A unique index on token alone cannot be kept once device tokens are sharded on account_id
+    collection = DeviceTokenRepository.collection()
+    token_index = collection.index_information().get("token_1")
+    if token_index and token_index.get("unique"):
+        collection.drop_index("token_1")
+        collection.create_index("token")
+        print(f"Replaced the unique token index of {collection.name} with a non-unique one")
+
+
+def _is_single_shard(repository: type, account_id: str) -> bool:
+    explain = repository.collection().find({"account_id": account_id}).explain()
+    return explain.get("queryPlanner", {}).get("winningPlan", {}).get("stage") == "SINGLE_SHARD"
+
+
+def run() -> None:
+    load_dotenv()
+    LoggerManager.mount_logger()
+
+    _replace_unique_token_index()
+
+    for repository in SHARDED_REPOSITORIES:
+        repository.shard_collection()
+        print(f"Sharded {repository.collection_name} on {repository.shard_key}")
+
+    # Per-account reads must be routed to exactly one shard
+    failed = False
+    for repository in SHARDED_REPOSITORIES:
+        sample = repository.collection().find_one({}, {"account_id": 1})
+        if not sample:
+            print(f"Skipped routing check for {repository.collection_name}, the collection is empty")
+            continue
+        if _is_single_shard(repository, sample["account_id"]):
+            print(f"Per-account queries on {repository.collection_name} target a single shard")
+        else:
+            print(f"Per-account queries on {repository.collection_name} are not targeted, check the shard key")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+run()
@@ -8,6 +8,7 @@ from bin.blueprints import api_blueprint, img_assets_blueprint, react_blueprint
 from modules.account.rest_api.account_rest_api_server import AccountRestApiServer
 from modules.application.application_service import ApplicationService
 from modules.application.errors import AppError, WorkerClientConnectionError
+from modules.application.json_provider import ApplicationJSONProvider
 from modules.application.workers.health_check_worker import HealthCheckWorker
 from modules.authentication.rest_api.authentication_rest_api_server import AuthenticationRestApiServer
 from modules.config.config_service import ConfigService
@@ -25,6 +26,7 @@ except ImportError:
 load_dotenv()
 
 app = Flask(__name__)
+app.json = ApplicationJSONProvider(app)
 cors = CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
 
 # Mount deps
@@ -43,6 +45,8 @@ try:
         try:
             from modules.notification.workers.notification_worker import (
                 NotificationCleanupWorker,
+                NotificationDigestWorker,
+                NotificationEventRollupWorker,
                 NotificationSchedulerWorker,
             )
             
@@ -58,6 +62,18 @@ try:
                 cls=NotificationCleanupWorker, 
                 cron_schedule="0 2 * * *"
             )
+            
+            # Flush notification digests whose coalescing window has closed every minute
+            ApplicationService.schedule_worker_as_cron(
+                cls=NotificationDigestWorker, 
+                cron_schedule="* * * * *"
+            )
+            
+            # Fold delivered, opened and clicked events into notification statuses every minute
+            ApplicationService.schedule_worker_as_cron(
+                cls=NotificationEventRollupWorker, 
+                cron_schedule="* * * * *"
+            )
             Logger.info(message="Notification workers started successfully")
         except ImportError:
             Logger.warn(message="Notification workers not available, skipping")
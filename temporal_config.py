@@ -8,10 +8,23 @@ from modules.application.workers.health_check_worker import HealthCheckWorker
 # Try to import notification workers, but don't fail if missing
 try:
     from modules.notification.workers.notification_worker import (
+        NotificationCampaignSnapshotWorker,
+        NotificationCampaignWorker,
         NotificationCleanupWorker,
+        NotificationDigestWorker,
+        NotificationEventRollupWorker,
         NotificationSchedulerWorker,
+        NotificationSegmentWorker,
     )
-    NOTIFICATION_WORKERS = [NotificationSchedulerWorker, NotificationCleanupWorker]
+    NOTIFICATION_WORKERS = [
+        NotificationSchedulerWorker,
+        NotificationCleanupWorker,
+        NotificationDigestWorker,
+        NotificationEventRollupWorker,
+        NotificationSegmentWorker,
+        NotificationCampaignSnapshotWorker,
+        NotificationCampaignWorker,
+    ]
 except ImportError:
     NOTIFICATION_WORKERS = []
 